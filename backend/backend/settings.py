@@ -28,11 +28,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'submissions.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'submissions.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -64,6 +66,22 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # SupabaseSubmission's read cache, shared by web workers and extraction
+    # processes; point this at Redis or Memcached when running on several hosts.
+    'submissions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('DJANGO_CACHE_DIR', os.path.join(BASE_DIR, '.cache')),
+    },
+}
+SUBMISSION_CACHE_TIMEOUT = int(os.getenv('SUBMISSION_CACHE_TIMEOUT', '300'))
+# Turn on after the first `manage.py sync_submissions`; keep `sync_submissions --watch` running.
+SUBMISSION_MIRROR_ENABLED = os.getenv('SUBMISSION_MIRROR_ENABLED', '0') == '1'
+SUBMISSION_MIRROR_MAX_STALENESS = int(os.getenv('SUBMISSION_MIRROR_MAX_STALENESS', '30'))
+
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 
 SECURE_SSL_REDIRECT = not DEBUG
@@ -140,6 +158,39 @@ LOGGING = {
 }
 
 HUGGINGFACE_TOKEN = os.getenv('HUGGINGFACE_TOKEN')
+HF_DATASET_REPO = os.getenv('HF_DATASET_REPO', 'happyhackingspace/kurdish-kurmanji-corpus')
+PUBLISH_BATCH_SIZE = int(os.getenv('PUBLISH_BATCH_SIZE', '50'))
+PUBLISH_MAX_WAIT_SECONDS = int(os.getenv('PUBLISH_MAX_WAIT_SECONDS', '60'))
+CORPUS_STATS_PATH = os.getenv('CORPUS_STATS_PATH', os.path.join(BASE_DIR, 'corpus_stats.json'))
+
+EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', '2'))
+EXTRACTION_PAGE_WORKERS = int(os.getenv('EXTRACTION_PAGE_WORKERS', '0'))
+EXTRACTION_PAGE_TIMEOUT = float(os.getenv('EXTRACTION_PAGE_TIMEOUT', '30'))
+PDF_EXTRACTION_ENGINE = os.getenv('PDF_EXTRACTION_ENGINE', 'auto')
+FILE_UPLOAD_HANDLERS = [
+    'submissions.uploads.ContentHashUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', str(200 * 1024 * 1024)))
+# Resumable uploads: unfinished uploads per client address, and seconds before an idle one is dropped.
+MAX_OPEN_UPLOADS_PER_CLIENT = int(os.getenv('MAX_OPEN_UPLOADS_PER_CLIENT', '3'))
+UPLOAD_TTL_SECONDS = int(os.getenv('UPLOAD_TTL_SECONDS', str(24 * 3600)))
 
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
+SUPABASE_POOL_SIZE = int(os.getenv('SUPABASE_POOL_SIZE', '20'))
+SUPABASE_TIMEOUT = float(os.getenv('SUPABASE_TIMEOUT', '30'))
+SUPABASE_HTTP2 = os.getenv('SUPABASE_HTTP2', '1') == '1'
+SIGNED_URL_CACHE_SIZE = int(os.getenv('SIGNED_URL_CACHE_SIZE', '2048'))
+
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(BASE_DIR, '.metrics'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# 0 disables slow-request logging
+METRICS_SLOW_REQUEST_SECONDS = float(os.getenv('METRICS_SLOW_REQUEST_SECONDS', '0'))
+
+# Fraction of requests and extraction jobs to profile; staff can force one with PROFILE_HEADER.
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_HEADER = os.getenv('PROFILE_HEADER', 'X-Profile')
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(BASE_DIR, '.profiles'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '50'))
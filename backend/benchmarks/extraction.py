@@ -0,0 +1,331 @@
+"""PDF text extraction throughput, peak memory and fidelity per path and engine.
+
+Generates a synthetic Kurmanji corpus (page counts, fonts, diacritics, one and
+two columns) with PyMuPDF, then runs every extraction path against every
+engine, each document in a fresh process so peak RSS is comparable:
+
+    python -m benchmarks.extraction --output results.json
+    python -m benchmarks.extraction --baseline results.json   # exits 1 on regression
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import unicodedata
+from collections import Counter
+from difflib import SequenceMatcher
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Bump when the generated documents change so an old corpus directory is not reused.
+CORPUS_VERSION = 1
+
+WORDS = (
+    "û ku di de ji bo li ser bi re jî ev ew em hûn ez tu wan me we min te"
+    " ziman kurdî kurmancî gotin nivîs pirtûk rûpel çîrok helbest stran dîrok"
+    " bajêr gund çiya av nan dar kevir rê mal dê bav xwişk bira heval zarok"
+    " şev roj sibê êvar havîn zivistan berf baran ba ezman stêrk heyv tav"
+    " xweş mezin biçûk nû kevn dirêj kurt germ sar spî reş sor kesk şîn zer"
+    " dibêje dinivîse dixwîne diçe tê dike dibe hat çû got kir bû xwend"
+    " ronahî welat gel jiyan azadî xeyal bîranîn dilşad hêvî şahî êş"
+).split()
+
+# name -> (PyMuPDF font, whether text is written through TextWriter with a ToUnicode map)
+FONTS = {
+    "helvetica": ("helv", True),
+    "times": ("tiro", True),
+    "courier": ("cour", True),
+    # simple WinAnsi font as older exporters produce it; ş/Ş cannot be encoded
+    "legacy": ("helv", False),
+}
+
+SPECS = [
+    {"name": "short-helvetica", "pages": 1, "font": "helvetica", "columns": 1, "diacritics": True},
+    {"name": "short-ascii", "pages": 1, "font": "helvetica", "columns": 1, "diacritics": False},
+    {"name": "medium-times", "pages": 12, "font": "times", "columns": 1, "diacritics": True},
+    {"name": "medium-courier", "pages": 12, "font": "courier", "columns": 1, "diacritics": True},
+    {"name": "medium-two-column", "pages": 12, "font": "times", "columns": 2, "diacritics": True},
+    {"name": "medium-legacy", "pages": 12, "font": "legacy", "columns": 1, "diacritics": True},
+    {"name": "long-helvetica", "pages": 48, "font": "helvetica", "columns": 1, "diacritics": True},
+    {"name": "long-two-column", "pages": 48, "font": "helvetica", "columns": 2, "diacritics": True},
+]
+
+PATHS = ("sequential", "parallel")
+PAGE_SIZE = (595, 842)
+MARGIN = 56
+FONT_SIZE = 10
+LINE_HEIGHT = 13
+COLUMN_GAP = 24
+KURMANJI_LETTERS = set("çêîûşÇÊÎÛŞ")
+
+
+def _fold(text):
+    return "".join(c for c in unicodedata.normalize("NFD", text) if not unicodedata.combining(c))
+
+
+def _sentence(rng, diacritics):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(5, 14))]
+    sentence = " ".join(words).capitalize() + rng.choice(".....?!")
+    return sentence if diacritics else _fold(sentence)
+
+
+def _column(rng, font, width, lines_per_column, diacritics):
+    # greedy line filling; the last word of a line never overflows the column
+    lines, current = [], ""
+    while len(lines) < lines_per_column:
+        for word in _sentence(rng, diacritics).split():
+            candidate = f"{current} {word}" if current else word
+            if current and font.text_length(candidate, fontsize=FONT_SIZE) > width:
+                lines.append(current)
+                current = word
+            else:
+                current = candidate
+    return lines[:lines_per_column]
+
+
+def _write_pdf(spec, path, rng):
+    import fitz
+
+    font_name, unicode_font = FONTS[spec["font"]]
+    font = fitz.Font(font_name)
+    width, height = PAGE_SIZE
+    column_width = (width - 2 * MARGIN - (spec["columns"] - 1) * COLUMN_GAP) / spec["columns"]
+    lines_per_column = int((height - 2 * MARGIN) / LINE_HEIGHT)
+
+    doc = fitz.open()
+    truth = []
+    for _ in range(spec["pages"]):
+        page = doc.new_page(width=width, height=height)
+        writer = fitz.TextWriter(page.rect) if unicode_font else None
+        for column in range(spec["columns"]):
+            lines = _column(rng, font, column_width, lines_per_column, spec["diacritics"])
+            x = MARGIN + column * (column_width + COLUMN_GAP)
+            for row, line in enumerate(lines):
+                point = (x, MARGIN + (row + 1) * LINE_HEIGHT)
+                if writer:
+                    writer.append(point, line, font=font, fontsize=FONT_SIZE)
+                else:
+                    page.insert_text(point, line, fontname=font_name, fontsize=FONT_SIZE)
+            truth.extend(lines)
+        if writer:
+            writer.write_text(page)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return "\n".join(truth)
+
+
+def generate_corpus(directory, seed=0):
+    # Deterministic for a given seed; an existing corpus of the same version is reused.
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == CORPUS_VERSION and manifest.get("seed") == seed:
+            return manifest
+
+    documents = []
+    for spec in SPECS:
+        rng = random.Random(f"{seed}-{spec['name']}")
+        pdf_path = os.path.join(directory, f"{spec['name']}.pdf")
+        truth = _write_pdf(spec, pdf_path, rng)
+        truth_path = os.path.join(directory, f"{spec['name']}.txt")
+        with open(truth_path, "w", encoding="utf-8") as f:
+            f.write(truth)
+        documents.append({**spec, "pdf": pdf_path, "truth": truth_path, "bytes": os.path.getsize(pdf_path)})
+
+    manifest = {"version": CORPUS_VERSION, "seed": seed, "documents": documents}
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def fidelity(extracted, truth):
+    # words: multiset F1, insensitive to line breaks and reading order
+    # order: sequence similarity of the first words, catches interleaved columns
+    # diacritics: recall of Kurmanji-specific letters
+    got, want = Counter(extracted.split()), Counter(truth.split())
+    common = sum((got & want).values())
+    precision = common / max(1, sum(got.values()))
+    recall = common / max(1, sum(want.values()))
+    words = 2 * precision * recall / (precision + recall) if common else 0.0
+
+    head = 2000
+    order = SequenceMatcher(None, extracted.split()[:head], truth.split()[:head], autojunk=False).ratio()
+
+    wanted = Counter(c for c in truth if c in KURMANJI_LETTERS)
+    found = Counter(c for c in extracted if c in KURMANJI_LETTERS)
+    diacritics = sum((found & wanted).values()) / sum(wanted.values()) if wanted else 1.0
+    return {"words": round(words, 4), "order": round(order, 4), "diacritics": round(diacritics, 4)}
+
+
+def _peak_rss_mb():
+    usage = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(usage / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_one(conn, pdf_path, path, engine, workers, repeat):
+    from submissions.pdf_processor import extract_text_from_pdf
+
+    best, text = None, ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = extract_text_from_pdf(
+            pdf_path, parallel=path == "parallel", workers=workers, engine=engine, page_timeout=None
+        )
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    conn.send({"seconds": best, "text": text, "peak_rss_mb": _peak_rss_mb()})
+    conn.close()
+
+
+def measure(document, path, engine, workers, repeat):
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_run_one, args=(child, document["pdf"], path, engine, workers, repeat))
+    process.start()
+    child.close()
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = None
+    process.join()
+    if result is None:
+        return {"error": f"exit code {process.exitcode}"}
+
+    with open(document["truth"], encoding="utf-8") as f:
+        truth = f.read()
+    return {
+        "seconds": round(result["seconds"], 4),
+        "pages_per_sec": round(document["pages"] / result["seconds"], 1) if result["seconds"] else None,
+        "peak_rss_mb": result["peak_rss_mb"],
+        "fidelity": fidelity(result["text"], truth),
+    }
+
+
+def summarize(rows):
+    ok = [r for r in rows if "error" not in r]
+    pages = sum(r["pages"] for r in ok)
+    seconds = sum(r["seconds"] for r in ok)
+    return {
+        "documents": len(rows),
+        "errors": len(rows) - len(ok),
+        "pages_per_sec": round(pages / seconds, 1) if seconds else None,
+        "peak_rss_mb": max((r["peak_rss_mb"] for r in ok), default=None),
+        # worst document, so a regression on one layout is not averaged away
+        "fidelity": {
+            key: round(min(r["fidelity"][key] for r in ok), 4) if ok else None
+            for key in ("words", "order", "diacritics")
+        },
+    }
+
+
+def compare(results, baseline, max_slowdown, max_rss_growth, max_fidelity_drop):
+    regressions = []
+    for key, summary in results["summary"].items():
+        before = baseline.get("summary", {}).get(key)
+        if not before:
+            continue
+        if summary["errors"] > before["errors"]:
+            regressions.append(f"{key}: {summary['errors']} error(s), baseline {before['errors']}")
+        if before["pages_per_sec"] and summary["pages_per_sec"] is not None \
+                and summary["pages_per_sec"] < before["pages_per_sec"] * (1 - max_slowdown):
+            regressions.append(f"{key}: {summary['pages_per_sec']} pages/s, baseline {before['pages_per_sec']}")
+        if before["peak_rss_mb"] and summary["peak_rss_mb"] is not None \
+                and summary["peak_rss_mb"] > before["peak_rss_mb"] * (1 + max_rss_growth):
+            regressions.append(f"{key}: peak RSS {summary['peak_rss_mb']} MB, baseline {before['peak_rss_mb']} MB")
+        for metric, value in summary["fidelity"].items():
+            old = before["fidelity"].get(metric)
+            if old is not None and value is not None and value < old - max_fidelity_drop:
+                regressions.append(f"{key}: {metric} fidelity {value}, baseline {old}")
+    return regressions
+
+
+def main():
+    from submissions.extraction_engines import AUTO, ENGINES
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "kurmanji-extraction-bench"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engines", nargs="+", default=[AUTO] + sorted(ENGINES))
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS))
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs per document")
+    parser.add_argument("--max-pages", type=int, help="skip generated documents longer than this")
+    parser.add_argument("--output", help="write results JSON here as well as to stdout")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--max-slowdown", type=float, default=0.25)
+    parser.add_argument("--max-rss-growth", type=float, default=0.25)
+    parser.add_argument("--max-fidelity-drop", type=float, default=0.01)
+    args = parser.parse_args()
+
+    import fitz
+    from PyPDF2 import __version__ as pypdf2_version
+    from pdfminer import __version__ as pdfminer_version
+    from submissions.pdf_processor import EXTRACTOR_VERSION
+
+    corpus = generate_corpus(args.corpus_dir, args.seed)
+    documents = [d for d in corpus["documents"] if not args.max_pages or d["pages"] <= args.max_pages]
+
+    rows = []
+    for path in args.paths:
+        for engine in args.engines:
+            for document in documents:
+                row = {"path": path, "engine": engine, "document": document["name"], "pages": document["pages"]}
+                row.update(measure(document, path, engine, args.workers, args.repeat))
+                print(json.dumps(row, ensure_ascii=False), file=sys.stderr)
+                rows.append(row)
+
+    results = {
+        "meta": {
+            "corpus_version": CORPUS_VERSION,
+            "seed": args.seed,
+            "extractor_version": EXTRACTOR_VERSION,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "workers": args.workers,
+            "repeat": args.repeat,
+            "pymupdf": fitz.VersionBind,
+            "pypdf2": pypdf2_version,
+            "pdfminer": pdfminer_version,
+        },
+        "summary": {
+            f"{path}/{engine}": summarize([r for r in rows if r["path"] == path and r["engine"] == engine])
+            for path in args.paths for engine in args.engines
+        },
+        "documents": rows,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(
+                results, json.load(f), args.max_slowdown, args.max_rss_growth, args.max_fidelity_drop
+            )
+        results["regressions"] = regressions
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Throughput of extracted-text normalization in MB/s.
+
+Compares the single-pass normalizer (whole string and streamed in chunks)
+with the same rules applied as a chain of separate passes, on synthetic
+Kurmanji text sprinkled with PDF extraction artifacts:
+
+    python -m benchmarks.normalization --megabytes 16
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+import unicodedata
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.extraction import WORDS  # noqa: E402
+
+ARTIFACTS = [
+    "-\n", "\u00ad", "\u00ad\n", "  ", "\u00a0", " \n", "\n\n\n", "\x0c", "\r\n",
+    "(cid:42)", "\ufb01", "\u0219", "e\u0302", "\u02c6e", "s\u00b8", "\u200b", "\ufffd",
+]
+
+
+def make_text(megabytes, artifact_rate, seed):
+    rng = random.Random(seed)
+    parts, size = [], 0
+    target = megabytes * 1024 * 1024
+    while size < target:
+        token = rng.choice(WORDS)
+        token += rng.choice(ARTIFACTS) if rng.random() < artifact_rate else " "
+        parts.append(token)
+        size += len(token.encode("utf-8"))
+    return "".join(parts)
+
+
+def chained(text):
+    # the same cleanup as separate passes, each copying the whole text
+    text = unicodedata.normalize("NFC", text)
+    for old, new in (("\ufb00", "ff"), ("\ufb01", "fi"), ("\ufb02", "fl"), ("\ufb03", "ffi"),
+                     ("\ufb04", "ffl"), ("\u0219", "ş"), ("\u0218", "Ş")):
+        text = text.replace(old, new)
+    text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\x0c", "\n\n")
+    text = re.sub(r"(?<=[^\W\d_])[-\u00ad\u2010][ \t]*\n[ \t]*(?=[a-zçêîûşéö])", "", text)
+    text = re.sub(r"\(cid:\d+\)", "", text)
+    text = re.sub(r"\u02c6([aeiouAEIOU])|([aeiouAEIOU])\u02c6",
+                  lambda m: unicodedata.normalize("NFC", (m.group(1) or m.group(2)) + "\u0302"), text)
+    text = re.sub(r"\u00b8([cCsS])|([cCsS])\u00b8",
+                  lambda m: unicodedata.normalize("NFC", (m.group(1) or m.group(2)) + "\u0327"), text)
+    text = re.sub(r"[\u00ad\u200b\u200d\u2060\ufeff\ufffd\x00-\x08\x0b\x0e-\x1f\x7f]+", "", text)
+    text = re.sub(r"[ \t\u00a0\u2000-\u200a\u202f\u205f\u3000]+", " ", text)
+    text = re.sub(r" ?\n ?", "\n", text)
+    text = re.sub(r"\n{2,}", "\n\n", text)
+    return text.strip()
+
+
+def _measure(fn, text, repeat):
+    megabytes = len(text.encode("utf-8")) / (1024 * 1024)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {"seconds": round(best, 4), "mb_per_sec": round(megabytes / best, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=float, default=16)
+    parser.add_argument("--artifact-rate", type=float, default=0.05, help="share of words followed by an artifact")
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from submissions.normalization import normalize, normalize_stream
+
+    text = make_text(args.megabytes, args.artifact_rate, args.seed)
+
+    def streamed(text):
+        chunks = (text[i:i + args.chunk_size] for i in range(0, len(text), args.chunk_size))
+        for _ in normalize_stream(chunks):
+            pass
+
+    results = {
+        "megabytes": args.megabytes,
+        "artifact_rate": args.artifact_rate,
+        "before_chained_passes": _measure(chained, text, args.repeat),
+        "after_single_pass": _measure(normalize, text, args.repeat),
+        "after_streamed": _measure(streamed, text, args.repeat),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Per-request overhead of a fresh Supabase client vs. the shared pooled one.
+
+Runs against a local stub of the PostgREST endpoint, so no Supabase project
+is needed:
+
+    python -m benchmarks.supabase_client --requests 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+ROW = {"id": "00000000-0000-0000-0000-000000000000", "status": "pending"}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = json.dumps(ROW).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _measure(fn, n):
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "requests": n,
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(sorted(timings)[int(n * 0.95) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ.setdefault("SUPABASE_KEY", "benchmark-key")
+    # the stub speaks HTTP/1.1 only
+    os.environ["SUPABASE_HTTP2"] = "0"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from supabase import create_client
+    from submissions.models import SupabaseSubmission
+
+    def fresh_client():
+        sb = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+        sb.table(SupabaseSubmission.TABLE).select("*").eq("id", ROW["id"]).single().execute()
+
+    def pooled_client():
+        SupabaseSubmission().table.select("*").eq("id", ROW["id"]).single().execute()
+
+    pooled_client()  # open the pooled connection once
+    results = {
+        "before_fresh_client": _measure(fresh_client, args.requests),
+        "after_pooled_client": _measure(pooled_client, args.requests),
+    }
+    server.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
+import argparse
+import glob
+import gzip
+import io
 import os
 import json
-from datetime import datetime
+import tempfile
+from datetime import date, datetime, timezone
 from huggingface_hub import HfApi, create_repo
 from dotenv import load_dotenv
 
 load_dotenv()
 
+REPO_ID = "happyhackingspace/kurdish-kurmanji-corpus"
+PARQUET_NAME = "kurmanji.parquet"
+ROW_GROUP_ROWS = 10_000
+ROW_GROUP_BYTES = 64 * 1024 * 1024
+
 def create_new_dataset():
     temp_dir = "temp_dataset_files"
     
@@ -80,5 +90,206 @@ def create_new_dataset():
                 os.remove(os.path.join(temp_dir, file))
             os.rmdir(temp_dir)
 
+
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise SystemExit(f"Reading {path} needs zstandard: pip install -r requirements.txt")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb")), encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def _source_files(sources):
+    # Files, or directories holding kurmanji.json, data/*.jsonl shards or an
+    # export_corpus output (*.jsonl.gz / *.jsonl.zst).
+    for source in sources:
+        if not os.path.isdir(source):
+            yield source
+            continue
+        for pattern in ("*.json", "*.jsonl", "*.jsonl.gz", "*.jsonl.zst"):
+            for path in sorted(glob.glob(os.path.join(source, "**", pattern), recursive=True)):
+                if os.path.basename(path) not in ("manifest.json", "stats.json"):
+                    yield path
+
+
+def iter_records(sources):
+    # kurmanji.json has been both a JSON array and JSON lines over time
+    for path in _source_files(sources):
+        with _open_text(path) as f:
+            first = f.read(1)
+            while first.isspace():
+                first = f.read(1)
+            if first == "[":
+                data = json.loads(first + f.read())
+                yield from (r for r in data if isinstance(r, dict))
+                continue
+            line = first + f.readline()
+            while line:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        print(f"Skipping unreadable line in {path}")
+                line = f.readline()
+
+
+def parse_date(value):
+    # The app stores dd-mm-yyyy ("01-01-1000" meaning unknown); ISO dates are
+    # accepted too. Empty values are None, anything else raises ValueError.
+    if value is None or not str(value).strip():
+        return None
+    value = str(value).strip()
+    try:
+        return datetime.strptime(value, "%d-%m-%Y").date()
+    except ValueError:
+        return date.fromisoformat(value[:10])
+
+
+def _parse_timestamp(value):
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def parquet_schema():
+    import pyarrow as pa
+
+    categorical = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("document_subject", pa.string()),
+        ("text_type", categorical),
+        ("author_source", categorical),
+        ("publication_date", pa.date32()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        ("char_count", pa.int32()),
+        ("word_count", pa.int32()),
+        ("text", pa.string()),
+    ])
+
+
+def _typed(record, publication_date):
+    text = record.get("text") or ""
+    return {
+        "document_subject": record.get("document_subject"),
+        "text_type": record.get("text_type") or None,
+        "author_source": record.get("author_source") or None,
+        "publication_date": publication_date,
+        "created_at": _parse_timestamp(record.get("created_at")),
+        "char_count": record.get("char_count", len(text)),
+        "word_count": record.get("word_count", len(text.split())),
+        "text": text,
+    }
+
+
+def build_parquet(sources, output_dir, row_group_rows=ROW_GROUP_ROWS, row_group_bytes=ROW_GROUP_BYTES,
+                  compression="zstd"):
+    # Two passes so memory holds only the sort keys and one row group: records
+    # are spooled to a temporary JSONL file with their (text_type, date) key,
+    # the keys are sorted, and rows are read back by offset in that order.
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("The Parquet build needs pyarrow: pip install -r requirements.txt")
+
+    schema = parquet_schema()
+    os.makedirs(output_dir, exist_ok=True)
+    keys = []
+    unreadable = {}
+    with tempfile.TemporaryFile("w+b") as spool:
+        for record in iter_records(sources):
+            if not isinstance(record, dict) or not record.get("text"):
+                continue
+            try:
+                published = parse_date(record.get("publication_date"))
+            except ValueError:
+                value = str(record.get("publication_date"))
+                unreadable[value] = unreadable.get(value, 0) + 1
+                published = None
+            offset = spool.tell()
+            spool.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+            keys.append((record.get("text_type") or "", published.isoformat() if published else "",
+                         str(record.get("created_at") or ""), offset))
+        keys.sort()
+        if unreadable:
+            examples = ", ".join(repr(v) for v in sorted(unreadable, key=unreadable.get, reverse=True)[:5])
+            print(f"Warning: {sum(unreadable.values())} records have an unreadable publication_date "
+                  f"and get none (e.g. {examples})")
+
+        path = os.path.join(output_dir, PARQUET_NAME)
+        tmp_path = path + ".tmp"
+        writer = pq.ParquetWriter(
+            tmp_path, schema, compression=compression,
+            use_dictionary=["text_type", "author_source"], write_statistics=True,
+        )
+        rows, size, row_groups = [], 0, 0
+
+        def flush():
+            nonlocal rows, size, row_groups
+            if rows:
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema), row_group_size=len(rows))
+                rows, size, row_groups = [], 0, row_groups + 1
+
+        try:
+            for i, (text_type, published, _, offset) in enumerate(keys):
+                # a row group never spans two text types, so its min/max prune exactly
+                if rows and (text_type != keys[i - 1][0] or len(rows) >= row_group_rows or size >= row_group_bytes):
+                    flush()
+                spool.seek(offset)
+                row = _typed(json.loads(spool.readline()), date.fromisoformat(published) if published else None)
+                rows.append(row)
+                size += len(row["text"])
+            flush()
+        finally:
+            writer.close()
+        os.replace(tmp_path, path)
+
+    print(f"Wrote {len(keys)} records in {row_groups} row groups to {path}")
+    return path
+
+
+def upload_parquet(path):
+    hf_token = os.getenv("HUGGINGFACE_TOKEN")
+    if not hf_token:
+        raise SystemExit("HUGGINGFACE_TOKEN environment variable is not set")
+    HfApi().upload_file(
+        path_or_fileobj=path,
+        path_in_repo=PARQUET_NAME,
+        repo_id=REPO_ID,
+        repo_type="dataset",
+        token=hf_token
+    )
+    print(f"Uploaded {PARQUET_NAME} to {REPO_ID}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the Kurmanji dataset repository or build it as Parquet.")
+    parser.add_argument("--format", choices=["json", "parquet"], default="json",
+                        help="json creates the repository with sample files; parquet builds from --source.")
+    parser.add_argument("--source", nargs="+", default=[],
+                        help="kurmanji.json, JSONL shards, or directories holding them (parquet only).")
+    parser.add_argument("--output", default="dataset_build", help="Local directory for the Parquet file.")
+    parser.add_argument("--row-group-rows", type=int, default=ROW_GROUP_ROWS)
+    parser.add_argument("--row-group-bytes", type=int, default=ROW_GROUP_BYTES)
+    parser.add_argument("--upload", action="store_true", help="Upload the Parquet file to the dataset afterwards.")
+    args = parser.parse_args()
+
+    if args.format == "json":
+        create_new_dataset()
+        return
+    if not args.source:
+        parser.error("--source is required for the parquet build")
+    path = build_parquet(args.source, args.output, args.row_group_rows, args.row_group_bytes)
+    if args.upload:
+        upload_parquet(path)
+
+
 if __name__ == "__main__":
-    create_new_dataset() 
\ No newline at end of file
+    main()
@@ -1,20 +1,58 @@
 from django.contrib import admin
-from .models import Submission
+from django.utils import timezone
+from . import search
+from .models import ExtractionJob, PublishJob, Submission
 
 @admin.register(Submission)
 class SubmissionAdmin(admin.ModelAdmin):
     list_display = ('subject', 'name', 'email', 'publication_date', 'status', 'created_at')
     list_filter = ('status', 'text_type', 'created_at')
-    search_fields = ('subject', 'name', 'email', 'extracted_text', 'edited_text')
+    # document text is matched through the FTS index, see get_search_results
+    search_fields = ('subject', 'name', 'email')
     readonly_fields = ('created_at',)
     fieldsets = (
         ('Basic Information', {
             'fields': ('name', 'email', 'subject', 'publication_date', 'author_source', 'text_type')
         }),
         ('Document', {
-            'fields': ('pdf_file', 'extracted_text', 'edited_text')
+            'fields': ('pdf_file', 'pdf_file_name', 'extracted_text', 'edited_text')
         }),
         ('Status', {
             'fields': ('status', 'created_at')
         }),
     )
+
+    def get_search_fields(self, request):
+        if search.available():
+            return self.search_fields
+        return self.search_fields + ('extracted_text', 'edited_text')
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term and search.available():
+            results |= queryset.filter(pk__in=search.matching_ids(search_term))
+        return results, may_have_duplicates
+
+
+@admin.register(PublishJob)
+class PublishJobAdmin(admin.ModelAdmin):
+    list_display = ('idempotency_key', 'status', 'attempts', 'next_attempt_at', 'shard', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('idempotency_key', 'submission_id', 'shard')
+    readonly_fields = ('created_at', 'updated_at', 'published_at')
+    actions = ['requeue']
+
+    @admin.action(description='Requeue selected jobs')
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status__in=[PublishJob.STATUS_PUBLISHED, PublishJob.STATUS_PUBLISHING]).update(
+            status=PublishJob.STATUS_QUEUED, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} job(s) requeued.')
+
+
+@admin.register(ExtractionJob)
+class ExtractionJobAdmin(admin.ModelAdmin):
+    list_display = ('submission_id', 'state', 'pages_done', 'pages_total', 'updated_at')
+    list_filter = ('state',)
+    search_fields = ('submission_id',)
+    readonly_fields = ('created_at', 'updated_at')
@@ -1,7 +1,23 @@
+import logging
+
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+logger = logging.getLogger(__name__)
+
+
+def _ensure_search_triggers(sender, using, **kwargs):
+    from . import search
+
+    missing = search.ensure_triggers(using)
+    if missing:
+        logger.warning("Recreated full-text search triggers dropped by a migration: %s", ", ".join(missing))
 
 
 class SubmissionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'submissions'
     verbose_name = 'Gönderiler'
+
+    def ready(self):
+        post_migrate.connect(_ensure_search_triggers, sender=self)
@@ -0,0 +1,169 @@
+import base64
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+
+from django.conf import settings
+
+STATS_VERSION = 1
+LOCAL_PATH = getattr(settings, "CORPUS_STATS_PATH", os.path.join(settings.BASE_DIR, "corpus_stats.json"))
+# Only this many of the most frequent tokens are kept, so the file stays small;
+# counts of kept tokens are exact unless they were ever pruned. The vocabulary
+# size comes from the HyperLogLog sketch, not from this list.
+TOP_TOKENS = 50_000
+
+_TOKEN_RE = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*")
+
+
+def tokenize(text: str):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class HyperLogLog:
+    # 2**14 one-byte registers: ~0.8% standard error, 16 KiB; merge = register max.
+    P = 14
+    M = 1 << P
+
+    def __init__(self, registers: Optional[bytes] = None):
+        self.registers = bytearray(registers) if registers else bytearray(self.M)
+
+    def add(self, item: str) -> None:
+        x = int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big")
+        index = x >> (64 - self.P)
+        rest = x & ((1 << (64 - self.P)) - 1)
+        rank = (64 - self.P) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.add(item)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.M
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small sets
+        return int(round(estimate))
+
+    def to_json(self) -> str:
+        return base64.b64encode(bytes(self.registers)).decode("ascii")
+
+    @classmethod
+    def from_json(cls, value: Optional[str]) -> "HyperLogLog":
+        return cls(base64.b64decode(value)) if value else cls()
+
+
+def _totals() -> Dict[str, int]:
+    return {"documents": 0, "chars": 0, "words": 0, "tokens": 0}
+
+
+class CorpusStats:
+    def __init__(self):
+        self.totals = _totals()
+        self.text_types: Dict[str, Dict[str, int]] = {}
+        self.token_counts: Counter = Counter()
+        self.vocabulary = HyperLogLog()
+        self.bigrams = HyperLogLog()
+        self.text_type_vocabulary: Dict[str, HyperLogLog] = {}
+        self.updated_at: Optional[str] = None
+
+    def add(self, record: Dict[str, Any]) -> None:
+        # O(len(text)); record is publisher.build_record() output
+        text = record.get("text") or ""
+        tokens = tokenize(text)
+        text_type = record.get("text_type") or "unknown"
+        for totals in (self.totals, self.text_types.setdefault(text_type, _totals())):
+            totals["documents"] += 1
+            totals["chars"] += record.get("char_count", len(text))
+            totals["words"] += record.get("word_count", len(text.split()))
+            totals["tokens"] += len(tokens)
+
+        self.token_counts.update(tokens)
+        self.vocabulary.update(tokens)
+        self.text_type_vocabulary.setdefault(text_type, HyperLogLog()).update(tokens)
+        self.bigrams.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        self.updated_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    def merge(self, other: "CorpusStats") -> None:
+        for key, value in other.totals.items():
+            self.totals[key] += value
+        for text_type, totals in other.text_types.items():
+            mine = self.text_types.setdefault(text_type, _totals())
+            for key, value in totals.items():
+                mine[key] += value
+        self.token_counts.update(other.token_counts)
+        self.vocabulary.merge(other.vocabulary)
+        self.bigrams.merge(other.bigrams)
+        for text_type, hll in other.text_type_vocabulary.items():
+            self.text_type_vocabulary.setdefault(text_type, HyperLogLog()).merge(hll)
+        self.updated_at = max(filter(None, [self.updated_at, other.updated_at]), default=None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": STATS_VERSION,
+            "updated_at": self.updated_at,
+            **self.totals,
+            "vocabulary_estimate": self.vocabulary.count(),
+            "bigram_estimate": self.bigrams.count(),
+            "text_types": {
+                t: {**totals, "vocabulary_estimate": self.text_type_vocabulary[t].count()
+                    if t in self.text_type_vocabulary else 0}
+                for t, totals in sorted(self.text_types.items())
+            },
+            "top_tokens": self.token_counts.most_common(TOP_TOKENS),
+            "sketches": {
+                "vocabulary": self.vocabulary.to_json(),
+                "bigrams": self.bigrams.to_json(),
+                "text_types": {t: h.to_json() for t, h in sorted(self.text_type_vocabulary.items())},
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CorpusStats":
+        stats = cls()
+        if not data:
+            return stats
+        stats.totals = {key: data.get(key, 0) for key in stats.totals}
+        stats.text_types = {
+            t: {key: totals.get(key, 0) for key in _totals()} for t, totals in data.get("text_types", {}).items()
+        }
+        stats.token_counts = Counter(dict(data.get("top_tokens", [])))
+        sketches = data.get("sketches", {})
+        stats.vocabulary = HyperLogLog.from_json(sketches.get("vocabulary"))
+        stats.bigrams = HyperLogLog.from_json(sketches.get("bigrams"))
+        stats.text_type_vocabulary = {
+            t: HyperLogLog.from_json(v) for t, v in sketches.get("text_types", {}).items()
+        }
+        stats.updated_at = data.get("updated_at")
+        return stats
+
+    def to_bytes(self) -> bytes:
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def load_local(path: str = LOCAL_PATH) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_local(data: bytes, path: str = LOCAL_PATH) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
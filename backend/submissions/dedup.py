@@ -0,0 +1,179 @@
+import hashlib
+import re
+from array import array
+from typing import Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from .extraction_jobs import NO_TEXT_PLACEHOLDER
+from .models import DedupBucket, DedupSignature
+
+NUM_HASHES = 128
+BANDS = 32
+ROWS = NUM_HASHES // BANDS
+SHINGLE_WORDS = 5
+# (1 / BANDS) ** (1 / ROWS): pairs above ~0.42 Jaccard are likely to share a bucket.
+DEFAULT_THRESHOLD = 0.5
+
+_MAX64 = (1 << 64) - 1
+_WORD_RE = re.compile(r"\w+")
+
+
+def _hash64(value: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "big")
+
+
+def indexable(text: str) -> bool:
+    # Empty texts and the extraction placeholder would all share one signature
+    # and flag each other as duplicates.
+    text = (text or "").strip()
+    return bool(text) and text != NO_TEXT_PLACEHOLDER and bool(_WORD_RE.search(text))
+
+
+def shingles(text: str) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def signature(text: str) -> List[int]:
+    # One-permutation MinHash: each shingle is hashed once and lands in one of
+    # NUM_HASHES bins, keeping the minimum per bin. Empty bins borrow from the
+    # next non-empty bin (rotation densification), so cost is O(shingles).
+    bins = [_MAX64] * NUM_HASHES
+    for shingle in shingles(text):
+        h = _hash64(shingle.encode("utf-8"))
+        b = h % NUM_HASHES
+        v = h // NUM_HASHES
+        if v < bins[b]:
+            bins[b] = v
+
+    if all(v == _MAX64 for v in bins):
+        return bins
+    for i in range(NUM_HASHES):
+        j, step = i, 0
+        while bins[j] == _MAX64:
+            j = (j + 1) % NUM_HASHES
+            step += 1
+        if step:
+            bins[i] = (bins[j] + step * 0x9E3779B97F4A7C15) & (_MAX64 >> 1)
+    return bins
+
+
+def similarity(a: List[int], b: List[int]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_HASHES
+
+
+def _band_keys(sig: List[int]) -> List[int]:
+    keys = []
+    for band in range(BANDS):
+        rows = sig[band * ROWS:(band + 1) * ROWS]
+        raw = band.to_bytes(2, "big") + b"".join(v.to_bytes(8, "big") for v in rows)
+        # 63 bits so the key fits a signed BigIntegerField
+        keys.append(_hash64(raw) >> 1)
+    return keys
+
+
+def _pack(sig: List[int]) -> bytes:
+    return array("Q", sig).tobytes()
+
+
+def _unpack(data: bytes) -> List[int]:
+    sig = array("Q")
+    sig.frombytes(bytes(data))
+    return sig.tolist()
+
+
+def _index_objects(doc_id: str, text: str) -> Tuple[DedupSignature, List[DedupBucket]]:
+    sig = signature(text)
+    return (
+        DedupSignature(doc_id=doc_id, signature=_pack(sig)),
+        [DedupBucket(doc_id=doc_id, bucket=key) for key in _band_keys(sig)],
+    )
+
+
+@transaction.atomic
+def add(doc_id: str, text: str) -> None:
+    doc_id = str(doc_id)
+    remove(doc_id)
+    if not indexable(text):
+        return
+    sig_obj, buckets = _index_objects(doc_id, text)
+    sig_obj.save()
+    DedupBucket.objects.bulk_create(buckets)
+
+
+def remove(doc_id: str) -> None:
+    bulk_remove([doc_id])
+
+
+def bulk_remove(doc_ids: Iterable[str]) -> None:
+    ids = [str(doc_id) for doc_id in doc_ids]
+    DedupSignature.objects.filter(doc_id__in=ids).delete()
+    DedupBucket.objects.filter(doc_id__in=ids).delete()
+
+
+def bulk_add(documents: Iterable[Tuple[str, str]], batch_size: int = 500) -> int:
+    count = 0
+    sigs, buckets = [], []
+
+    def flush():
+        with transaction.atomic():
+            ids = [s.doc_id for s in sigs]
+            DedupSignature.objects.filter(doc_id__in=ids).delete()
+            DedupBucket.objects.filter(doc_id__in=ids).delete()
+            DedupSignature.objects.bulk_create(sigs)
+            DedupBucket.objects.bulk_create(buckets)
+
+    for doc_id, text in documents:
+        if not indexable(text):
+            continue
+        sig_obj, doc_buckets = _index_objects(str(doc_id), text)
+        sigs.append(sig_obj)
+        buckets.extend(doc_buckets)
+        count += 1
+        if len(sigs) >= batch_size:
+            flush()
+            sigs, buckets = [], []
+    if sigs:
+        flush()
+    return count
+
+
+def rebuild(documents: Iterable[Tuple[str, str]], batch_size: int = 500) -> int:
+    # The old index keeps answering lookups while the new one is written over
+    # it, batch by batch. Entries the scan did not rewrite (no longer accepted,
+    # or now without text) are dropped together at the end; if the scan fails
+    # they simply stay until the next rebuild.
+    started = timezone.now()
+    count = bulk_add(documents, batch_size=batch_size)
+    if not count:
+        return 0  # an empty scan is more likely a problem upstream than an empty corpus
+    stale = DedupSignature.objects.filter(created_at__lt=started).values("doc_id")
+    with transaction.atomic():
+        DedupBucket.objects.filter(doc_id__in=stale).delete()
+        DedupSignature.objects.filter(created_at__lt=started).delete()
+    return count
+
+
+def near_duplicates(text: str, threshold: float = DEFAULT_THRESHOLD,
+                    exclude: Optional[str] = None, limit: int = 10) -> List[Tuple[str, float]]:
+    if not indexable(text):
+        return []
+    sig = signature(text)
+    candidates = set(
+        DedupBucket.objects.filter(bucket__in=_band_keys(sig)).values_list("doc_id", flat=True)
+    )
+    candidates.discard(str(exclude) if exclude else None)
+    if not candidates:
+        return []
+
+    matches = []
+    for doc_id, packed in DedupSignature.objects.filter(doc_id__in=candidates).values_list("doc_id", "signature"):
+        score = similarity(sig, _unpack(packed))
+        if score >= threshold:
+            matches.append((doc_id, score))
+    matches.sort(key=lambda m: m[1], reverse=True)
+    return matches[:limit]
@@ -0,0 +1,239 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .models import SupabaseSubmission
+from .publisher import build_record
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MAX_SHARD_BYTES = 128 * 1024 * 1024
+BATCH_SIZE = 1000
+COLUMNS = "id,subject,text_type,author_source,publication_date,created_at,updated_at,edited_text"
+# updated_at, so a delta export picks up rows accepted after the last one
+KEY = "updated_at"
+EXTENSIONS = {"zstd": ".jsonl.zst", "gzip": ".jsonl.gz"}
+
+
+def default_compression() -> str:
+    return "zstd" if zstandard else "gzip"
+
+
+class _HashingFile:
+    # Counts and hashes the compressed bytes on their way to disk.
+    def __init__(self, f):
+        self._f = f
+        self.sha256 = hashlib.sha256()
+        self.bytes = 0
+
+    def write(self, data) -> int:
+        self._f.write(data)
+        self.sha256.update(data)
+        self.bytes += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        self._f.flush()
+
+
+class ShardWriter:
+    # JSON lines into numbered shards of at most about max_bytes compressed.
+    # Shards are written under .tmp names; commit() renames them once the whole
+    # export has succeeded and discard() removes them when it has not.
+    def __init__(self, directory: str, compression: str, max_bytes: int = MAX_SHARD_BYTES, level: Optional[int] = None):
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        self.directory = directory
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.level = level
+        self.shards: List[Dict[str, Any]] = []
+        self._raw = self._hashing = self._stream = None
+        self._records = 0
+
+    def _open(self) -> None:
+        name = f"accepted-{len(self.shards):05d}{EXTENSIONS[self.compression]}"
+        self._path = os.path.join(self.directory, name)
+        self._raw = open(self._path + ".tmp", "wb")
+        self._hashing = _HashingFile(self._raw)
+        if self.compression == "zstd":
+            compressor = zstandard.ZstdCompressor(level=self.level or 3)
+            self._stream = compressor.stream_writer(self._hashing, closefd=False)
+        else:
+            self._stream = gzip.GzipFile(fileobj=self._hashing, mode="wb", compresslevel=self.level or 6, mtime=0)
+        self._records = 0
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self._stream is None:
+            self._open()
+        self._stream.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        self._records += 1
+        # compressed bytes reach the file in blocks, so shards overshoot by at most one block
+        if self._hashing.bytes >= self.max_bytes:
+            self._finish()
+
+    def _finish(self) -> None:
+        self._stream.close()
+        self._raw.close()
+        self.shards.append({
+            "path": os.path.basename(self._path),
+            "records": self._records,
+            "bytes": self._hashing.bytes,
+            "sha256": self._hashing.sha256.hexdigest(),
+        })
+        self._raw = self._hashing = self._stream = None
+
+    def close(self) -> List[Dict[str, Any]]:
+        if self._stream is not None:
+            self._finish()
+        return self.shards
+
+    def commit(self) -> None:
+        for shard in self.shards:
+            path = os.path.join(self.directory, shard["path"])
+            os.replace(path + ".tmp", path)
+
+    def discard(self) -> None:
+        # also undoes a commit() that failed halfway
+        if self._stream is not None:
+            try:
+                self._stream.close()
+            finally:
+                self._raw.close()
+            self.shards.append({"path": os.path.basename(self._path)})
+            self._raw = self._hashing = self._stream = None
+        for shard in self.shards:
+            path = os.path.join(self.directory, shard["path"])
+            for leftover in (path + ".tmp", path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        self.shards = []
+
+
+def _prefetch(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[Dict[str, Any]]:
+    # Reads the next Supabase page while the current one is compressed; the
+    # bounded queue keeps memory at about two pages.
+    q: "queue.Queue" = queue.Queue(maxsize=size)
+    done = object()
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for row in rows:
+                if not put(row):
+                    return
+            put(done)
+        except BaseException as e:
+            put(e)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def export_accepted(directory: str, since: Optional[str] = None, compression: Optional[str] = None,
+                    max_shard_bytes: int = MAX_SHARD_BYTES, batch_size: int = BATCH_SIZE,
+                    level: Optional[int] = None, after: Optional[str] = None) -> Dict[str, Any]:
+    # Streams every accepted row (or those updated at or after since, or after
+    # the (updated_at, id) cursor of a previous manifest) into compressed JSONL
+    # shards. Shards are renamed into place and manifest.json is written only
+    # once every row is out; on errors the partial shards are removed.
+    compression = compression or default_compression()
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        raise FileExistsError(f"{manifest_path} already exists")
+
+    writer = ShardWriter(directory, compression, max_shard_bytes, level)
+    rows = SupabaseSubmission().iter_rows(
+        status="accepted", columns=COLUMNS, batch_size=batch_size, since=since, key=KEY, cursor=after
+    )
+    totals = {"records": 0, "chars": 0, "words": 0}
+    last = None
+    tmp_path = manifest_path + ".tmp"
+    try:
+        for row in _prefetch(rows, 2 * batch_size):
+            last = row
+            record = build_record(row)
+            if not record["text"]:
+                continue
+            writer.write({"id": row["id"], **record})
+            totals["records"] += 1
+            totals["chars"] += record["char_count"]
+            totals["words"] += record["word_count"]
+        shards = writer.close()
+
+        manifest = {
+            "version": 1,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "compression": compression,
+            "since": since,
+            "after": after,
+            "until": last[KEY] if last else since,
+            # pass as --after to export only what changed after this run
+            "cursor": SupabaseSubmission.cursor_for(last, KEY) if last else after,
+            **totals,
+            "shards": shards,
+        }
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        writer.commit()
+        os.replace(tmp_path, manifest_path)
+    except BaseException:
+        writer.discard()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.info("Exported %s records into %s shards in %s", totals["records"], len(shards), directory)
+    return manifest
+
+
+def verify(directory: str) -> List[str]:
+    # Names of shards whose checksum does not match the manifest.
+    with open(os.path.join(directory, MANIFEST_NAME), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    bad = []
+    for shard in manifest["shards"]:
+        hasher = hashlib.sha256()
+        try:
+            with open(os.path.join(directory, shard["path"]), "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    hasher.update(chunk)
+        except OSError:
+            bad.append(shard["path"])
+            continue
+        if hasher.hexdigest() != shard["sha256"]:
+            bad.append(shard["path"])
+    return bad
@@ -0,0 +1,187 @@
+from __future__ import annotations
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from io import StringIO
+from typing import Any, Dict, List, Optional
+
+from pdfminer.converter import TextConverter
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from PyPDF2 import PdfReader
+
+try:
+    import fitz
+except ImportError:  # PyMuPDF is optional; auto falls back to PyPDF2
+    fitz = None
+
+logger = logging.getLogger(__name__)
+
+AUTO = "auto"
+# Pages sampled by probe(); enough to tell a text layer from a scan without reading the whole file.
+PROBE_PAGES = 3
+# Share of U+FFFD in the sample above which PyMuPDF's output is not trusted
+# (fonts without a usable ToUnicode map come out as replacement characters).
+MAX_REPLACEMENT_RATIO = 0.01
+
+
+class Engine(ABC):
+    # open() returns a per-document handle that page_text()/close() receive;
+    # handles never cross process boundaries, each worker opens its own.
+    name = ""
+
+    @abstractmethod
+    def open(self, pdf_path: str) -> Any:
+        ...
+
+    @abstractmethod
+    def page_count(self, doc: Any) -> int:
+        ...
+
+    @abstractmethod
+    def page_text(self, doc: Any, index: int) -> str:
+        ...
+
+    def close(self, doc: Any) -> None:
+        pass
+
+
+class PyPDF2Engine(Engine):
+    name = "pypdf2"
+
+    def open(self, pdf_path):
+        return PdfReader(pdf_path)
+
+    def page_count(self, doc):
+        return len(doc.pages)
+
+    def page_text(self, doc, index):
+        return (doc.pages[index].extract_text() or "").strip()
+
+
+@dataclass
+class _PdfMinerDocument:
+    file: Any
+    pages: List[PDFPage]
+    resources: PDFResourceManager
+
+
+class PdfMinerEngine(Engine):
+    name = "pdfminer"
+
+    def open(self, pdf_path):
+        # The page tree is parsed once here; the per-page fallback would
+        # otherwise re-parse the whole file for every page it tries.
+        f = open(pdf_path, "rb")
+        try:
+            pages = list(PDFPage.create_pages(PDFDocument(PDFParser(f))))
+        except Exception:
+            f.close()
+            raise
+        return _PdfMinerDocument(f, pages, PDFResourceManager(caching=True))
+
+    def page_count(self, doc):
+        return len(doc.pages)
+
+    def page_text(self, doc, index):
+        # same output as extract_text_to_fp(..., laparams=None) for this page
+        out = StringIO()
+        device = TextConverter(doc.resources, out, laparams=None)
+        try:
+            PDFPageInterpreter(doc.resources, device).process_page(doc.pages[index])
+        finally:
+            device.close()
+        return out.getvalue().strip()
+
+    def close(self, doc):
+        doc.file.close()
+
+
+class PyMuPDFEngine(Engine):
+    name = "pymupdf"
+
+    def open(self, pdf_path):
+        return fitz.open(pdf_path)
+
+    def page_count(self, doc):
+        return doc.page_count
+
+    def page_text(self, doc, index):
+        return doc[index].get_text("text").strip()
+
+    def close(self, doc):
+        doc.close()
+
+
+ENGINES: Dict[str, Engine] = {}
+
+
+def register(engine: Engine) -> Engine:
+    ENGINES[engine.name] = engine
+    return engine
+
+
+register(PyPDF2Engine())
+register(PdfMinerEngine())
+if fitz is not None:
+    register(PyMuPDFEngine())
+
+
+def get_engine(name: str) -> Engine:
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown PDF extraction engine {name!r}; available: {', '.join(sorted(ENGINES))}")
+
+
+@dataclass
+class Probe:
+    engine: str
+    page_count: Optional[int]
+    has_text: bool
+    reason: str
+
+
+def probe(pdf_path: str) -> Probe:
+    # Cheap look at the document to pick an engine for "auto". PyMuPDF is used
+    # when it opens the file cleanly and its text from the first pages is sane;
+    # anything unusual goes to the PyPDF2/pdfminer path the corpus was built with.
+    if "pymupdf" not in ENGINES:
+        return Probe("pypdf2", len(PdfReader(pdf_path).pages), True, "pymupdf not installed")
+
+    try:
+        doc = fitz.open(pdf_path)
+    except Exception as e:
+        logger.info("PyMuPDF could not open %s: %s", pdf_path, e)
+        return Probe("pypdf2", len(PdfReader(pdf_path).pages), True, "pymupdf open failed")
+
+    try:
+        pages = doc.page_count
+        if doc.needs_pass:
+            return Probe("pypdf2", pages, True, "encrypted")
+        if doc.is_repaired:
+            return Probe("pypdf2", pages, True, "damaged xref")
+
+        sample = "".join(doc[i].get_text("text") for i in range(min(PROBE_PAGES, pages)))
+        if not sample.strip():
+            # Scans or image-only pages: no engine finds text, so use the fastest one.
+            return Probe("pymupdf", pages, False, "no text layer")
+        if sample.count("�") > MAX_REPLACEMENT_RATIO * len(sample):
+            return Probe("pdfminer", pages, True, "unmapped glyphs")
+        return Probe("pymupdf", pages, True, "text layer")
+    finally:
+        doc.close()
+
+
+def choose(pdf_path: str, engine: str = AUTO) -> Probe:
+    if engine == AUTO:
+        return probe(pdf_path)
+    get_engine(engine)
+    return Probe(engine, None, True, "configured")
+
+
+def fallbacks(engine: str) -> List[str]:
+    # Engines tried, in order, for a page that comes back empty or fails.
+    return [engine] if engine == "pdfminer" else [engine, "pdfminer"]
@@ -0,0 +1,194 @@
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import metrics, profiling
+from .models import ExtractionCache, ExtractionJob
+from .pdf_processor import extractor_version
+
+logger = logging.getLogger(__name__)
+
+WORKERS = getattr(settings, "EXTRACTION_WORKERS", 2)
+# 0 keeps the sequential extractor; >0 splits each document across that many processes.
+PAGE_WORKERS = getattr(settings, "EXTRACTION_PAGE_WORKERS", 0)
+PAGE_TIMEOUT = getattr(settings, "EXTRACTION_PAGE_TIMEOUT", 30.0)
+# "auto" probes each document; or one of extraction_engines.ENGINES
+ENGINE = getattr(settings, "PDF_EXTRACTION_ENGINE", "auto")
+EXTRACTOR_VERSION = extractor_version(ENGINE)
+SPOOL_DIR = getattr(settings, "EXTRACTION_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "kurmanji-extraction"))
+STALE_AFTER = timedelta(minutes=15)
+PROGRESS_INTERVAL = 1.0
+STORE_ATTEMPTS = 3
+
+NO_TEXT_PLACEHOLDER = "No text could be extracted from the PDF."
+# Error of a job whose text never reached Supabase; the row is still "extracting".
+STORE_FAILED = "Failed to store extracted text in Supabase"
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def init_worker():
+    # Pool initializer for spawned processes that use the ORM.
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+    import django
+    django.setup()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: workers must not inherit the web process's DB connections or threads
+            _executor = ProcessPoolExecutor(
+                max_workers=WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+            )
+        return _executor
+
+
+def shutdown(wait: bool = True) -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+
+def recover_stale() -> int:
+    # Jobs left behind by a restart, and jobs that could not store their text,
+    # whose rows would otherwise stay "extracting" for good. Run by the
+    # recover_extractions command. Each row is requeued with a conditional
+    # update, so when several processes recover at once only one resubmits it.
+    cutoff = timezone.now() - STALE_AFTER
+    stale = ExtractionJob.objects.filter(
+        Q(state__in=[ExtractionJob.STATE_QUEUED, ExtractionJob.STATE_RUNNING])
+        | Q(state=ExtractionJob.STATE_FAILED, error=STORE_FAILED),
+        updated_at__lt=cutoff,
+    )
+    count = 0
+    for job in stale:
+        requeued = ExtractionJob.objects.filter(pk=job.pk, state=job.state, updated_at=job.updated_at).update(
+            state=ExtractionJob.STATE_QUEUED, error="", updated_at=timezone.now()
+        )
+        if not requeued:
+            continue
+        logger.info("Requeueing stale extraction job for submission %s", job.submission_id)
+        _get_executor().submit(run_job, job.pk)
+        count += 1
+    return count
+
+
+def spool_path(submission_key: str) -> str:
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    return os.path.join(SPOOL_DIR, f"{submission_key}.pdf")
+
+
+def cached_text(sha256: str) -> Optional[str]:
+    entry = ExtractionCache.objects.filter(sha256=sha256, extractor_version=EXTRACTOR_VERSION).first()
+    return entry.text if entry else None
+
+
+def submit(submission_id: str, pdf_path: str, sha256: str = "", profile: bool = False) -> ExtractionJob:
+    job, _ = ExtractionJob.objects.update_or_create(
+        submission_id=str(submission_id),
+        defaults={
+            "pdf_path": pdf_path, "sha256": sha256,
+            "state": ExtractionJob.STATE_QUEUED, "pages_done": 0, "error": "",
+        },
+    )
+    _get_executor().submit(run_job, job.pk, profile)
+    return job
+
+
+def retry(job: ExtractionJob) -> ExtractionJob:
+    # The text is usually in the extraction cache already, so this mostly
+    # retries the Supabase update.
+    return submit(job.submission_id, job.pdf_path, job.sha256)
+
+
+def _store(submission_id: str, extracted_text: str) -> bool:
+    from .models import SupabaseSubmission
+
+    for attempt in range(STORE_ATTEMPTS):
+        if attempt:
+            time.sleep(2 ** attempt)
+        res = SupabaseSubmission().update(submission_id, {
+            "extracted_text": extracted_text,
+            "edited_text": extracted_text,
+            "status": "pending",
+            "action": "update",
+        })
+        if res:
+            return True
+        logger.warning("Storing extracted text for submission %s failed (attempt %s)", submission_id, attempt + 1)
+    return False
+
+
+def run_job(job_id: int, profile: bool = False) -> None:
+    # Runs in a pool worker; profile forces a profile of the extraction.
+    from .pdf_processor import extract_text_from_pdf
+
+    job = ExtractionJob.objects.get(pk=job_id)
+    # A job can be submitted twice (a double retry, two processes recovering);
+    # only the worker that moves it out of "queued" extracts it.
+    claimed = ExtractionJob.objects.filter(pk=job_id, state=ExtractionJob.STATE_QUEUED).update(
+        state=ExtractionJob.STATE_RUNNING, updated_at=timezone.now()
+    )
+    if not claimed:
+        return
+    metrics.observe("stage_seconds", (timezone.now() - job.updated_at).total_seconds(), stage="extraction_queue", outcome="ok")
+
+    last_report = 0.0
+
+    def progress(done, total):
+        nonlocal last_report
+        now = time.monotonic()
+        if done == total or now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            ExtractionJob.objects.filter(pk=job_id).update(
+                pages_done=done, pages_total=total, updated_at=timezone.now()
+            )
+
+    extracted_text = cached_text(job.sha256) if job.sha256 else None
+    try:
+        if extracted_text is None:
+            with profiling.profiled("extract", force=profile):
+                extracted_text = extract_text_from_pdf(
+                    job.pdf_path, progress=progress,
+                    parallel=PAGE_WORKERS > 0, workers=PAGE_WORKERS or None, page_timeout=PAGE_TIMEOUT, engine=ENGINE,
+                )
+        state, error = ExtractionJob.STATE_DONE, ""
+    except Exception as e:
+        logger.exception("Extraction failed for submission %s: %s", job.submission_id, e)
+        extracted_text, state, error = "", ExtractionJob.STATE_FAILED, str(e)
+
+    if extracted_text and job.sha256:
+        ExtractionCache.objects.update_or_create(
+            sha256=job.sha256, extractor_version=EXTRACTOR_VERSION, defaults={"text": extracted_text}
+        )
+    if not extracted_text:
+        logger.warning("No text extracted from PDF: %s", job.pdf_path)
+        extracted_text = NO_TEXT_PLACEHOLDER
+
+    if not _store(job.submission_id, extracted_text):
+        state, error = ExtractionJob.STATE_FAILED, STORE_FAILED
+
+    ExtractionJob.objects.filter(pk=job_id).update(state=state, error=error, updated_at=timezone.now())
+    metrics.registry.flush()  # the web process reads this worker's numbers from its file
+    if state == ExtractionJob.STATE_DONE:
+        try:
+            os.remove(job.pdf_path)
+        except OSError:
+            pass
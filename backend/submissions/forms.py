@@ -3,6 +3,9 @@ from .models import Submission
 
 
 class SubmissionForm(forms.ModelForm):
+    # Set instead of pdf_file when the PDF was sent through the resumable upload endpoint.
+    upload_id = forms.UUIDField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Submission
         fields = ['name', 'email', 'subject', 'publication_date', 'author_source', 'text_type', 'pdf_file']
@@ -23,6 +26,16 @@ class SubmissionForm(forms.ModelForm):
             'text_type': forms.Select(attrs={'class': 'form-control'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['pdf_file'].required = False
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('pdf_file') and not cleaned_data.get('upload_id'):
+            self.add_error('pdf_file', 'Please choose a PDF file.')
+        return cleaned_data
+
     def clean_publication_date(self):
         publication_date = self.cleaned_data.get('publication_date')
         if not publication_date:
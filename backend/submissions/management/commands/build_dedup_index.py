@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from submissions import dedup
+from submissions.models import SupabaseSubmission
+
+
+class Command(BaseCommand):
+    help = "Build the near-duplicate (MinHash/LSH) index from accepted submissions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true",
+                            help="Also drop entries of documents that are no longer accepted, once the scan is done.")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        rows = SupabaseSubmission().iter_rows(
+            status='accepted', columns="id,edited_text", batch_size=options["batch_size"]
+        )
+        documents = ((row['id'], row.get('edited_text') or "") for row in rows)
+        build = dedup.rebuild if options["rebuild"] else dedup.bulk_add
+        count = build(documents, batch_size=options["batch_size"])
+        if not count:
+            raise CommandError("No accepted submissions found.")
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} documents."))
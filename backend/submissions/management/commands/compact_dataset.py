@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from submissions.publisher import COMPACT_MAX_SHARD_BYTES, COMPACT_MIN_SHARDS, compact_shards
+
+
+class Command(BaseCommand):
+    help = "Merge small append-only shards of the Hugging Face dataset into larger ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-shard-bytes", type=int, default=COMPACT_MAX_SHARD_BYTES)
+        parser.add_argument("--min-shards", type=int, default=COMPACT_MIN_SHARDS,
+                            help="Do nothing until at least this many shards can be merged.")
+
+    def handle(self, *args, **options):
+        removed = compact_shards(options["max_shard_bytes"], options["min_shards"])
+        if removed:
+            self.stdout.write(self.style.SUCCESS(f"Merged {removed} shards."))
+        else:
+            self.stdout.write("Nothing to compact.")
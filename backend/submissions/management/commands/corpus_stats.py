@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from submissions import corpus_stats, publisher
+
+
+class Command(BaseCommand):
+    help = "Show corpus statistics kept next to the Hugging Face dataset."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--refresh", action="store_true",
+                            help="Fetch stats.json from the dataset instead of using the local copy.")
+        parser.add_argument("--rebuild", action="store_true",
+                            help="Recompute the stats from every published record and commit them.")
+        parser.add_argument("--top", type=int, default=20, help="Number of frequent tokens to show.")
+        parser.add_argument("--json", action="store_true", help="Print the stats as JSON.")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            stats = publisher.rebuild_stats()
+        elif options["refresh"]:
+            stats = publisher.refresh_local_stats()
+        else:
+            stats = corpus_stats.load_local() or publisher.refresh_local_stats()
+        if not stats:
+            self.stdout.write("No corpus statistics available.")
+            return
+
+        stats.pop("sketches", None)
+        stats["top_tokens"] = stats.get("top_tokens", [])[:options["top"]]
+        if options["json"]:
+            self.stdout.write(json.dumps(stats, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(
+            f"{stats['documents']} documents, {stats['words']} words, {stats['tokens']} tokens, "
+            f"~{stats['vocabulary_estimate']} distinct tokens, ~{stats['bigram_estimate']} distinct bigrams"
+        )
+        for text_type, totals in stats["text_types"].items():
+            self.stdout.write(
+                f"  {text_type}: {totals['documents']} documents, {totals['words']} words, "
+                f"~{totals['vocabulary_estimate']} distinct tokens"
+            )
+        for token, count in stats["top_tokens"]:
+            self.stdout.write(f"  {count:>10}  {token}")
@@ -0,0 +1,266 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from submissions import extraction_jobs, uploads
+from submissions.models import ExtractionCache, Submission, SupabaseSubmission
+
+logger = logging.getLogger(__name__)
+
+BUCKET = getattr(settings, "SUPABASE_BUCKET", "pdfs")
+CHECKPOINT_NAME = ".ingest_checkpoint.jsonl"
+
+
+def publication_date(value: str) -> str:
+    # Stored as the web form does, dd-mm-yyyy.
+    try:
+        datetime.strptime(value, "%d-%m-%Y")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a dd-mm-yyyy date")
+    return value
+
+
+def ingest_file(path: str) -> Dict[str, Any]:
+    # Runs in a pool worker: hash, upload and extract one PDF.
+    from submissions.pdf_processor import extract_text_from_pdf
+
+    started = time.monotonic()
+    result = {"path": path, "bytes": os.path.getsize(path), "pages": 0}
+    try:
+        sha256 = uploads.file_sha256(path)
+        storage = SupabaseSubmission().supabase.storage.from_(BUCKET)
+        result["pdf_file_url"] = uploads.store_pdf(storage, path, sha256)
+        result["sha256"] = sha256
+
+        text = extraction_jobs.cached_text(sha256)
+        if text is None:
+            def progress(done, total):
+                result["pages"] = total
+
+            text = extract_text_from_pdf(path, progress=progress, engine=extraction_jobs.ENGINE)
+            if text:
+                try:
+                    ExtractionCache.objects.update_or_create(
+                        sha256=sha256, extractor_version=extraction_jobs.EXTRACTOR_VERSION, defaults={"text": text}
+                    )
+                except Exception as e:
+                    logger.warning("Could not cache the text of %s: %s", path, e)
+        result["text"] = text or extraction_jobs.NO_TEXT_PLACEHOLDER
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.monotonic() - started
+    return result
+
+
+class Checkpoint:
+    # Append-only JSON lines, one per finished file. A file is skipped on the
+    # next run while its size and mtime are unchanged; failed files are retried.
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, Dict[str, Any]] = {}
+        self.hashes = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by a crash
+                    if entry.get("status") == "done":
+                        self.done[entry["path"]] = entry
+                        self.hashes.add(entry.get("sha256"))
+                    else:
+                        self.done.pop(entry["path"], None)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def is_done(self, key: str, stat: os.stat_result) -> bool:
+        entry = self.done.get(key)
+        return bool(entry) and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns
+
+    def record(self, entries: List[Dict[str, Any]]) -> None:
+        for entry in entries:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            if entry["status"] == "done":
+                self.hashes.add(entry.get("sha256"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class Command(BaseCommand):
+    help = "Extract and submit every PDF in a directory, resuming from a checkpoint file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory")
+        parser.add_argument("--name", required=True, help="Submitter name stored on every row.")
+        parser.add_argument("--email", required=True)
+        parser.add_argument("--author-source", default="", help="Defaults to the submitter name.")
+        parser.add_argument("--text-type", default="other", choices=[c for c, _ in Submission.TEXT_TYPE_CHOICES])
+        parser.add_argument("--publication-date", type=publication_date,
+                            default=Submission._meta.get_field("publication_date").default,
+                            help="dd-mm-yyyy; defaults to the unknown date, 01-01-1000.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--batch-size", type=int, default=50, help="Rows per Supabase insert.")
+        parser.add_argument("--checkpoint", default=None,
+                            help=f"Defaults to {CHECKPOINT_NAME} inside the directory.")
+        parser.add_argument("--no-recursive", action="store_true", help="Only read the top directory.")
+
+    def handle(self, *args, **options):
+        directory = os.path.abspath(options["directory"])
+        if not os.path.isdir(directory):
+            raise CommandError(f"Not a directory: {directory}")
+        self.options = options
+        checkpoint = Checkpoint(options["checkpoint"] or os.path.join(directory, CHECKPOINT_NAME))
+
+        pending, skipped = [], 0
+        for path in self._find_pdfs(directory, recursive=not options["no_recursive"]):
+            key = os.path.relpath(path, directory)
+            if checkpoint.is_done(key, os.stat(path)):
+                skipped += 1
+            else:
+                pending.append((key, path))
+        self.stdout.write(f"{len(pending)} PDFs to ingest, {skipped} already done.")
+
+        self.totals = {"files": 0, "bytes": 0, "pages": 0, "duplicates": 0}
+        self.failures: List[Dict[str, Any]] = []
+        started = time.monotonic()
+        try:
+            self._run(pending, checkpoint)
+        except KeyboardInterrupt:
+            self.stderr.write("Interrupted; run the command again to resume.")
+        finally:
+            checkpoint.close()
+            self._report(time.monotonic() - started)
+
+    @staticmethod
+    def _find_pdfs(directory: str, recursive: bool):
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(".pdf"):
+                    yield os.path.join(root, name)
+            if not recursive:
+                break
+
+    def _run(self, pending, checkpoint: Checkpoint) -> None:
+        workers = max(1, self.options["workers"])
+        batch_size = max(1, self.options["batch_size"])
+        keys = {path: key for key, path in pending}
+        queue = iter(pending)
+        batch: List[Dict[str, Any]] = []
+
+        # spawn, as for the extraction pool; at most two files per worker are
+        # in flight so extracted text never piles up in memory
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=extraction_jobs.init_worker,
+        ) as pool:
+            in_flight = set()
+            try:
+                while True:
+                    while len(in_flight) < workers * 2:
+                        item = next(queue, None)
+                        if item is None:
+                            break
+                        in_flight.add(pool.submit(ingest_file, item[1]))
+                    if not in_flight:
+                        break
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        result = future.result()
+                        result["key"] = keys[result["path"]]
+                        if self._accept(result, batch, checkpoint) and len(batch) >= batch_size:
+                            self._insert(batch, checkpoint)
+                            batch = []
+            except KeyboardInterrupt:
+                for future in in_flight:
+                    future.cancel()
+                raise
+            finally:
+                if batch:
+                    self._insert(batch, checkpoint)
+
+    def _entry(self, result: Dict[str, Any], status: str, **extra) -> Dict[str, Any]:
+        stat = os.stat(result["path"])
+        return {
+            "path": result["key"], "status": status, "sha256": result.get("sha256"),
+            "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, **extra,
+        }
+
+    def _accept(self, result: Dict[str, Any], batch: List[Dict[str, Any]], checkpoint: Checkpoint) -> bool:
+        if "error" in result:
+            self._fail([result], result["error"], checkpoint)
+            return False
+        if result["sha256"] in checkpoint.hashes or any(r["sha256"] == result["sha256"] for r in batch):
+            self.totals["duplicates"] += 1
+            checkpoint.record([self._entry(result, "done", duplicate=True)])
+            return False
+        batch.append(result)
+        return True
+
+    def _row(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        name = self.options["name"]
+        return {
+            "name": name,
+            "email": self.options["email"],
+            "subject": os.path.splitext(os.path.basename(result["path"]))[0][:255],
+            "publication_date": self.options["publication_date"],
+            "author_source": self.options["author_source"] or name,
+            "text_type": self.options["text_type"],
+            "pdf_file_url": result["pdf_file_url"],
+            "pdf_file_name": uploads.original_filename(result["path"]),
+            "extracted_text": result["text"],
+            "edited_text": result["text"],
+            "status": "pending",
+        }
+
+    def _insert(self, batch: List[Dict[str, Any]], checkpoint: Checkpoint) -> None:
+        supabase = SupabaseSubmission()
+        created = supabase.create_many([self._row(r) for r in batch])
+        # Rows are matched back by storage key, which is unique within a batch
+        # (_accept drops in-batch duplicates). Only rows that did not come back
+        # are retried one by one: the others exist and must not be inserted twice.
+        by_key = {row.get("pdf_file_url"): row for row in created or []}
+        for result in batch:
+            if result["pdf_file_url"] not in by_key:
+                row = supabase.create(self._row(result))
+                if row:
+                    by_key[result["pdf_file_url"]] = row
+        ok = [(r, by_key[r["pdf_file_url"]]) for r in batch if r["pdf_file_url"] in by_key]
+        checkpoint.record([self._entry(r, "done", id=row.get("id")) for r, row in ok])
+        for result, _ in ok:
+            self.totals["files"] += 1
+            self.totals["bytes"] += result["bytes"]
+            self.totals["pages"] += result["pages"]
+        self._fail([r for r in batch if r["pdf_file_url"] not in by_key], "Supabase insert failed", checkpoint)
+
+    def _fail(self, results: List[Dict[str, Any]], error: str, checkpoint: Checkpoint) -> None:
+        if not results:
+            return
+        checkpoint.record([self._entry(r, "failed", error=error) for r in results])
+        self.failures.extend({"path": r["key"], "error": error} for r in results)
+
+    def _report(self, elapsed: float) -> None:
+        t = self.totals
+        elapsed = max(elapsed, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {t['files']} PDFs ({t['pages']} pages, {t['bytes'] / 1e6:.1f} MB) in {elapsed:.1f}s: "
+            f"{t['files'] / elapsed:.2f} files/s, {t['pages'] / elapsed:.1f} pages/s, "
+            f"{t['bytes'] / 1e6 / elapsed:.2f} MB/s. {t['duplicates']} duplicates skipped."
+        ))
+        if self.failures:
+            self.stderr.write(f"{len(self.failures)} failed:")
+            for failure in self.failures:
+                self.stderr.write(f"  {failure['path']}: {failure['error']}")
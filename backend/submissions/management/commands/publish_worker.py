@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from submissions.publish_queue import BATCH_SIZE, MAX_WAIT_SECONDS, publish_due, run_worker
+
+
+class Command(BaseCommand):
+    help = "Drain the local publish queue into batched Hugging Face commits."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--max-wait", type=int, default=MAX_WAIT_SECONDS,
+                            help="Seconds the oldest queued job may wait before a partial batch is published.")
+        parser.add_argument("--interval", type=float, default=5.0, help="Polling interval in seconds.")
+        parser.add_argument("--once", action="store_true", help="Publish everything that is due and exit.")
+
+    def handle(self, *args, **options):
+        if not options["once"]:
+            run_worker(options["batch_size"], options["max_wait"], options["interval"])
+            return
+
+        total = 0
+        while True:
+            published = publish_due(options["batch_size"], force=True)
+            if not published:
+                break
+            total += published
+        self.stdout.write(self.style.SUCCESS(f"Published {total} submissions."))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from submissions import extraction_jobs
+
+
+class Command(BaseCommand):
+    help = "Requeue extraction jobs left behind by a restart or a failed store, and run them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--watch", action="store_true",
+                            help="Keep running and look for stale jobs every --interval seconds.")
+        parser.add_argument("--interval", type=float, default=extraction_jobs.STALE_AFTER.total_seconds() / 3)
+
+    def handle(self, *args, **options):
+        count = extraction_jobs.recover_stale()
+        self.stdout.write(self.style.SUCCESS(f"Requeued {count} extraction jobs."))
+        while options["watch"]:
+            time.sleep(options["interval"])
+            try:
+                count = extraction_jobs.recover_stale()
+            except Exception as e:
+                self.stderr.write(f"Recovery failed: {e}")
+                continue
+            if count:
+                self.stdout.write(f"Requeued {count} extraction jobs.")
+        extraction_jobs.shutdown(wait=True)
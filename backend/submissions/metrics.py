@@ -0,0 +1,346 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; from a cached Supabase call up to a long pdfminer run.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+FLUSH_INTERVAL = 1.0
+PREFIX = "kurmanji_"
+# Totals of processes that have exited, folded out of their own files.
+AGGREGATE_NAME = "aggregate.json"
+FOLD_LOCK_NAME = ".fold.lock"
+FOLD_LOCK_TIMEOUT = 60.0
+_FILE_RE = re.compile(r"^(?:(.+)-)?(\d+)-[0-9a-f]{8}\.json$")
+
+HELP = {
+    "stage_seconds": "Time spent in one stage of the submission pipeline.",
+    "http_request_seconds": "Time to serve a request, by view.",
+    "bytes_total": "Bytes handled by a pipeline stage.",
+    "pages_total": "PDF pages extracted, by engine.",
+    "fallback_pages_total": "Pages whose text came from a fallback engine.",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _setting(name: str, default):
+    # read lazily: pdf_processor, and so this module, is also used without Django settings
+    from django.conf import settings
+    return getattr(settings, name, default) if settings.configured else None
+
+
+def _directory() -> Optional[str]:
+    # None outside Django (benchmarks, scripts): nothing is written then
+    return _setting("METRICS_DIR", os.path.join(tempfile.gettempdir(), "kurmanji-metrics"))
+
+
+class Registry:
+    # Histograms and counters of this process. Web workers, the extraction pool
+    # and management commands each write a snapshot file to METRICS_DIR at most
+    # once per FLUSH_INTERVAL; the endpoint adds all files up and folds those of
+    # exited processes into AGGREGATE_NAME.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.pid = os.getpid()
+        # the host keeps processes of other machines or containers sharing the directory apart
+        self.name = f"{socket.gethostname()}-{self.pid}-{uuid.uuid4().hex[:8]}.json"
+        self.histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self._dirty = False
+        self._flushed_at = 0.0
+
+    def _check_fork(self) -> None:
+        if os.getpid() != self.pid:
+            self._reset()  # a forked child must not overwrite its parent's file
+
+    def observe(self, name: str, value: float, labels: Labels) -> None:
+        with self._lock:
+            self._check_fork()
+            h = self.histograms.get((name, labels))
+            if h is None:
+                h = self.histograms[(name, labels)] = [0.0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    h[i] += 1
+                    break
+            else:
+                h[len(BUCKETS)] += 1
+            h[-1] += value
+            self._dirty = True
+        self.flush(force=False)
+
+    def inc(self, name: str, amount: float, labels: Labels) -> None:
+        with self._lock:
+            self._check_fork()
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + amount
+            self._dirty = True
+        self.flush(force=False)
+
+    def snapshot(self) -> Dict[str, list]:
+        with self._lock:
+            return {
+                "histograms": [[n, list(l), list(h)] for (n, l), h in self.histograms.items()],
+                "counters": [[n, list(l), v] for (n, l), v in self.counters.items()],
+            }
+
+    def flush(self, force: bool = True) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if not self._dirty or (not force and now - self._flushed_at < FLUSH_INTERVAL):
+                return
+            self._dirty = False
+            self._flushed_at = now
+        directory = _directory()
+        if not directory:
+            return
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, os.path.join(directory, self.name))
+        except OSError as e:
+            logger.warning("Could not write metrics: %s", e)
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+_local = threading.local()
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(name: str, value: float, **labels) -> None:
+    registry.observe(name, value, _labels(labels))
+
+
+def inc(name: str, amount: float = 1, **labels) -> None:
+    registry.inc(name, amount, _labels(labels))
+
+
+@contextmanager
+def timed(stage: str, **labels) -> Iterator[None]:
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("stage_seconds", elapsed, stage=stage, outcome=outcome, **labels)
+        stages = getattr(_local, "stages", None)
+        if stages is not None:
+            stages.append((stage, elapsed))
+
+
+Totals = Tuple[Dict[Tuple[str, Labels], List[float]], Dict[Tuple[str, Labels], float]]
+
+
+def _read(path: str) -> Optional[dict]:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _add(totals: Totals, data: dict) -> None:
+    histograms, counters = totals
+    for name, labels, values in data.get("histograms", []):
+        key = (name, tuple(tuple(pair) for pair in labels))
+        if len(values) != len(BUCKETS) + 2:
+            continue  # written with other buckets
+        total = histograms.setdefault(key, [0.0] * len(values))
+        for i, v in enumerate(values):
+            total[i] += v
+    for name, labels, value in data.get("counters", []):
+        key = (name, tuple(tuple(pair) for pair in labels))
+        counters[key] = counters.get(key, 0) + value
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # exists, owned by another user
+    return True
+
+
+def _dead_files(directory: str) -> List[str]:
+    host = socket.gethostname()
+    dead = []
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        m = _FILE_RE.match(os.path.basename(path))
+        # files without a host predate it and can only come from this one
+        if m and m.group(1) in (None, host) and int(m.group(2)) != os.getpid() and not _alive(int(m.group(2))):
+            dead.append(path)
+    return dead
+
+
+def _fold(directory: str) -> None:
+    # Keeps the directory bounded: the files of exited processes are added to
+    # the aggregate and removed. The aggregate lists the files it has absorbed
+    # until they are gone, so a crash between the two steps counts nothing twice.
+    if os.name != "posix":
+        return  # os.kill(pid, 0) is no liveness check on Windows
+    lock = os.path.join(directory, FOLD_LOCK_NAME)
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(lock) > FOLD_LOCK_TIMEOUT:
+                os.remove(lock)  # left by a process that died while folding
+        except OSError:
+            pass
+        return
+    except OSError:
+        return
+    try:
+        aggregate_path = os.path.join(directory, AGGREGATE_NAME)
+        aggregate = _read(aggregate_path) or {}
+        absorbed = set(aggregate.get("folded", []))
+        dead = [p for p in _dead_files(directory) if os.path.basename(p) not in absorbed]
+        for name in absorbed:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+        if not dead and not absorbed:
+            return
+        totals: Totals = ({}, {})
+        _add(totals, aggregate)
+        folded = []
+        for path in dead:
+            data = _read(path)
+            if data is not None:
+                _add(totals, data)
+                folded.append(os.path.basename(path))
+        histograms, counters = totals
+        fd_tmp, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd_tmp, "w") as f:
+            json.dump({
+                "histograms": [[n, list(l), h] for (n, l), h in histograms.items()],
+                "counters": [[n, list(l), v] for (n, l), v in counters.items()],
+                "folded": folded,
+            }, f)
+        os.replace(tmp_path, aggregate_path)
+        for name in folded:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+    except OSError as e:
+        logger.warning("Could not fold metrics of exited processes: %s", e)
+    finally:
+        os.close(fd)
+        try:
+            os.remove(lock)
+        except OSError:
+            pass
+
+
+def _merged() -> Totals:
+    registry.flush()
+    totals: Totals = ({}, {})
+    directory = _directory()
+    if not directory:
+        return totals
+    _fold(directory)
+    aggregate = _read(os.path.join(directory, AGGREGATE_NAME)) or {}
+    absorbed = set(aggregate.get("folded", []))
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        if os.path.basename(path) in absorbed:
+            continue
+        data = _read(path)
+        if data is not None:
+            _add(totals, data)
+    return totals
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    # Prometheus text exposition format 0.0.4.
+    histograms, counters = _merged()
+    lines = []
+    for name in sorted({n for n, _ in histograms}):
+        metric = PREFIX + name
+        lines += [f"# HELP {metric} {HELP.get(name, name)}", f"# TYPE {metric} histogram"]
+        for (n, labels), values in sorted(histograms.items()):
+            if n != name:
+                continue
+            cumulative = 0.0
+            for bound, count in zip(BUCKETS, values):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_format_labels(labels, ('le', repr(bound)))} {_number(cumulative)}")
+            cumulative += values[len(BUCKETS)]
+            lines.append(f"{metric}_bucket{_format_labels(labels, ('le', '+Inf'))} {_number(cumulative)}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {_number(values[-1])}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {_number(cumulative)}")
+    for name in sorted({n for n, _ in counters}):
+        metric = PREFIX + name
+        lines += [f"# HELP {metric} {HELP.get(name, name)}", f"# TYPE {metric} counter"]
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{metric}{_format_labels(labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class RequestMetricsMiddleware:
+    # Times every request by view and, above METRICS_SLOW_REQUEST_SECONDS, logs
+    # it with the pipeline stages that ran inside it.
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_after = float(_setting("METRICS_SLOW_REQUEST_SECONDS", 0) or 0)
+
+    def __call__(self, request):
+        _local.stages = []
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            stages, _local.stages = _local.stages, None
+            match = getattr(request, "resolver_match", None)
+            view = match.view_name if match else "unmatched"
+            observe("http_request_seconds", elapsed, view=view, method=request.method, status=status)
+            if self.slow_after and elapsed >= self.slow_after:
+                breakdown = ", ".join(f"{stage}={seconds:.3f}s" for stage, seconds in stages) or "no stages"
+                logger.warning("Slow request %s %s (%s) took %.3fs: %s",
+                               request.method, request.path, view, elapsed, breakdown)
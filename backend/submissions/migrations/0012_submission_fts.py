@@ -0,0 +1,62 @@
+from django.db import migrations
+
+# External-content FTS5 index over Submission text, kept current by triggers so
+# every insert, update (including upserts from the mirror) and delete is indexed.
+# unicode61 with remove_diacritics 2 folds ê î û ç ş to e i u c s.
+FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS submissions_submission_fts USING fts5(
+        subject, edited_text, extracted_text,
+        content='submissions_submission', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS submissions_submission_fts_ai AFTER INSERT ON submissions_submission BEGIN
+        INSERT INTO submissions_submission_fts(rowid, subject, edited_text, extracted_text)
+        VALUES (new.id, new.subject, new.edited_text, new.extracted_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS submissions_submission_fts_ad AFTER DELETE ON submissions_submission BEGIN
+        INSERT INTO submissions_submission_fts(submissions_submission_fts, rowid, subject, edited_text, extracted_text)
+        VALUES ('delete', old.id, old.subject, old.edited_text, old.extracted_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS submissions_submission_fts_au AFTER UPDATE ON submissions_submission BEGIN
+        INSERT INTO submissions_submission_fts(submissions_submission_fts, rowid, subject, edited_text, extracted_text)
+        VALUES ('delete', old.id, old.subject, old.edited_text, old.extracted_text);
+        INSERT INTO submissions_submission_fts(rowid, subject, edited_text, extracted_text)
+        VALUES (new.id, new.subject, new.edited_text, new.extracted_text);
+    END
+    """,
+    "INSERT INTO submissions_submission_fts(submissions_submission_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS submissions_submission_fts_au",
+    "DROP TRIGGER IF EXISTS submissions_submission_fts_ad",
+    "DROP TRIGGER IF EXISTS submissions_submission_fts_ai",
+    "DROP TABLE IF EXISTS submissions_submission_fts",
+]
+
+
+def _run(statements):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0011_syncstate_submission_remote_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(FTS_SQL), _run(DROP_SQL)),
+    ]
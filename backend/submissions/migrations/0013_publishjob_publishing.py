@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0012_submission_fts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='publishjob',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('publishing', 'Publishing'), ('published', 'Published'), ('failed', 'Failed')], default='queued', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0013_publishjob_publishing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='pdf_file_name',
+            field=models.CharField(blank=True, max_length=255, null=True, verbose_name='Original File Name'),
+        ),
+    ]
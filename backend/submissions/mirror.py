@@ -0,0 +1,92 @@
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Submission, SupabaseSubmission, SyncState
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, "SUBMISSION_MIRROR_ENABLED", False)
+# The panel warns past this age; `sync_submissions --watch` syncs twice as often.
+MAX_STALENESS = timedelta(seconds=getattr(settings, "SUBMISSION_MIRROR_MAX_STALENESS", 30))
+BATCH_SIZE = 500
+SYNC_NAME = SupabaseSubmission.TABLE
+
+MIRRORED_FIELDS = (
+    'name', 'email', 'subject', 'publication_date', 'author_source', 'text_type',
+    'extracted_text', 'edited_text', 'status', 'pdf_file_name',
+)
+
+
+def _parse_dt(value: Optional[str]):
+    return parse_datetime(value) if value else None
+
+
+def _to_model(row: Dict[str, Any]) -> Submission:
+    return Submission(
+        remote_id=row['id'],
+        remote_created_at=_parse_dt(row.get('created_at')),
+        remote_updated_at=_parse_dt(row.get('updated_at')),
+        pdf_file=row.get('pdf_file_url') or '',
+        **{field: row.get(field) or '' for field in MIRRORED_FIELDS},
+    )
+
+
+def upsert_rows(rows: Iterable[Dict[str, Any]]) -> int:
+    objs = [_to_model(row) for row in rows]
+    if objs:
+        Submission.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=['remote_id'],
+            update_fields=[*MIRRORED_FIELDS, 'pdf_file', 'remote_created_at', 'remote_updated_at', 'updated_at'],
+        )
+    return len(objs)
+
+
+def sync(full: bool = False, batch_size: int = BATCH_SIZE) -> int:
+    # Incremental: only rows whose updated_at is past the saved (updated_at, id)
+    # cursor. Remote deletes are only noticed by a full sync.
+    state, _ = SyncState.objects.get_or_create(name=SYNC_NAME)
+    cursor = None if full else (state.cursor or None)
+    started_at = timezone.now()
+
+    count = 0
+    batch = []
+    rows = SupabaseSubmission().iter_rows(batch_size=batch_size, cursor=cursor, key="updated_at")
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            count += upsert_rows(batch)
+            state.cursor = SupabaseSubmission.cursor_for(batch[-1], "updated_at")
+            state.save(update_fields=["cursor"])
+            batch = []
+    if batch:
+        count += upsert_rows(batch)
+        state.cursor = SupabaseSubmission.cursor_for(batch[-1], "updated_at")
+
+    if full:
+        # every row still upstream was just rewritten, bumping its local updated_at
+        removed, _ = Submission.objects.filter(remote_id__isnull=False, updated_at__lt=started_at).delete()
+        if removed:
+            logger.info("Removed %s mirrored submissions deleted upstream", removed)
+
+    state.last_synced_at = timezone.now()
+    state.save(update_fields=["cursor", "last_synced_at"])
+    return count
+
+
+def last_synced_at():
+    # None until sync_submissions has completed once; until then the panel
+    # reads from Supabase.
+    if not ENABLED:
+        return None
+    return SyncState.objects.filter(name=SYNC_NAME).values_list("last_synced_at", flat=True).first()
+
+
+def is_stale(synced_at) -> bool:
+    return synced_at is None or timezone.now() - synced_at > MAX_STALENESS
@@ -1,17 +1,29 @@
-from django.db import models
 from django.conf import settings
-from supabase import create_client
+from django.core.cache import caches
+from django.db import models
+from django.utils import timezone
+from django.utils.connection import ConnectionProxy
+from . import metrics
+from .supabase_client import get_client
 import logging
-from typing import Any, Dict, List, Optional
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# SupabaseSubmission's read cache has its own alias so the project's default
+# cache (sessions, throttling) is not tied to it.
+cache = ConnectionProxy(caches, getattr(settings, "SUBMISSION_CACHE_ALIAS", "submissions"))
+
+
 class Submission(models.Model):
+    STATUS_EXTRACTING = 'extracting'
     STATUS_PENDING = 'pending'
     STATUS_ACCEPTED = 'accepted'
     STATUS_REJECTED = 'rejected'
 
     STATUS_CHOICES = [
+        (STATUS_EXTRACTING, 'Extracting'),
         (STATUS_PENDING, 'Pending'),
         (STATUS_ACCEPTED, 'Accepted'),
         (STATUS_REJECTED, 'Rejected'),
@@ -58,6 +70,9 @@ class Submission(models.Model):
         default='other'
     )
     pdf_file = models.FileField(upload_to='pdfs/')
+    # Storage keys are content hashes; this is the name the submitter uploaded.
+    # Nullable so SQLite adds the column in place and keeps the FTS triggers.
+    pdf_file_name = models.CharField(max_length=255, blank=True, null=True, verbose_name='Original File Name')
     extracted_text = models.TextField(blank=True)
     edited_text = models.TextField(blank=True)
     status = models.CharField(
@@ -68,59 +83,374 @@ class Submission(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Set on rows mirrored from Supabase's submission_logs (see mirror.py).
+    remote_id = models.UUIDField(unique=True, null=True, blank=True)
+    remote_created_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    remote_updated_at = models.DateTimeField(null=True, blank=True)
+
     def __str__(self):
         return f"{self.name} - {self.subject}"
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'remote_created_at'])]
+
+
+class SyncState(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    cursor = models.CharField(max_length=200, blank=True)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.cursor or 'start'}"
+
+class PublishJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_PUBLISHING = 'publishing'
+    STATUS_PUBLISHED = 'published'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_PUBLISHING, 'Publishing'),
+        (STATUS_PUBLISHED, 'Published'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    idempotency_key = models.CharField(max_length=100, unique=True)
+    submission_id = models.CharField(max_length=64, db_index=True)
+    record = models.JSONField()
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_QUEUED,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    shard = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.idempotency_key} ({self.status})"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+
+class ExtractionJob(models.Model):
+    STATE_QUEUED = 'queued'
+    STATE_RUNNING = 'running'
+    STATE_DONE = 'done'
+    STATE_FAILED = 'failed'
+
+    STATE_CHOICES = [
+        (STATE_QUEUED, 'Queued'),
+        (STATE_RUNNING, 'Running'),
+        (STATE_DONE, 'Done'),
+        (STATE_FAILED, 'Failed'),
+    ]
+
+    submission_id = models.CharField(max_length=64, unique=True)
+    pdf_path = models.CharField(max_length=500)
+    sha256 = models.CharField(max_length=64, blank=True)
+    state = models.CharField(
+        max_length=10,
+        choices=STATE_CHOICES,
+        default=STATE_QUEUED,
+    )
+    pages_done = models.PositiveIntegerField(default=0)
+    pages_total = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.submission_id} ({self.state})"
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class ExtractionCache(models.Model):
+    sha256 = models.CharField(max_length=64)
+    extractor_version = models.CharField(max_length=50)
+    text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256} ({self.extractor_version})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sha256', 'extractor_version'], name='unique_extraction_per_version'),
+        ]
+
+
+class DedupSignature(models.Model):
+    doc_id = models.CharField(max_length=64, unique=True)
+    signature = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.doc_id
+
+
+class DedupBucket(models.Model):
+    doc_id = models.CharField(max_length=64, db_index=True)
+    bucket = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"{self.bucket} -> {self.doc_id}"
+
 
 class SupabaseSubmission:
     TABLE = 'submission_logs'
 
+    # Read-through cache: rows by id, list/count results by a generation token
+    # that every write replaces. Rows only replace cached rows with the same or a
+    # newer updated_at, and deletes leave a tombstone, so a slow read that
+    # started before a write cannot put stale data back.
+    CACHE_TIMEOUT = getattr(settings, "SUBMISSION_CACHE_TIMEOUT", 300)
+    CACHE_PREFIX = "submission"
+    _DELETED = "_deleted"
+
     def __init__(self):
-        self.supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+        self.supabase = get_client()
         self.table = self.supabase.table(self.TABLE)
 
+    @classmethod
+    def _row_key(cls, submission_id) -> str:
+        return f"{cls.CACHE_PREFIX}:row:{submission_id}"
+
+    @classmethod
+    def _generation(cls) -> str:
+        gen = cache.get(f"{cls.CACHE_PREFIX}:gen")
+        if gen is None:
+            gen = uuid.uuid4().hex
+            cache.add(f"{cls.CACHE_PREFIX}:gen", gen, None)
+        return gen
+
+    @classmethod
+    def _invalidate_lists(cls) -> None:
+        cache.set(f"{cls.CACHE_PREFIX}:gen", uuid.uuid4().hex, None)
+
+    @classmethod
+    def _remember(cls, row: Dict[str, Any], from_write: bool = False) -> None:
+        key = cls._row_key(row['id'])
+        cached = cache.get(key)
+        if cached is not None and not from_write:
+            if cached.get(cls._DELETED) or (cached.get('updated_at') or '') > (row.get('updated_at') or ''):
+                return
+        cache.set(key, row, cls.CACHE_TIMEOUT)
+
     def create(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         try:
             payload = {"action": "create", **data}
-            res = self.table.insert(payload).execute()
-            return (res.data or [None])[0]
+            with metrics.timed("supabase_insert"):
+                res = self.table.insert(payload).execute()
+            row = (res.data or [None])[0]
         except Exception as e:
             logger.exception("create failed: %s", e)
             return None
+        self._invalidate_lists()
+        if row:
+            self._remember(row, from_write=True)
+            self._mirror_row(row)
+        return row
+
+    def create_many(self, rows: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        # One INSERT for the whole list; PostgREST runs it in a single
+        # transaction, so either every row is created or none is.
+        try:
+            with metrics.timed("supabase_insert", batch="many"):
+                res = self.table.insert([{"action": "create", **data} for data in rows]).execute()
+            created = res.data or []
+        except Exception as e:
+            logger.exception("create_many failed for %s rows: %s", len(rows), e)
+            return None
+        self._invalidate_lists()
+        for row in created:
+            self._remember(row, from_write=True)
+        if created:
+            self._mirror_rows(created)
+        return created
 
     def get(self, submission_id: str) -> Optional[Dict[str, Any]]:
+        cached = cache.get(self._row_key(submission_id))
+        if cached is not None:
+            return None if cached.get(self._DELETED) else cached
         try:
             res = self.table.select("*").eq('id', submission_id).single().execute()
-            return res.data
         except Exception as e:
             logger.exception("get failed: %s", e)
             return None
+        if res.data:
+            self._remember(res.data)
+        return res.data
 
     def update(self, submission_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         try:
             payload = {"action": data.get("action", "update"), **{k:v for k,v in data.items() if k != "action"}}
-            res = self.table.update(payload).eq('id', submission_id).execute()
-            return (res.data or [None])[0]
+            with metrics.timed("supabase_update"):
+                res = self.table.update(payload).eq('id', submission_id).execute()
+            row = (res.data or [None])[0]
         except Exception as e:
             logger.exception("update failed: %s", e)
+            cache.delete(self._row_key(submission_id))
             return None
+        self._invalidate_lists()
+        if row:
+            self._remember(row, from_write=True)
+            self._mirror_row(row)
+        else:
+            cache.delete(self._row_key(submission_id))
+        return row
+
+    # PostgREST puts in_() filters in the URL; keep each request well under proxy limits.
+    UPDATE_MANY_BATCH = 100
+
+    def update_many(self, submission_ids: List[str], data: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        # One filtered UPDATE per batch of ids. Returns the changed rows (ids that
+        # do not exist, or already have the new status, are simply absent) and
+        # the ids of batches that failed.
+        ids = [str(i) for i in submission_ids]
+        payload = {"action": data.get("action", "update"), **{k:v for k,v in data.items() if k != "action"}}
+        rows, failed = [], []
+        for start in range(0, len(ids), self.UPDATE_MANY_BATCH):
+            batch = ids[start:start + self.UPDATE_MANY_BATCH]
+            try:
+                q = self.table.update(payload).in_('id', batch)
+                if "status" in payload:
+                    # no-op transitions must not re-run accept side effects
+                    q = q.neq('status', payload["status"])
+                with metrics.timed("supabase_update", batch="many"):
+                    res = q.execute()
+                rows.extend(res.data or [])
+            except Exception as e:
+                logger.exception("update_many failed for %s ids: %s", len(batch), e)
+                failed.extend(batch)
+        self._invalidate_lists()
+        if failed:
+            cache.delete_many([self._row_key(i) for i in failed])
+        for row in rows:
+            self._remember(row, from_write=True)
+        if rows:
+            self._mirror_rows(rows)
+        return rows, failed
 
     def delete(self, submission_id: str) -> bool:
         try:
             self.table.delete().eq('id', submission_id).execute()
-            return True
         except Exception as e:
             logger.exception("delete failed: %s", e)
             return False
+        cache.set(self._row_key(submission_id), {"id": str(submission_id), self._DELETED: True}, self.CACHE_TIMEOUT)
+        self._invalidate_lists()
+        try:
+            Submission.objects.filter(remote_id=submission_id).delete()
+        except Exception as e:
+            logger.warning("Could not remove %s from the local mirror: %s", submission_id, e)
+        return True
 
-    def list(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _mirror_row(row: Dict[str, Any]) -> None:
+        from .mirror import upsert_rows
         try:
-            q = self.table.select("*")
+            upsert_rows([row])
+        except Exception as e:
+            logger.warning("Could not mirror submission %s locally: %s", row.get('id'), e)
+
+    @staticmethod
+    def _mirror_rows(rows: List[Dict[str, Any]]) -> None:
+        from .mirror import upsert_rows
+        try:
+            upsert_rows(rows)
+        except Exception as e:
+            logger.warning("Could not mirror %s submissions locally: %s", len(rows), e)
+
+    def file_is_shared(self, pdf_key: str, submission_id: str) -> bool:
+        # PDFs are stored by content hash, so several submissions can point at one object.
+        try:
+            res = self.table.select("id").eq('pdf_file_url', pdf_key).neq('id', submission_id).limit(1).execute()
+            return bool(res.data)
+        except Exception as e:
+            logger.exception("file_is_shared failed: %s", e)
+            return True
+
+    def list(self, status: Optional[str] = None, columns: str = "*",
+             limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        key = f"{self.CACHE_PREFIX}:list:{self._generation()}:{status}:{columns}:{limit}:{offset}"
+        rows = cache.get(key)
+        if rows is None:
+            rows = self._list(status, columns, limit, offset)
+            if rows is not None:
+                cache.set(key, rows, self.CACHE_TIMEOUT)
+        return rows or []
+
+    def _list(self, status: Optional[str], columns: str,
+              limit: Optional[int], offset: int) -> Optional[List[Dict[str, Any]]]:
+        try:
+            q = self.table.select(columns)
             if status:
                 q = q.eq('status', status)
-            return q.order('created_at', desc=True).execute().data or []
+            q = q.order('created_at', desc=True)
+            if limit is not None:
+                q = q.range(offset, offset + limit - 1)
+            return q.execute().data or []
         except Exception as e:
             logger.exception("list failed: %s", e)
-            return []
+            return None
+
+    @staticmethod
+    def cursor_for(row: Dict[str, Any], key: str = "created_at") -> str:
+        return f"{row[key]}|{row['id']}"
+
+    def iter_rows(self, status: Optional[str] = None, columns: str = "*", batch_size: int = 500,
+                  cursor: Optional[str] = None, since: Optional[str] = None,
+                  key: str = "created_at") -> Iterator[Dict[str, Any]]:
+        # Oldest first with a (key, id) keyset, so memory stays at one batch and a
+        # scan can resume from cursor_for(last_row, key) and pick up new rows.
+        # Unlike the other methods errors propagate: a silently truncated scan is worse.
+        if columns != "*":
+            wanted = [c.strip() for c in columns.split(",")]
+            columns = ",".join(wanted + [c for c in (key, "id") if c not in wanted])
+
+        while True:
+            q = self.table.select(columns)
+            if status:
+                q = q.eq('status', status)
+            if since:
+                q = q.gte(key, since)
+            if cursor:
+                value, row_id = cursor.rsplit("|", 1)
+                q = q.or_(f'{key}.gt."{value}",and({key}.eq."{value}",id.gt.{row_id})')
+            try:
+                rows = q.order(key).order('id').limit(batch_size).execute().data or []
+            except Exception as e:
+                logger.exception("iter_rows failed: %s", e)
+                raise
+
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            cursor = self.cursor_for(rows[-1], key)
+
+    def count(self, status: Optional[str] = None) -> int:
+        key = f"{self.CACHE_PREFIX}:count:{self._generation()}:{status}"
+        total = cache.get(key)
+        if total is not None:
+            return total
+        try:
+            q = self.table.select("id", count="exact", head=True)
+            if status:
+                q = q.eq('status', status)
+            total = q.execute().count or 0
+        except Exception as e:
+            logger.exception("count failed: %s", e)
+            return 0
+        cache.set(key, total, self.CACHE_TIMEOUT)
+        return total
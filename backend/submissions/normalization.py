@@ -0,0 +1,136 @@
+import re
+import unicodedata
+from typing import Iterable, Iterator
+
+_HYPHENS = "-\u00ad\u2010"
+# horizontal whitespace other than a plain space: tab, NBSP, typographic spaces
+_HSPACE = "\t\u00a0" + "".join(map(chr, range(0x2000, 0x200b))) + "\u202f\u205f\u3000"
+_WS = " \n\r\x0c" + _HSPACE
+# soft hyphens, zero-width marks, replacement chars and stray control characters
+_DROP = "\u00ad\u200b\u200d\u2060\ufeff\ufffd" + "".join(
+    chr(c) for c in (*range(0x00, 0x09), 0x0b, *range(0x0e, 0x20), 0x7f)
+)
+_LOWER = "a-zçêîûşéö"
+_CIRCUMFLEX, _CEDILLA = "\u02c6", "\u00b8"
+
+_CHARS = {
+    # broken ligatures
+    "\ufb00": "ff", "\ufb01": "fi", "\ufb02": "fl", "\ufb03": "ffi", "\ufb04": "ffl",
+    "\ufb05": "st", "\ufb06": "st",
+    # s/S with comma below (Romanian keyboards, some fonts) for Kurmanji ş/Ş
+    "\u0219": "ş", "\u0218": "Ş",
+}
+
+
+def _cls(chars: str) -> str:
+    return "[" + "".join("\\" + c if c in "\\]^-[" else c for c in chars) + "]"
+
+
+# One leading character class lets the regex engine skip ordinary text in C;
+# the lookbehind-guarded tails then pick the rule. A single space or newline
+# between words never matches.
+_PATTERN = re.compile(
+    _cls(_HYPHENS + _WS + "(" + "".join(_CHARS) + _DROP) + "(?:"
+    # line-end hyphenation inside a word: "bajê-\nrên" -> "bajêrên"
+    rf"(?<={_cls(_HYPHENS)})[ \t]*(?:\r\n|\r|\n)[ \t]*(?=[{_LOWER}])"
+    # any other whitespace run: spaces collapse, line breaks are kept, two or
+    # more (a form feed counts as two) become one paragraph break
+    rf"|(?<={_cls(_HSPACE + chr(13) + chr(12))}){_cls(_WS)}*"
+    rf"|(?<=[ \n]){_cls(_WS)}+"
+    # pdfminer placeholders for glyphs without a unicode mapping
+    r"|(?<=\()cid:\d+\)"
+    rf"|(?<={_cls(''.join(_CHARS))})"
+    rf"|(?<={_cls(_DROP)}){_cls(_DROP)}*"
+    ")"
+)
+
+# spacing accents emitted as separate glyphs next to their base letter; rare,
+# so this pass only runs when the text contains one
+_ACCENTS = re.compile(
+    rf"{_CIRCUMFLEX}[aeiouAEIOU]|[aeiouAEIOU]{_CIRCUMFLEX}|{_CEDILLA}[cCsS]|[cCsS]{_CEDILLA}"
+)
+
+
+def _line_breaks(run: str) -> int:
+    return run.count("\n") + run.count("\r") - run.count("\r\n") + 2 * run.count("\x0c")
+
+
+def _whitespace(m: re.Match) -> str:
+    breaks = _line_breaks(m.group())
+    return "\n\n" if breaks > 1 else "\n" if breaks else " "
+
+
+def _hyphen(m: re.Match) -> str:
+    if len(m.group()) == 1:
+        return ""  # lone soft hyphen
+    start = m.start()
+    if m.group()[0] == "\u00ad" or (start and m.string[start - 1].isalpha()):
+        return ""
+    # not inside a word ("12-\n13"): keep the hyphen, tidy the line break
+    return m.group()[0] + "\n"
+
+
+def _accent(m: re.Match) -> str:
+    pair = m.group()
+    mark = "\u0302" if _CIRCUMFLEX in pair else "\u0327"
+    return unicodedata.normalize("NFC", pair.replace(_CIRCUMFLEX, "").replace(_CEDILLA, "") + mark)
+
+
+_HANDLERS = {
+    **{c: _whitespace for c in _WS},
+    **{c: (lambda m: "") for c in _DROP + "("},
+    **{c: (lambda m, c=c: _CHARS[c]) for c in _CHARS},
+    **{c: _hyphen for c in _HYPHENS},
+}
+
+
+def _replace(m: re.Match) -> str:
+    return _HANDLERS[m.group()[0]](m)
+
+
+def _normalize(text: str) -> str:
+    # normalize() already returns the input unchanged when a quick check passes
+    text = unicodedata.normalize("NFC", text)
+    if _CIRCUMFLEX in text or _CEDILLA in text:
+        text = _ACCENTS.sub(_accent, text)
+    return _PATTERN.sub(_replace, text)
+
+
+def normalize(text: str) -> str:
+    return _normalize(text).strip()
+
+
+# Chunks are only cut between two plain letters that could not be inside a
+# "(cid:" placeholder: no rule above matches across such a boundary, and NFC
+# never composes a letter with the letter after it.
+_LOOKBACK = 256
+
+
+def _plain(c: str) -> bool:
+    return c.isalpha() and c != _CIRCUMFLEX
+
+
+def _safe_cut(buffer: str) -> int:
+    for i in range(len(buffer) - 1, max(0, len(buffer) - _LOOKBACK), -1):
+        if _plain(buffer[i]) and _plain(buffer[i - 1]) and "(" not in buffer[max(0, i - 3):i]:
+            return i
+    return 0
+
+
+def normalize_stream(chunks: Iterable[str], max_carry: int = 64 * 1024) -> Iterator[str]:
+    # Same output as normalize() on the joined chunks, apart from the final strip,
+    # holding at most one chunk plus a short carried-over tail in memory.
+    carry = ""
+    for chunk in chunks:
+        buffer = carry + chunk
+        cut = _safe_cut(buffer)
+        if not cut and len(buffer) < max_carry:
+            carry = buffer
+            continue
+        cut = cut or len(buffer)
+        out = _normalize(buffer[:cut])
+        carry = buffer[cut:]
+        if out:
+            yield out
+    if carry:
+        yield _normalize(carry)
@@ -1,21 +1,232 @@
 from __future__ import annotations
-from PyPDF2 import PdfReader
+import logging
+import math
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout, as_completed
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
 from io import StringIO
 from pdfminer.high_level import extract_text_to_fp
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    text = ""
-    reader = PdfReader(pdf_path)
+from . import metrics
+from .extraction_engines import AUTO, Probe, choose, fallbacks, get_engine
+from .normalization import normalize
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[int, int], None]
+
+# Bump when extraction output changes so cached results are not reused;
+# the cache key also carries the engine setting (see extractor_version()).
+EXTRACTOR_VERSION = "engines-3"
+
+PAGE_TIMEOUT = 30.0
+# Below this many pages a process pool costs more than it saves.
+PARALLEL_MIN_PAGES = 16
+
+
+class PageTimeout(Exception):
+    pass
+
+
+@contextmanager
+def _time_limit(seconds: Optional[float]):
+    # SIGALRM only works in the main thread of a process (always true in pool workers),
+    # and only between bytecodes: a page stuck inside PyMuPDF's or pdfminer's C code
+    # is not interrupted. _extract_parallel's overall deadline covers that case.
+    if not seconds or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def _raise(signum, frame):
+        raise PageTimeout(f"page took longer than {seconds}s")
+
+    previous = signal.signal(signal.SIGALRM, _raise)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _extract_page(docs: Dict[str, Any], pdf_path: str, engines: List[str], index: int,
+                  page_timeout: Optional[float]) -> str:
+    # docs caches one open handle per engine, so fallbacks only open the file when needed
+    for name in engines:
+        engine = get_engine(name)
+        try:
+            if name not in docs:
+                docs[name] = engine.open(pdf_path)
+            with _time_limit(page_timeout):
+                t = engine.page_text(docs[name], index)
+            if t:
+                if name != engines[0]:
+                    metrics.inc("fallback_pages_total", engine=name)
+                return t
+        except Exception as e:
+            logger.warning("%s failed on page %s of %s: %s", name, index + 1, pdf_path, e)
+    return ""
+
+
+def _close(docs: Dict[str, Any]) -> None:
+    for name, doc in docs.items():
+        get_engine(name).close(doc)
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int, page_timeout: Optional[float],
+                        engine: str = "pypdf2") -> List[str]:
+    docs: Dict[str, Any] = {}
+    try:
+        return [_extract_page(docs, pdf_path, fallbacks(engine), i, page_timeout) for i in range(start, stop)]
+    finally:
+        _close(docs)
+
+
+def _page_count(pdf_path: str, choice: Probe) -> int:
+    if choice.page_count is not None:
+        return choice.page_count
+    engine = get_engine(choice.engine)
+    doc = engine.open(pdf_path)
+    try:
+        return engine.page_count(doc)
+    finally:
+        engine.close(doc)
+
+
+def extractor_version(engine: str = AUTO) -> str:
+    return f"{EXTRACTOR_VERSION}/{engine}"
+
+
+def extract_text_parallel(
+    pdf_path: str,
+    workers: Optional[int] = None,
+    page_timeout: Optional[float] = PAGE_TIMEOUT,
+    progress: Optional[ProgressCallback] = None,
+    engine: str = AUTO,
+) -> str:
+    with metrics.timed("probe"):
+        choice = choose(pdf_path, engine)
+        total = _page_count(pdf_path, choice)
+    metrics.inc("pages_total", total, engine=choice.engine)
+    workers = workers or os.cpu_count() or 1
+
+    with metrics.timed("extract", engine=choice.engine):
+        return _extract_parallel(pdf_path, choice, total, workers, page_timeout, progress)
+
+
+def _deadline(total: int, chunk_size: int, workers: int, page_timeout: Optional[float],
+              engine: str) -> Optional[float]:
+    # Time the whole document may take if every page used its full budget on
+    # every engine it falls back through, plus one budget for starting the pool.
+    if not page_timeout:
+        return None
+    waves = math.ceil(math.ceil(total / chunk_size) / workers)
+    return (waves * chunk_size * len(fallbacks(engine)) + 1) * page_timeout
+
+
+def _abort(pool: ProcessPoolExecutor) -> None:
+    # shutdown() alone waits for running tasks, which is what we cannot afford here
+    terminate = getattr(pool, "terminate_workers", None)  # Python 3.14+
+    if terminate:
+        terminate()
+    else:
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_parallel(pdf_path: str, choice: Probe, total: int, workers: int,
+                      page_timeout: Optional[float], progress: Optional[ProgressCallback]) -> str:
+    if workers == 1 or total < PARALLEL_MIN_PAGES:
+        pages = _extract_page_range(pdf_path, 0, total, page_timeout, choice.engine)
+        if progress:
+            progress(total, total)
+        return "\n\n".join(t for t in pages if t)
+
+    # a few chunks per worker keeps the pool busy when page costs are uneven
+    chunk_size = max(1, math.ceil(total / (workers * 4)))
+    results = {}
+    done = 0
+    deadline = _deadline(total, chunk_size, workers, page_timeout, choice.engine)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {
+            pool.submit(
+                _extract_page_range, pdf_path, start, min(start + chunk_size, total), page_timeout, choice.engine
+            ): start
+            for start in range(0, total, chunk_size)
+        }
+        for future in as_completed(futures, timeout=deadline):
+            start = futures[future]
+            results[start] = future.result()
+            done += len(results[start])
+            if progress:
+                progress(done, total)
+    except FuturesTimeout:
+        _abort(pool)
+        raise PageTimeout(f"{pdf_path} took longer than {deadline:.0f}s; {done} of {total} pages extracted")
+    except BaseException:
+        _abort(pool)
+        raise
+    pool.shutdown(wait=True)
+
+    return "\n\n".join(t for start in sorted(results) for t in results[start] if t)
+
+
+def extract_text_from_pdf(
+    pdf_path: str,
+    progress: Optional[ProgressCallback] = None,
+    parallel: bool = False,
+    workers: Optional[int] = None,
+    page_timeout: Optional[float] = PAGE_TIMEOUT,
+    engine: str = AUTO,
+    normalized: bool = True,
+) -> str:
+    metrics.inc("bytes_total", os.path.getsize(pdf_path), stage="extract")
+    if parallel:
+        text = extract_text_parallel(
+            pdf_path, workers=workers, page_timeout=page_timeout, progress=progress, engine=engine
+        )
+    else:
+        text = _extract_text_sequential(pdf_path, progress, engine)
+    if not normalized:
+        return text
+    with metrics.timed("normalize"):
+        return normalize(text)
+
+
+def _extract_text_sequential(pdf_path: str, progress: Optional[ProgressCallback], engine: str) -> str:
+    with metrics.timed("probe"):
+        choice = choose(pdf_path, engine)
+    primary = get_engine(choice.engine)
+    logger.debug("Extracting %s with %s (%s)", pdf_path, choice.engine, choice.reason)
+
     parts = []
-    for pg in reader.pages:
-        t = pg.extract_text() or ""
-        if t:
-            parts.append(t.strip())
+    with metrics.timed("extract", engine=choice.engine):
+        doc = primary.open(pdf_path)
+        try:
+            total = primary.page_count(doc)
+            for i in range(total):
+                try:
+                    t = primary.page_text(doc, i)
+                except Exception as e:
+                    logger.warning("%s failed on page %s of %s: %s", choice.engine, i + 1, pdf_path, e)
+                    t = ""
+                if t:
+                    parts.append(t)
+                if progress:
+                    progress(i + 1, total)
+        finally:
+            primary.close(doc)
+    metrics.inc("pages_total", total, engine=choice.engine)
     text = "\n\n".join(parts)
-    
-    if text.strip():
+
+    if text.strip() or choice.engine == "pdfminer":
         return text
     out = StringIO()
-    with open(pdf_path, "rb") as f:
+    with metrics.timed("pdfminer_fallback"), open(pdf_path, "rb") as f:
         extract_text_to_fp(f, out, laparams=None)
     return out.getvalue().strip()
@@ -0,0 +1,149 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Fraction of requests (and extraction jobs) to profile; 0 turns sampling off.
+SAMPLE_RATE = getattr(settings, "PROFILE_SAMPLE_RATE", 0.0)
+# Staff requests carrying this header are always profiled.
+HEADER = getattr(settings, "PROFILE_HEADER", "X-Profile")
+PROFILE_DIR = getattr(settings, "PROFILE_DIR", os.path.join(settings.BASE_DIR, ".profiles"))
+MAX_FILES = getattr(settings, "PROFILE_MAX_FILES", 50)
+
+SORT_KEYS = ("cumulative", "tottime", "ncalls")
+_NAME_RE = re.compile(r"^(\d{8}-\d{6})-([a-z0-9_.-]+)-(\d+)ms-[0-9a-f]{8}\.prof$")
+
+# cProfile cannot run twice at once (Python 3.12+ refuses outright), so a
+# request that comes in while another one is profiled simply runs unprofiled.
+_active = threading.Lock()
+
+
+def _slug(label: str) -> str:
+    return re.sub(r"[^a-z0-9_.]+", "-", label.lower()).strip("-")[:80] or "request"
+
+
+def _files() -> List[Tuple[os.DirEntry, os.stat_result]]:
+    # newest first; another process may be rotating at the same time
+    files = []
+    try:
+        for entry in os.scandir(PROFILE_DIR):
+            if _NAME_RE.match(entry.name):
+                try:
+                    files.append((entry, entry.stat()))
+                except OSError:
+                    continue
+    except OSError:
+        return []
+    return sorted(files, key=lambda f: f[1].st_mtime, reverse=True)
+
+
+def _rotate() -> None:
+    for entry, _ in _files()[MAX_FILES:]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _save(profile: cProfile.Profile, label: str, elapsed: float) -> Optional[str]:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    name = f"{stamp}-{_slug(label)}-{int(elapsed * 1000)}ms-{uuid.uuid4().hex[:8]}.prof"
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile.dump_stats(os.path.join(PROFILE_DIR, name))
+    except OSError as e:
+        logger.warning("Could not save profile %s: %s", name, e)
+        return None
+    _rotate()
+    return name
+
+
+def is_flagged(request) -> bool:
+    user = getattr(request, "user", None)
+    return HEADER in request.headers and bool(user and user.is_staff)
+
+
+@contextmanager
+def profiled(label: str, force: bool = False) -> Iterator[Dict[str, str]]:
+    # Profiles the block when forced or sampled; otherwise costs one random()
+    # call. The caller may replace info["label"] once it knows a better name.
+    info = {"label": label}
+    if not (force or (SAMPLE_RATE and random.random() < SAMPLE_RATE)) or not _active.acquire(blocking=False):
+        yield info
+        return
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError as e:  # another profiler, e.g. a debugger, is active
+        _active.release()
+        logger.debug("Not profiling %s: %s", label, e)
+        yield info
+        return
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        profile.disable()
+        _active.release()
+        name = _save(profile, info["label"], time.perf_counter() - start)
+        if name:
+            logger.info("Saved profile %s", name)
+
+
+class ProfilingMiddleware:
+    # Goes after AuthenticationMiddleware, which the header check needs.
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        flagged = is_flagged(request)
+        if not (flagged or SAMPLE_RATE):
+            return self.get_response(request)
+        with profiled(f"{request.method} {request.path}", force=flagged) as info:
+            response = self.get_response(request)
+            match = getattr(request, "resolver_match", None)
+            if match:
+                info["label"] = f"{request.method} {match.view_name}"
+            return response
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    profiles = []
+    for entry, stat in _files():
+        m = _NAME_RE.match(entry.name)
+        profiles.append({
+            "name": entry.name,
+            "created_at": datetime.strptime(m.group(1), "%Y%m%d-%H%M%S").replace(tzinfo=timezone.utc),
+            "label": m.group(2),
+            "milliseconds": int(m.group(3)),
+            "bytes": stat.st_size,
+        })
+    return profiles
+
+
+def profile_path(name: str) -> Optional[str]:
+    # None unless name is one of ours, so it cannot point outside PROFILE_DIR
+    if not _NAME_RE.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def report(path: str, sort: str = "cumulative", limit: int = 60) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    stats.strip_dirs().sort_stats(sort if sort in SORT_KEYS else "cumulative").print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,167 @@
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import PublishJob
+from .publisher import append_records, build_record, load_manifest, new_shard_name, shard_published
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, "PUBLISH_BATCH_SIZE", 50)
+MAX_WAIT_SECONDS = getattr(settings, "PUBLISH_MAX_WAIT_SECONDS", 60)
+MAX_ATTEMPTS = getattr(settings, "PUBLISH_MAX_ATTEMPTS", 8)
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+# A claim older than this belongs to a worker that died mid-publish.
+CLAIM_TIMEOUT = timedelta(minutes=30)
+
+
+def enqueue(submission: Dict[str, Any]) -> PublishJob:
+    key = str(submission['id'])
+    job, created = PublishJob.objects.get_or_create(
+        idempotency_key=key,
+        defaults={"submission_id": key, "record": build_record(submission)},
+    )
+    # a job being published right now keeps its record; requeueing it would publish it twice
+    if not created and job.status not in (PublishJob.STATUS_PUBLISHED, PublishJob.STATUS_PUBLISHING):
+        job.record = build_record(submission)
+        job.status = PublishJob.STATUS_QUEUED
+        job.next_attempt_at = timezone.now()
+        job.save(update_fields=["record", "status", "next_attempt_at", "updated_at"])
+    return job
+
+
+def _due_jobs(limit: int) -> List[PublishJob]:
+    return list(
+        PublishJob.objects
+        .filter(status=PublishJob.STATUS_QUEUED, next_attempt_at__lte=timezone.now())
+        .order_by('created_at')[:limit]
+    )
+
+
+def _settle_published(jobs: List[PublishJob]) -> List[PublishJob]:
+    # A failed attempt keeps the shard name it claimed: the commit may have
+    # landed even though the client saw a timeout or a 5xx. Jobs whose shard is
+    # at head are done; publishing them under a new name would duplicate them.
+    shards = {j.shard for j in jobs if j.shard}
+    if not shards:
+        return jobs
+    manifest = load_manifest()
+    landed = {shard for shard in shards if shard_published(manifest, shard)}
+    if not landed:
+        return jobs
+    done = [j for j in jobs if j.shard in landed]
+    PublishJob.objects.filter(
+        pk__in=[j.pk for j in done], status=PublishJob.STATUS_QUEUED, shard__in=landed
+    ).update(
+        status=PublishJob.STATUS_PUBLISHED, last_error="",
+        published_at=timezone.now(), updated_at=timezone.now(),
+    )
+    logger.info("%s queued submissions were already published in %s", len(done), ", ".join(sorted(landed)))
+    return [j for j in jobs if j.shard not in landed]
+
+
+def _claim(jobs: List[PublishJob]) -> Tuple[str, List[PublishJob]]:
+    # The conditional update is atomic per row, so of two workers (or a worker
+    # and a bulk accept) racing for a job only one moves it out of "queued".
+    # The shard name the batch will be published as doubles as the claim; a
+    # previous name is only replaced once _settle_published has found it missing.
+    name = new_shard_name()
+    PublishJob.objects.filter(pk__in=[j.pk for j in jobs], status=PublishJob.STATUS_QUEUED).update(
+        status=PublishJob.STATUS_PUBLISHING, shard=name, updated_at=timezone.now()
+    )
+    claimed = PublishJob.objects.filter(status=PublishJob.STATUS_PUBLISHING, shard=name).order_by('created_at')
+    return name, list(claimed)
+
+
+def recover_stale_claims() -> int:
+    # Jobs of a worker that died mid-publish: published if their shard made it
+    # into the manifest, queued again otherwise.
+    stale = PublishJob.objects.filter(
+        status=PublishJob.STATUS_PUBLISHING, updated_at__lt=timezone.now() - CLAIM_TIMEOUT
+    )
+    shards = set(stale.values_list('shard', flat=True))
+    if not shards:
+        return 0
+    manifest = load_manifest()
+    for shard in shards:
+        jobs = stale.filter(shard=shard)
+        if shard_published(manifest, shard):
+            jobs.update(status=PublishJob.STATUS_PUBLISHED, published_at=timezone.now(), updated_at=timezone.now())
+        else:
+            # the shard name stays, the next claim checks it against head again
+            jobs.update(status=PublishJob.STATUS_QUEUED, updated_at=timezone.now())
+        logger.warning("Recovered publish jobs claimed for %s", shard)
+    return len(shards)
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def _mark_failed(jobs: List[PublishJob], error: Exception) -> None:
+    now = timezone.now()
+    for job in jobs:
+        job.attempts += 1
+        job.last_error = str(error)
+        job.status = PublishJob.STATUS_FAILED if job.attempts >= MAX_ATTEMPTS else PublishJob.STATUS_QUEUED
+        job.next_attempt_at = now + _retry_delay(job.attempts)
+        job.save(update_fields=["attempts", "last_error", "status", "next_attempt_at", "updated_at"])
+
+
+def publish_jobs(jobs: List[PublishJob]) -> bool:
+    # Jobs another worker has claimed in the meantime are left to it.
+    if not jobs:
+        return True
+    jobs = _settle_published(jobs)
+    if not jobs:
+        return True
+    name, jobs = _claim(jobs)
+    if not jobs:
+        return True
+    try:
+        shard = append_records([j.record for j in jobs], name=name)
+        if shard is None:
+            raise RuntimeError("The dataset commit did not go through")
+    except Exception as e:
+        logger.error("Publishing %s queued submissions failed: %s", len(jobs), e)
+        _mark_failed(jobs, e)
+        return False
+
+    PublishJob.objects.filter(pk__in=[j.pk for j in jobs]).update(
+        status=PublishJob.STATUS_PUBLISHED,
+        last_error="",
+        published_at=timezone.now(),
+        updated_at=timezone.now(),
+    )
+    logger.info("Published %s queued submissions to %s", len(jobs), shard)
+    return True
+
+
+def publish_due(batch_size: int = BATCH_SIZE, max_wait: int = MAX_WAIT_SECONDS, force: bool = False) -> int:
+    # A batch goes out once it is full or its oldest job has waited max_wait.
+    recover_stale_claims()
+    jobs = _due_jobs(batch_size)
+    if not jobs:
+        return 0
+    if not force and len(jobs) < batch_size:
+        if timezone.now() - jobs[0].created_at < timedelta(seconds=max_wait):
+            return 0
+    return len(jobs) if publish_jobs(jobs) else 0
+
+
+def run_worker(batch_size: int = BATCH_SIZE, max_wait: int = MAX_WAIT_SECONDS,
+               poll_interval: float = 5.0) -> None:
+    logger.info("Publish worker started (batch_size=%s, max_wait=%ss)", batch_size, max_wait)
+    while True:
+        try:
+            published = publish_due(batch_size, max_wait)
+        except Exception as e:
+            logger.exception("Publish worker iteration failed: %s", e)
+            published = 0
+        if not published:
+            time.sleep(poll_interval)
@@ -0,0 +1,316 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from huggingface_hub import CommitOperationAdd, CommitOperationDelete, HfApi, hf_hub_download
+from huggingface_hub.utils import EntryNotFoundError, HfHubHTTPError
+
+from . import metrics
+from .corpus_stats import CorpusStats, save_local
+from .segmentation import iter_sentences
+
+logger = logging.getLogger(__name__)
+
+REPO_ID = getattr(settings, "HF_DATASET_REPO", "happyhackingspace/kurdish-kurmanji-corpus")
+MANIFEST_PATH = "manifest.json"
+STATS_PATH = "stats.json"
+SHARD_DIR = "data"
+COMMIT_RETRIES = 3
+
+# Shards below this size are merged by compact_shards(). Younger shards are
+# left alone so the publish queue can still find a batch's shard by name.
+COMPACT_MAX_SHARD_BYTES = 64 * 1024 * 1024
+COMPACT_MIN_SHARDS = 16
+COMPACT_MIN_AGE = timedelta(days=1)
+
+
+def _api() -> HfApi:
+    return HfApi(token=settings.HUGGINGFACE_TOKEN)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def build_record(submission: Dict[str, Any]) -> Dict[str, Any]:
+    text = (submission.get('edited_text') or "").strip()
+    return {
+        "document_subject": submission.get('subject'),
+        "text_type": submission.get('text_type'),
+        "author_source": submission.get('author_source'),
+        "publication_date": submission.get('publication_date'),
+        "created_at": submission.get('created_at'),
+        "char_count": len(text),
+        "word_count": len(text.split()),
+        "text": text,
+    }
+
+
+def format_text(text: str) -> str:
+    # one sentence per line for kurmanji.txt / the .txt shards
+    return "\n".join(iter_sentences([text]))
+
+
+def _empty_manifest() -> Dict[str, Any]:
+    # kurmanji.json / kurmanji.txt hold everything published before sharding
+    return {
+        "version": 1,
+        "base": {"json": "kurmanji.json", "txt": "kurmanji.txt"},
+        "shards": [],
+    }
+
+
+def _download(filename: str, revision: str) -> str:
+    return hf_hub_download(
+        repo_id=REPO_ID, filename=filename, repo_type="dataset",
+        revision=revision, token=settings.HUGGINGFACE_TOKEN
+    )
+
+
+def load_manifest(revision: Optional[str] = None) -> Dict[str, Any]:
+    try:
+        path = _download(MANIFEST_PATH, revision)
+    except EntryNotFoundError:
+        return _empty_manifest()
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_stats(revision: Optional[str] = None) -> CorpusStats:
+    try:
+        path = _download(STATS_PATH, revision)
+    except EntryNotFoundError:
+        return CorpusStats()
+    with open(path, "r", encoding="utf-8") as f:
+        return CorpusStats.from_dict(json.load(f))
+
+
+def new_shard_name() -> str:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    return f"{SHARD_DIR}/kurmanji-{stamp}-{uuid.uuid4().hex[:8]}"
+
+
+def _commit(build_operations: Callable[[Dict[str, Any], str], Optional[List[Any]]], message: str) -> bool:
+    # build_operations mutates the manifest read at head; it is re-run when
+    # another writer commits first, so it must not have side effects elsewhere.
+    api = _api()
+    for attempt in range(1, COMMIT_RETRIES + 1):
+        head = api.dataset_info(REPO_ID).sha
+        manifest = load_manifest(head)
+        operations = build_operations(manifest, head)
+        if operations is None:
+            return False
+
+        operations.append(CommitOperationAdd(
+            path_in_repo=MANIFEST_PATH,
+            path_or_fileobj=BytesIO(json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")),
+        ))
+        try:
+            with metrics.timed("hub_commit"):
+                api.create_commit(
+                    repo_id=REPO_ID, repo_type="dataset", operations=operations,
+                    commit_message=message, parent_commit=head,
+                )
+            return True
+        except HfHubHTTPError as e:
+            status = getattr(e.response, "status_code", None)
+            if status in (409, 412) and attempt < COMMIT_RETRIES:
+                logger.info("Dataset head moved during commit, retrying (%s/%s)", attempt, COMMIT_RETRIES)
+                continue
+            raise
+    return False
+
+
+def shard_published(manifest: Dict[str, Any], name: str) -> bool:
+    return any(shard["json"] == f"{name}.jsonl" for shard in manifest["shards"])
+
+
+def append_records(records: List[Dict[str, Any]], name: Optional[str] = None) -> Optional[str]:
+    # The publish queue passes the shard name it claimed its jobs under; if a
+    # shard of that name is already at head the commit went through before, so
+    # nothing is published twice. Which document is in which shard is kept in
+    # the local PublishJob table, not in the manifest.
+    name = name or new_shard_name()
+    stats_bytes = None
+    shard_bytes = 0
+    already_published = False
+
+    def build(manifest, head):
+        nonlocal stats_bytes, shard_bytes, already_published
+        already_published = shard_published(manifest, name)
+        if already_published:
+            return None
+
+        # corpus stats are updated with just the new records and committed with the shard
+        stats = load_stats(head)
+        for r in records:
+            stats.add(r)
+        stats_bytes = stats.to_bytes()
+
+        json_bytes = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+        with metrics.timed("segment"):
+            txt_bytes = "".join(format_text(r["text"]) + "\n" for r in records).encode("utf-8")
+        shard_bytes = len(json_bytes) + len(txt_bytes)
+        manifest["shards"].append({
+            "json": f"{name}.jsonl",
+            "txt": f"{name}.txt",
+            "records": len(records),
+            "bytes": shard_bytes,
+            "created_at": _now(),
+        })
+        return [
+            CommitOperationAdd(path_in_repo=f"{name}.jsonl", path_or_fileobj=BytesIO(json_bytes)),
+            CommitOperationAdd(path_in_repo=f"{name}.txt", path_or_fileobj=BytesIO(txt_bytes)),
+            CommitOperationAdd(path_in_repo=STATS_PATH, path_or_fileobj=BytesIO(stats_bytes)),
+        ]
+
+    if not _commit(build, f"Add {len(records)} document(s)"):
+        return name if already_published else None
+    metrics.inc("bytes_total", shard_bytes, stage="hub_commit")
+    _save_stats_locally(stats_bytes)
+    return name
+
+
+def _save_stats_locally(stats_bytes: bytes) -> None:
+    try:
+        save_local(stats_bytes)
+    except OSError as e:
+        logger.warning("Could not write local corpus stats: %s", e)
+
+
+def refresh_local_stats() -> Dict[str, Any]:
+    stats_bytes = load_stats().to_bytes()
+    _save_stats_locally(stats_bytes)
+    return json.loads(stats_bytes)
+
+
+def _iter_records(path: str):
+    # kurmanji.json has been both a JSON array and JSON lines over time
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+            yield from (data if isinstance(data, list) else [data])
+            return
+        except ValueError:
+            f.seek(0)
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning("Skipping unreadable line in %s", path)
+
+
+def rebuild_stats() -> Optional[Dict[str, Any]]:
+    # Full rescan of the base files and every shard; only needed to seed the
+    # stats of an existing dataset or to recover from a lost stats.json.
+    stats_bytes = None
+
+    def build(manifest, head):
+        nonlocal stats_bytes
+        stats = CorpusStats()
+        paths = [manifest["base"]["json"]] + [shard["json"] for shard in manifest["shards"]]
+        for path in paths:
+            try:
+                local_path = _download(path, head)
+            except EntryNotFoundError:
+                continue
+            for record in _iter_records(local_path):
+                if isinstance(record, dict) and record.get("text"):
+                    stats.add(record)
+        stats_bytes = stats.to_bytes()
+        return [CommitOperationAdd(path_in_repo=STATS_PATH, path_or_fileobj=BytesIO(stats_bytes))]
+
+    if not _commit(build, "Rebuild corpus statistics"):
+        return None
+    _save_stats_locally(stats_bytes)
+    return json.loads(stats_bytes)
+
+
+def push_to_huggingface(submission) -> bool:
+    try:
+        with metrics.timed("hub_push"):
+            append_records([build_record(submission)])
+        logger.info("Pushed submission %s to Hugging Face", submission.get('id'))
+        return True
+    except Exception as e:
+        logger.error("Hugging Face push failed: %s", e)
+        return False
+
+
+def _group_small_shards(shards: List[Dict[str, Any]], max_bytes: int,
+                        min_age: timedelta = COMPACT_MIN_AGE) -> List[List[Dict[str, Any]]]:
+    # only contiguous runs of small, old enough shards are merged so record order is kept
+    cutoff = datetime.now(timezone.utc) - min_age
+    groups, current, size = [], [], 0
+    for shard in shards:
+        mergeable = shard["bytes"] < max_bytes and datetime.fromisoformat(shard["created_at"]) <= cutoff
+        if not mergeable or (current and size + shard["bytes"] > max_bytes):
+            groups.append(current)
+            current, size = [], 0
+        if mergeable:
+            current.append(shard)
+            size += shard["bytes"]
+    if current:
+        groups.append(current)
+    return [g for g in groups if len(g) > 1]
+
+
+def compact_shards(max_shard_bytes: int = COMPACT_MAX_SHARD_BYTES, min_shards: int = COMPACT_MIN_SHARDS) -> int:
+    removed = 0
+
+    with tempfile.TemporaryDirectory(prefix="kurmanji-compact-") as tmp_dir:
+        def build(manifest, head):
+            nonlocal removed
+            groups = _group_small_shards(manifest["shards"], max_shard_bytes)
+            if sum(len(g) for g in groups) < min_shards:
+                return None
+
+            operations = []
+            replacement = {}
+            for group in groups:
+                name = new_shard_name()
+                merged = {
+                    "json": f"{name}.jsonl", "txt": f"{name}.txt",
+                    "records": 0, "bytes": 0, "created_at": _now(),
+                }
+                for kind in ("json", "txt"):
+                    local_path = os.path.join(tmp_dir, os.path.basename(merged[kind]))
+                    with open(local_path, "wb") as out:
+                        for shard in group:
+                            with open(_download(shard[kind], head), "rb") as src:
+                                shutil.copyfileobj(src, out)
+                    operations.append(CommitOperationAdd(path_in_repo=merged[kind], path_or_fileobj=local_path))
+                    merged["bytes"] += os.path.getsize(local_path)
+
+                for shard in group:
+                    merged["records"] += shard["records"]
+                    replacement[shard["json"]] = merged
+                    operations.append(CommitOperationDelete(path_in_repo=shard["json"]))
+                    operations.append(CommitOperationDelete(path_in_repo=shard["txt"]))
+
+            # a merged shard takes the slot of its first member
+            shards = []
+            for shard in manifest["shards"]:
+                merged = replacement.get(shard["json"], shard)
+                if shards and shards[-1] is merged:
+                    continue
+                shards.append(merged)
+            manifest["shards"] = shards
+            removed = len(replacement)
+            return operations
+
+        if not _commit(build, "Compact dataset shards"):
+            return 0
+
+    logger.info("Compacted %s dataset shards", removed)
+    return removed
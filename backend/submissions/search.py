@@ -0,0 +1,131 @@
+import re
+from typing import Any, Dict, List, Optional
+
+from django.db import connection, connections
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+FTS_TABLE = "submissions_submission_fts"
+# bm25 column weights: subject, edited_text, extracted_text
+WEIGHTS = (5.0, 1.0, 0.5)
+
+# The sync triggers from migration 0012. SQLite rebuilds a table for most
+# schema changes and drops its triggers on the way, so they are recreated
+# after every migrate (see ensure_triggers).
+TRIGGERS = {
+    f"{FTS_TABLE}_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON submissions_submission BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, subject, edited_text, extracted_text)
+            VALUES (new.id, new.subject, new.edited_text, new.extracted_text);
+        END
+    """,
+    f"{FTS_TABLE}_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON submissions_submission BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, subject, edited_text, extracted_text)
+            VALUES ('delete', old.id, old.subject, old.edited_text, old.extracted_text);
+        END
+    """,
+    f"{FTS_TABLE}_au": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON submissions_submission BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, subject, edited_text, extracted_text)
+            VALUES ('delete', old.id, old.subject, old.edited_text, old.extracted_text);
+            INSERT INTO {FTS_TABLE}(rowid, subject, edited_text, extracted_text)
+            VALUES (new.id, new.subject, new.edited_text, new.extracted_text);
+        END
+    """,
+}
+
+_TOKEN_RE = re.compile(r"\w+")
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"
+
+
+def available() -> bool:
+    return connection.vendor == 'sqlite'
+
+
+def ensure_triggers(using: str = "default") -> List[str]:
+    # Recreates missing triggers and reindexes, since rows written while they
+    # were gone are not in the index. Returns the names it had to recreate.
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return []
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name = %s OR (type = 'trigger' AND tbl_name = %s)",
+            [FTS_TABLE, "submissions_submission"],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if FTS_TABLE not in existing:
+            return []  # migration 0012 has not run yet
+        missing = [name for name in TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+        if missing:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return missing
+
+
+def fts_query(text: str) -> str:
+    # Every word must match; the last one also as a prefix so results follow typing.
+    # Quoting keeps user input from being parsed as FTS5 syntax.
+    words = _TOKEN_RE.findall(text)
+    if not words:
+        return ""
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _highlight(snippet: str) -> str:
+    return mark_safe(escape(snippet).replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>"))
+
+
+def search(text: str, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    from .models import Submission
+
+    query = fts_query(text)
+    if not query or not available():
+        return []
+
+    sql = f"""
+        SELECT s.id, snippet({FTS_TABLE}, 1, %s, %s, '…', 16), bm25({FTS_TABLE}, %s, %s, %s) AS rank
+        FROM {FTS_TABLE}
+        JOIN submissions_submission s ON s.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s AND s.remote_id IS NOT NULL
+    """
+    params = [_MARK_OPEN, _MARK_CLOSE, *WEIGHTS, query]
+    if status:
+        sql += " AND s.status = %s"
+        params.append(status)
+    sql += " ORDER BY rank LIMIT %s"
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        hits = cursor.fetchall()
+
+    objs = Submission.objects.only(
+        'remote_id', 'name', 'email', 'subject', 'text_type', 'status', 'remote_created_at'
+    ).in_bulk([pk for pk, _, _ in hits])
+    return [{
+        'id': objs[pk].remote_id,
+        'name': objs[pk].name,
+        'email': objs[pk].email,
+        'subject': objs[pk].subject,
+        'text_type': objs[pk].text_type,
+        'status': objs[pk].status,
+        'created_at': objs[pk].remote_created_at,
+        'snippet': _highlight(snippet or ""),
+    } for pk, snippet, _ in hits if pk in objs]
+
+
+def matching_ids(text: str, limit: int = 1000) -> List[int]:
+    query = fts_query(text)
+    if not query or not available():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+            [query, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,104 @@
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Lower-cased, without the final period. Only dotted abbreviations that are
+# not also ordinary words; those below never end a sentence.
+ABBREVIATIONS = frozenset({
+    "b.z", "p.z",             # berî / piştî zayînê
+    "hwd", "û.h.w.d",         # û her wekî din (etc.)
+    "bnr",                    # binêre (see)
+    "mîn", "mn",              # mînak (for example)
+    "amd",                    # amadekar (editor)
+    "dr", "prof", "doç", "etc", "vs",
+})
+# Abbreviations that only stand before a number ("r. 12", "hj. 3"); before
+# anything else the period ends the sentence.
+NUMBERED_ABBREVIATIONS = frozenset({
+    "r", "rr",                # rûpel (page), rûpelên
+    "hj", "hejm",             # hejmar (number)
+    "c", "cld",               # cild (volume)
+    "ç",                      # çap (edition)
+    "s",                      # sal (year)
+    "no", "vol",
+})
+
+_OPEN = "\"'“‘«(["
+_CLOSE = "\"'”’»)]"
+
+# A candidate boundary is a paragraph break, or terminal punctuation plus any
+# closing quotes, whitespace up to one line break and the first real character
+# of what follows. A blank line is left to the paragraph alternative, so a
+# lowercase paragraph start cannot hide it. The lookahead needs that character,
+# so a candidate at the end of a chunk is only decided once the next chunk
+# arrives.
+_CANDIDATE = re.compile(
+    r"(?P<para>\n[^\S\n]*\n\s*)"
+    rf"|(?P<term>[.!?…]+)(?P<close>[{re.escape(_CLOSE)}]*)(?P<space>(?=\s)[^\S\n]*\n?[^\S\n]*)"
+    rf"(?=[{re.escape(_OPEN)}]*(?P<next>[^\s{re.escape(_OPEN)}]))"
+)
+
+MAX_SENTENCE_CHARS = 64 * 1024
+
+
+def _is_abbreviation(buffer: str, start: int, end: int, following: str) -> bool:
+    space = max(buffer.rfind(" ", start, end), buffer.rfind("\n", start, end), buffer.rfind("\t", start, end))
+    token = buffer[max(start, space + 1):end].lstrip(_OPEN)
+    if len(token) == 1 and token.isupper():
+        return True  # an initial, "M. Xelîl"
+    token = token.lower()
+    return token in ABBREVIATIONS or (token in NUMBERED_ABBREVIATIONS and following.isdigit())
+
+
+def _clean(sentence: str) -> str:
+    return " ".join(sentence.split())
+
+
+def _scan(buffer: str) -> Tuple[List[str], int]:
+    sentences, start = [], 0
+    for m in _CANDIDATE.finditer(buffer):
+        if m.group("para") is None:
+            if m.group("next").islower() or _is_abbreviation(buffer, start, m.start("term"), m.group("next")):
+                continue
+            end, resume = m.end("close"), m.end("space")
+        else:
+            end, resume = m.start(), m.end()
+        sentence = _clean(buffer[start:end])
+        if sentence:
+            sentences.append(sentence)
+        start = resume
+    return sentences, start
+
+
+def iter_sentences(chunks: Iterable[str], max_sentence_chars: int = MAX_SENTENCE_CHARS) -> Iterator[str]:
+    # Holds only the unfinished sentence between chunks; a run of text with no
+    # boundary longer than max_sentence_chars is cut at its last space.
+    carry = ""
+    for chunk in chunks:
+        buffer = carry + chunk
+        sentences, start = _scan(buffer)
+        yield from sentences
+        carry = buffer[start:]
+        while len(carry) > max_sentence_chars:
+            cut = carry.rfind(" ", 0, max_sentence_chars)
+            cut = cut if cut > 0 else max_sentence_chars
+            yield _clean(carry[:cut])
+            carry = carry[cut:]
+    tail = _clean(carry)
+    if tail:
+        yield tail
+
+
+def split_sentences(text: str) -> List[str]:
+    return list(iter_sentences([text]))
+
+
+def segment_documents(texts: Iterable[str], workers: Optional[int] = None, chunksize: int = 16) -> Iterator[List[str]]:
+    # Sentences per document, in input order. With workers the documents are
+    # spread over a process pool, which pays off for bulk exports.
+    if not workers or workers == 1:
+        for text in texts:
+            yield split_sentences(text)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(split_sentences, texts, chunksize=chunksize)
@@ -0,0 +1,99 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = getattr(settings, "SIGNED_URL_CACHE_SIZE", 2048)
+# Serve a cached URL for this fraction of its lifetime, so a page never
+# links to a URL that is about to expire.
+TTL_FRACTION = 0.8
+
+
+class SignedUrlCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, int], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, bucket: str, key: str, expires: int) -> Optional[str]:
+        cache_key = (bucket, key, expires)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry and entry[1] > time.monotonic():
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[cache_key]
+            self.misses += 1
+            return None
+
+    def put(self, bucket: str, key: str, expires: int, url: str) -> None:
+        cache_key = (bucket, key, expires)
+        with self._lock:
+            self._entries[cache_key] = (url, time.monotonic() + expires * TTL_FRACTION)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+cache = SignedUrlCache()
+
+
+def signed_url(supabase_client, bucket: str, key: str, expires: int = 3600) -> Optional[str]:
+    if not key:
+        return None
+    url = cache.get(bucket, key, expires)
+    if url:
+        return url
+    try:
+        resp = supabase_client.storage.from_(bucket).create_signed_url(key, expires)
+    except Exception as e:
+        logger.warning("Could not generate signed URL: %s", e)
+        return None
+    url = resp.get("signedURL") or resp.get("signed_url")
+    if url:
+        cache.put(bucket, key, expires, url)
+    return url
+
+
+def signed_urls(supabase_client, bucket: str, keys: Iterable[str], expires: int = 3600) -> Dict[str, str]:
+    urls, missing = {}, []
+    for key in dict.fromkeys(k for k in keys if k):
+        url = cache.get(bucket, key, expires)
+        if url:
+            urls[key] = url
+        else:
+            missing.append(key)
+    if not missing:
+        return urls
+
+    try:
+        signed = supabase_client.storage.from_(bucket).create_signed_urls(missing, expires)
+    except Exception as e:
+        logger.warning("Could not generate signed URLs: %s", e)
+        return urls
+    for item in signed:
+        url = item.get("signedURL") or item.get("signedUrl")
+        if url and not item.get("error"):
+            cache.put(bucket, item["path"], expires, url)
+            urls[item["path"]] = url
+    return urls
@@ -0,0 +1,82 @@
+// Sends large PDFs to the resumable upload endpoint in chunks before the form is submitted.
+// An interrupted upload resumes from the offset the server already has.
+(function () {
+    const CHUNK_SIZE = 4 * 1024 * 1024;
+    const THRESHOLD = 8 * 1024 * 1024;
+
+    const form = document.getElementById('submission-form');
+    if (!form) {
+        return;
+    }
+    const fileInput = form.querySelector('input[type="file"][name="pdf_file"]');
+    const status = document.getElementById('upload-status');
+    const csrfToken = form.querySelector('input[name="csrfmiddlewaretoken"]').value;
+
+    function storageKey(file) {
+        return 'upload:' + file.name + ':' + file.size + ':' + file.lastModified;
+    }
+
+    function jsonOrThrow(resp) {
+        return resp.json().then(body => {
+            if (!resp.ok && resp.status !== 409) {
+                throw new Error(body.error || resp.statusText);
+            }
+            return body;
+        });
+    }
+
+    function createUpload(file) {
+        const body = new FormData();
+        body.append('size', file.size);
+        body.append('name', file.name);
+        return fetch(form.dataset.uploadUrl, {
+            method: 'POST', body: body, headers: {'X-CSRFToken': csrfToken},
+        }).then(jsonOrThrow);
+    }
+
+    function resumeUpload(file) {
+        const uploadId = localStorage.getItem(storageKey(file));
+        if (!uploadId) {
+            return createUpload(file);
+        }
+        return fetch(form.dataset.uploadUrl + uploadId + '/')
+            .then(resp => resp.ok ? resp.json() : null)
+            .then(upload => upload && upload.size === file.size ? upload : createUpload(file));
+    }
+
+    function sendChunks(file, upload) {
+        localStorage.setItem(storageKey(file), upload.upload_id);
+        if (upload.offset >= file.size) {
+            return Promise.resolve(upload.upload_id);
+        }
+        status.textContent = 'Uploading… ' + Math.round(100 * upload.offset / file.size) + '%';
+        const chunk = file.slice(upload.offset, upload.offset + CHUNK_SIZE);
+        return fetch(form.dataset.uploadUrl + upload.upload_id + '/', {
+            method: 'PUT',
+            body: chunk,
+            headers: {'X-CSRFToken': csrfToken, 'Upload-Offset': String(upload.offset)},
+        })
+            .then(jsonOrThrow)
+            .then(body => sendChunks(file, {upload_id: upload.upload_id, offset: body.offset}));
+    }
+
+    form.addEventListener('submit', function (event) {
+        const file = fileInput && fileInput.files[0];
+        if (!file || file.size < THRESHOLD) {
+            return;
+        }
+        event.preventDefault();
+        resumeUpload(file)
+            .then(upload => sendChunks(file, upload))
+            .then(uploadId => {
+                localStorage.removeItem(storageKey(file));
+                form.querySelector('input[name="upload_id"]').value = uploadId;
+                fileInput.value = '';
+                status.textContent = 'Upload complete, processing…';
+                form.submit();
+            })
+            .catch(err => {
+                status.textContent = 'Upload interrupted (' + err.message + '). Submit again to resume.';
+            });
+    });
+})();
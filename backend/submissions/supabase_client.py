@@ -0,0 +1,49 @@
+import os
+import threading
+from typing import Optional
+
+import httpx
+from django.conf import settings
+from supabase import Client, ClientOptions, create_client
+
+POOL_SIZE = getattr(settings, "SUPABASE_POOL_SIZE", 20)
+TIMEOUT = getattr(settings, "SUPABASE_TIMEOUT", 30.0)
+CONNECT_TIMEOUT = getattr(settings, "SUPABASE_CONNECT_TIMEOUT", 5.0)
+KEEPALIVE_EXPIRY = getattr(settings, "SUPABASE_KEEPALIVE_EXPIRY", 60.0)
+HTTP2 = getattr(settings, "SUPABASE_HTTP2", True)
+
+_client: Optional[Client] = None
+_client_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _http_client() -> httpx.Client:
+    # postgrest and storage3 send absolute URLs and their own headers on every
+    # request, so one httpx.Client (thread-safe) can serve both.
+    return httpx.Client(
+        http2=HTTP2,
+        follow_redirects=True,
+        timeout=httpx.Timeout(TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=POOL_SIZE,
+            max_keepalive_connections=POOL_SIZE,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def get_client() -> Client:
+    global _client, _client_pid
+    # a forked worker must not share sockets with its parent
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+    with _lock:
+        if _client is None or _client_pid != os.getpid():
+            options = ClientOptions(
+                httpx_client=_http_client(),
+                postgrest_client_timeout=TIMEOUT,
+                storage_client_timeout=int(TIMEOUT),
+            )
+            _client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY, options)
+            _client_pid = os.getpid()
+        return _client
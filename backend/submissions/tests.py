@@ -1,3 +1,1453 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import re
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches as django_caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from huggingface_hub.utils import HfHubHTTPError
+
+from benchmarks import extraction as extraction_benchmark
+from scripts.create_dataset import parse_date
+
+from . import (
+    corpus_stats, dedup, export, extraction_engines, extraction_jobs, metrics, mirror, models, pdf_processor,
+    profiling, publish_queue, publisher, search, signed_urls, supabase_client, uploads, views,
+)
+from .extraction_jobs import NO_TEXT_PLACEHOLDER
+from .management.commands import ingest_pdfs
+from .models import DedupBucket, ExtractionJob, PublishJob, Submission, SupabaseSubmission, SyncState
+from .normalization import normalize, normalize_stream
+from .segmentation import iter_sentences, split_sentences
+
+
+def _chunks(text, rng):
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 12)
+        yield text[i:i + size]
+        i += size
+
+
+class SegmentationTests(SimpleTestCase):
+    TEXTS = [
+        "Sernav: çîrok.\n\nzarok hatin mal. Ew deh sal. Paşê çû.",
+        "Binêre. Ez hatim.",
+        "Li r. 12 binêre. Dr. Xelîl hat. M. Xelîl got: «Werin!» Em çûn.",
+        "Pirtûk di sala 1990 (b.z.) de çap bû... lê kes nexwend? Belê!\n \n  paragrafa din\nrêza din. Dawî",
+        "Ew hat. \n \n lê çû.\r\n\r\nPaşê hat…  \"Na.\" Erê.",
+    ]
+
+    def test_paragraph_break_before_lowercase(self):
+        self.assertEqual(
+            split_sentences("Sernav: çîrok.\n\nzarok hatin mal. Ew deh sal. Paşê çû."),
+            ["Sernav: çîrok.", "zarok hatin mal.", "Ew deh sal.", "Paşê çû."],
+        )
+
+    def test_ordinary_words_end_sentences(self):
+        self.assertEqual(split_sentences("Binêre. Ez hatim."), ["Binêre.", "Ez hatim."])
+
+    def test_abbreviations_and_initials(self):
+        self.assertEqual(
+            split_sentences("Li r. 12 binêre. Dr. Xelîl hat. M. Xelîl got bnr. Mem û Zîn."),
+            ["Li r. 12 binêre.", "Dr. Xelîl hat.", "M. Xelîl got bnr. Mem û Zîn."],
+        )
+        self.assertEqual(split_sentences("Ew çû r. Paşê hat."), ["Ew çû r.", "Paşê hat."])
+
+    def test_no_split_before_lowercase(self):
+        self.assertEqual(split_sentences("Ew hat. lê çû."), ["Ew hat. lê çû."])
+
+    def test_chunking_does_not_change_output(self):
+        rng = random.Random(7)
+        for text in self.TEXTS:
+            expected = split_sentences(text)
+            self.assertEqual(list(iter_sentences(text)), expected)  # one character at a time
+            for _ in range(50):
+                self.assertEqual(list(iter_sentences(_chunks(text, rng))), expected, text)
+
+
+class ParquetDateTests(SimpleTestCase):
+    def test_app_format(self):
+        self.assertEqual(parse_date("15-03-2020"), date(2020, 3, 15))
+        self.assertEqual(parse_date("01-01-1000"), date(1000, 1, 1))
+
+    def test_iso_fallback(self):
+        self.assertEqual(parse_date("2020-03-15"), date(2020, 3, 15))
+        self.assertEqual(parse_date("2020-03-15T10:00:00+00:00"), date(2020, 3, 15))
+
+    def test_empty_and_unreadable(self):
+        self.assertIsNone(parse_date(""))
+        self.assertIsNone(parse_date(None))
+        with self.assertRaises(ValueError):
+            parse_date("2020")
+        with self.assertRaises(ValueError):
+            parse_date("31-02-2020")
+
+
+def _shard(name, size, age_days):
+    created = datetime.now(timezone.utc) - timedelta(days=age_days)
+    return {"json": f"data/{name}.jsonl", "txt": f"data/{name}.txt", "records": 1,
+            "bytes": size, "created_at": created.isoformat()}
+
+
+class PublisherTests(SimpleTestCase):
+    def test_groups_contiguous_small_old_shards(self):
+        shards = [
+            _shard("a", 10, 2), _shard("b", 10, 2), _shard("big", 500, 2),
+            _shard("c", 10, 2), _shard("d", 10, 2), _shard("e", 10, 2),
+        ]
+        groups = publisher._group_small_shards(shards, max_bytes=100)
+        self.assertEqual([[s["json"] for s in g] for g in groups], [
+            ["data/a.jsonl", "data/b.jsonl"], ["data/c.jsonl", "data/d.jsonl", "data/e.jsonl"],
+        ])
+
+    def test_groups_respect_size_and_age(self):
+        shards = [_shard(name, 40, 2) for name in "abcd"]
+        self.assertEqual([len(g) for g in publisher._group_small_shards(shards, max_bytes=100)], [2, 2])
+        young = [_shard("a", 10, 2), _shard("b", 10, 0), _shard("c", 10, 2)]
+        self.assertEqual(publisher._group_small_shards(young, max_bytes=100), [])
+
+    def _commit(self, create_commit):
+        api = mock.Mock()
+        api.dataset_info.return_value.sha = "head"
+        api.create_commit.side_effect = create_commit
+        build = mock.Mock(side_effect=lambda manifest, head: [])
+        with mock.patch.object(publisher, "_api", return_value=api), \
+                mock.patch.object(publisher, "load_manifest", side_effect=lambda head: publisher._empty_manifest()), \
+                mock.patch.object(publisher.logger, "info"):
+            return publisher._commit(build, "test"), build, api
+
+    def test_commit_retries_when_head_moved(self):
+        conflict = HfHubHTTPError("conflict", response=mock.Mock(status_code=409))
+        ok, build, api = self._commit([conflict, None])
+        self.assertTrue(ok)
+        self.assertEqual(build.call_count, 2)
+        self.assertEqual(api.create_commit.call_count, 2)
+
+    def test_commit_gives_up_after_retries_and_on_other_errors(self):
+        conflict = HfHubHTTPError("conflict", response=mock.Mock(status_code=409))
+        with self.assertRaises(HfHubHTTPError):
+            self._commit([conflict] * publisher.COMMIT_RETRIES)
+        forbidden = HfHubHTTPError("forbidden", response=mock.Mock(status_code=403))
+        with self.assertRaises(HfHubHTTPError):
+            self._commit([forbidden, None])
+
+    def test_shard_published(self):
+        manifest = publisher._empty_manifest()
+        manifest["shards"].append(_shard("kurmanji-x", 10, 0))
+        self.assertTrue(publisher.shard_published(manifest, "data/kurmanji-x"))
+        self.assertFalse(publisher.shard_published(manifest, "data/kurmanji-y"))
+
+
+
+class FakeHub:
+    # Just enough of HfApi and hf_hub_download for the publisher: files live in
+    # a dict, every commit is a new head.
+    def __init__(self, tmp_dir):
+        self.tmp_dir = tmp_dir
+        self.files = {}
+        self.commits = 0
+        self.fail_after_commit = 0
+
+    def dataset_info(self, repo_id):
+        return mock.Mock(sha=str(self.commits))
+
+    def create_commit(self, operations, parent_commit, **kwargs):
+        if parent_commit != str(self.commits):
+            raise HfHubHTTPError("conflict", response=mock.Mock(status_code=409))
+        for op in operations:
+            if isinstance(op, publisher.CommitOperationAdd):
+                data = op.path_or_fileobj
+                self.files[op.path_in_repo] = data.getvalue() if hasattr(data, "getvalue") else open(data, "rb").read()
+            else:
+                self.files.pop(op.path_in_repo, None)
+        self.commits += 1
+        if self.fail_after_commit:
+            # the commit landed, but the client only sees a gateway error
+            self.fail_after_commit -= 1
+            raise HfHubHTTPError("bad gateway", response=mock.Mock(status_code=502))
+
+    def download(self, filename, revision):
+        if filename not in self.files:
+            raise publisher.EntryNotFoundError(filename)
+        path = os.path.join(self.tmp_dir, filename.replace("/", "_"))
+        with open(path, "wb") as f:
+            f.write(self.files[filename])
+        return path
+
+    def manifest(self):
+        return json.loads(self.files[publisher.MANIFEST_PATH])
+
+    def patch(self):
+        return mock.patch.multiple(
+            publisher, _api=lambda: self, _download=self.download, _save_stats_locally=lambda b: None,
+        )
+
+
+class CorpusStatsTests(SimpleTestCase):
+    def _records(self, n, seed=0):
+        rng = random.Random(seed)
+        words = extraction_benchmark.WORDS
+        return [publisher.build_record({
+            "id": i, "subject": f"s{i}", "text_type": rng.choice(["news", "literary_text"]),
+            "edited_text": " ".join(rng.choice(words) for _ in range(50)) + f" peyv{seed}x{i}.",
+        }) for i in range(n)]
+
+    def _stats(self, records):
+        stats = corpus_stats.CorpusStats()
+        for record in records:
+            stats.add(record)
+        return stats
+
+    def _comparable(self, stats):
+        data = json.loads(stats.to_bytes())
+        data.pop("updated_at")
+        data["top_tokens"] = dict(data["top_tokens"])  # ties come out in insertion order
+        return data
+
+    def test_merged_halves_equal_one_pass(self):
+        records = self._records(40)
+        merged = self._stats(records[:25])
+        merged.merge(self._stats(records[25:]))
+        self.assertEqual(self._comparable(merged), self._comparable(self._stats(records)))
+
+    def test_serialized_stats_keep_merging(self):
+        records = self._records(30)
+        restored = corpus_stats.CorpusStats.from_dict(json.loads(self._stats(records[:10]).to_bytes()))
+        for record in records[10:]:
+            restored.add(record)
+        self.assertEqual(self._comparable(restored), self._comparable(self._stats(records)))
+        self.assertEqual(self._comparable(corpus_stats.CorpusStats.from_dict(None)),
+                         self._comparable(corpus_stats.CorpusStats()))
+
+    def test_vocabulary_estimate_is_close(self):
+        hll = corpus_stats.HyperLogLog()
+        hll.update(f"peyv{i}" for i in range(20000))
+        self.assertAlmostEqual(hll.count(), 20000, delta=20000 * 0.03)
+        small = corpus_stats.HyperLogLog()
+        small.update(["û", "ez", "tu", "ez"])
+        self.assertEqual(small.count(), 3)
+
+    def test_each_shard_commit_carries_the_updated_stats(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        hub = FakeHub(tmp.name)
+        records = self._records(12)
+        with hub.patch(), mock.patch.object(publisher.logger, "info"):
+            publisher.append_records(records[:5])
+            publisher.append_records(records[5:])
+        published = corpus_stats.CorpusStats.from_dict(json.loads(hub.files[publisher.STATS_PATH]))
+        self.assertEqual(self._comparable(published), self._comparable(self._stats(records)))
+
+
+class PublishQueueTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.hub = FakeHub(tmp.name)
+        patcher = self.hub.patch()
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def _enqueue(self, *ids):
+        return [publish_queue.enqueue({"id": i, "subject": f"s{i}", "edited_text": f"Nivîs {i}."}) for i in ids]
+
+    def test_landed_commit_is_not_published_again(self):
+        self.hub.fail_after_commit = 1
+        self.assertFalse(publish_queue.publish_jobs(self._enqueue(1, 2)))
+        self.assertEqual(len(self.hub.manifest()["shards"]), 1)
+        shard = self.hub.manifest()["shards"][0]["json"][:-len(".jsonl")]
+        self.assertEqual(set(PublishJob.objects.values_list("status", "shard")), {(PublishJob.STATUS_QUEUED, shard)})
+
+        PublishJob.objects.update(next_attempt_at=publish_queue.timezone.now())
+        publish_queue.publish_due(force=True)
+        self.assertEqual(len(self.hub.manifest()["shards"]), 1)
+        self.assertEqual(self.hub.commits, 1)
+        self.assertEqual(set(PublishJob.objects.values_list("status", flat=True)), {PublishJob.STATUS_PUBLISHED})
+
+    def test_failed_commit_is_retried_under_a_new_name(self):
+        with mock.patch.object(self.hub, "create_commit", side_effect=HfHubHTTPError(
+                "unavailable", response=mock.Mock(status_code=503))):
+            self.assertFalse(publish_queue.publish_jobs(self._enqueue(1)))
+        PublishJob.objects.update(next_attempt_at=publish_queue.timezone.now())
+        self.assertEqual(publish_queue.publish_due(force=True), 1)
+        shards = self.hub.manifest()["shards"]
+        self.assertEqual(len(shards), 1)
+        self.assertEqual(shards[0]["json"], PublishJob.objects.get().shard + ".jsonl")
+
+    def test_claimed_jobs_are_left_to_their_worker(self):
+        jobs = self._enqueue(1, 2)
+        PublishJob.objects.filter(pk=jobs[0].pk).update(status=PublishJob.STATUS_PUBLISHING, shard="data/other")
+        self.assertTrue(publish_queue.publish_jobs(jobs))
+        records = self.hub.files[self.hub.manifest()["shards"][0]["json"]].decode().splitlines()
+        self.assertEqual([json.loads(r)["document_subject"] for r in records], ["s2"])
+        self.assertEqual(PublishJob.objects.get(pk=jobs[0].pk).status, PublishJob.STATUS_PUBLISHING)
+
+
+class BlockingStream:
+    # A request body that stops after its first chunk until released.
+    def __init__(self, data):
+        self.chunks = [data[:len(data) // 2], data[len(data) // 2:]]
+        self.started, self.release = threading.Event(), threading.Event()
+
+    def read(self, size):
+        if len(self.chunks) == 1:
+            self.started.set()
+            self.release.wait(5)
+        return self.chunks.pop(0) if self.chunks else b""
+
+
+class ResumableUploadTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.multiple(uploads, SPOOL_DIR=tmp.name, UPLOAD_DIR=os.path.join(tmp.name, "uploads"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_chunks_complete_to_the_declared_size(self):
+        upload_id = uploads.create_upload(6, "client", "a.pdf")
+        self.assertEqual(uploads.append_chunk(upload_id, 0, io.BytesIO(b"abc")), 3)
+        with self.assertRaises(uploads.UploadError):
+            uploads.complete_upload(upload_id)
+        self.assertEqual(uploads.append_chunk(upload_id, 3, io.BytesIO(b"def")), 6)
+        path, sha256 = uploads.complete_upload(upload_id)
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"abcdef")
+        self.assertEqual(sha256, hashlib.sha256(b"abcdef").hexdigest())
+        with self.assertRaises(uploads.UploadError):
+            uploads.append_chunk(upload_id, 6, io.BytesIO(b"g"))
+        self.assertIsNone(uploads.upload_offset(upload_id))
+
+    def test_wrong_offset_and_overlong_data_are_refused(self):
+        upload_id = uploads.create_upload(4, "client")
+        uploads.append_chunk(upload_id, 0, io.BytesIO(b"ab"))
+        with self.assertRaises(uploads.OffsetMismatch) as cm:
+            uploads.append_chunk(upload_id, 0, io.BytesIO(b"ab"))
+        self.assertEqual(cm.exception.offset, 2)
+        with self.assertRaises(uploads.UploadError):
+            uploads.append_chunk(upload_id, 2, io.BytesIO(b"cdef"))
+        self.assertEqual(uploads.upload_offset(upload_id), 2)
+
+    @skipIf(uploads.fcntl is None, "chunks are only locked where fcntl exists")
+    def test_racing_chunks_at_the_same_offset(self):
+        upload_id = uploads.create_upload(8, "client")
+        stream = BlockingStream(b"abcdefgh")
+        result = {}
+        first = threading.Thread(target=lambda: result.update(offset=uploads.append_chunk(upload_id, 0, stream)))
+        first.start()
+        self.assertTrue(stream.started.wait(5))
+        with self.assertRaises(uploads.OffsetMismatch):
+            uploads.append_chunk(upload_id, 0, io.BytesIO(b"abcdefgh"))
+        stream.release.set()
+        first.join(5)
+        self.assertEqual(result["offset"], 8)
+        path, _ = uploads.complete_upload(upload_id)
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"abcdefgh")
+
+    def test_open_uploads_are_capped_per_client(self):
+        for _ in range(uploads.MAX_OPEN_UPLOADS_PER_CLIENT):
+            uploads.create_upload(1, "busy")
+        with self.assertRaises(uploads.TooManyUploads):
+            uploads.create_upload(1, "busy")
+        uploads.create_upload(1, "other")
+
+    def test_expired_uploads_are_dropped(self):
+        upload_id = uploads.create_upload(1, "client")
+        old = time.time() - uploads.UPLOAD_TTL_SECONDS - 1
+        os.utime(uploads._part_path(upload_id), (old, old))
+        uploads.drop_expired_uploads()
+        self.assertIsNone(uploads.upload_offset(upload_id))
+        self.assertEqual(os.listdir(uploads.UPLOAD_DIR), [])
+
+
+class ContentStoreTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(uploads, "SPOOL_DIR", tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _spool(self, data):
+        return uploads.spool_uploaded_file(SimpleUploadedFile("a.pdf", data))
+
+    def test_pdfs_are_stored_under_their_hash_once(self):
+        path, sha256 = self._spool(b"%PDF-1.4 naverok")
+        self.assertEqual(sha256, hashlib.sha256(b"%PDF-1.4 naverok").hexdigest())
+        storage = mock.Mock()
+        storage.exists.return_value = False
+        self.assertEqual(uploads.store_pdf(storage, path, sha256), f"{sha256}.pdf")
+        self.assertEqual(storage.upload.call_args.args[0], f"{sha256}.pdf")
+
+        storage.reset_mock()
+        storage.exists.return_value = True
+        self.assertEqual(uploads.store_pdf(storage, path, sha256), f"{sha256}.pdf")
+        storage.upload.assert_not_called()
+
+    def test_storage_errors_fall_back_to_uploading(self):
+        path, sha256 = self._spool(b"%PDF-1.4")
+        storage = mock.Mock()
+        storage.exists.side_effect = ConnectionError("timeout")
+        with mock.patch.object(uploads.logger, "warning"):
+            uploads.store_pdf(storage, path, sha256)
+        storage.upload.assert_called_once()
+
+    def test_original_filename_drops_client_paths(self):
+        self.assertEqual(uploads.original_filename("C:\\Belge\\çîrok.pdf"), "çîrok.pdf")
+        self.assertEqual(uploads.original_filename("../../etc/passwd"), "passwd")
+        self.assertEqual(uploads.original_filename(None), "")
+
+
+class ExtractionQueueTests(TestCase):
+    def setUp(self):
+        self.executor = mock.Mock()
+        patchers = [
+            mock.patch.object(extraction_jobs, "_get_executor", return_value=self.executor),
+            mock.patch.object(extraction_jobs, "_store", return_value=True),
+            mock.patch.object(extraction_jobs.metrics.registry, "flush"),
+            mock.patch("submissions.pdf_processor.extract_text_from_pdf", return_value="Nivîs."),
+        ]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+            self.extract = patcher.start()
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def _job(self, state, age=timedelta(0), error=""):
+        job = ExtractionJob.objects.create(submission_id=str(ExtractionJob.objects.count() + 1),
+                                           pdf_path="/nonexistent.pdf", state=state, error=error)
+        ExtractionJob.objects.filter(pk=job.pk).update(updated_at=publish_queue.timezone.now() - age)
+        return job
+
+    def test_submit_does_not_recover_other_jobs(self):
+        self._job(ExtractionJob.STATE_RUNNING, age=timedelta(hours=1))
+        job = extraction_jobs.submit("new", "/nonexistent.pdf")
+        self.executor.submit.assert_called_once_with(extraction_jobs.run_job, job.pk, False)
+
+    def test_job_is_extracted_once(self):
+        job = self._job(ExtractionJob.STATE_QUEUED)
+        extraction_jobs.run_job(job.pk)
+        extraction_jobs.run_job(job.pk)
+        self.assertEqual(self.extract.call_count, 1)
+        self.assertEqual(ExtractionJob.objects.get(pk=job.pk).state, ExtractionJob.STATE_DONE)
+
+    def test_extractions_are_cached_by_content(self):
+        sha256 = hashlib.sha256(b"pdf").hexdigest()
+        first = extraction_jobs.submit("1", "/nonexistent.pdf", sha256)
+        extraction_jobs.run_job(first.pk)
+        self.assertEqual(extraction_jobs.cached_text(sha256), "Nivîs.")
+
+        second = extraction_jobs.submit("2", "/nonexistent.pdf", sha256)
+        extraction_jobs.run_job(second.pk)
+        self.assertEqual(self.extract.call_count, 1)
+        extraction_jobs._store.assert_called_with("2", "Nivîs.")
+        with mock.patch.object(extraction_jobs, "EXTRACTOR_VERSION", "next"):
+            self.assertIsNone(extraction_jobs.cached_text(sha256))
+
+    def test_running_job_is_left_to_its_worker(self):
+        job = self._job(ExtractionJob.STATE_RUNNING)
+        extraction_jobs.run_job(job.pk)
+        self.extract.assert_not_called()
+        self.assertEqual(ExtractionJob.objects.get(pk=job.pk).state, ExtractionJob.STATE_RUNNING)
+
+    def test_stale_jobs_are_recovered_once(self):
+        stale = [
+            self._job(ExtractionJob.STATE_RUNNING, age=timedelta(hours=1)),
+            self._job(ExtractionJob.STATE_FAILED, age=timedelta(hours=1), error=extraction_jobs.STORE_FAILED),
+        ]
+        self._job(ExtractionJob.STATE_RUNNING)
+        self._job(ExtractionJob.STATE_FAILED, age=timedelta(hours=1), error="broken PDF")
+        listed = list(ExtractionJob.objects.filter(pk__in=[j.pk for j in stale]))
+        self.assertEqual(extraction_jobs.recover_stale(), 2)
+
+        # a second process that listed the same rows loses the conditional update
+        real_filter = ExtractionJob.objects.filter
+        with mock.patch.object(ExtractionJob.objects, "filter",
+                               side_effect=lambda *a, **kw: listed if a else real_filter(*a, **kw)):
+            self.assertEqual(extraction_jobs.recover_stale(), 0)
+        self.assertEqual(sorted(c.args[1] for c in self.executor.submit.call_args_list), [j.pk for j in stale])
+        for job in stale:
+            extraction_jobs.run_job(job.pk)
+        self.assertEqual(self.extract.call_count, 2)
+
+
+def _stuck_page_range(pdf_path, start, stop, page_timeout, engine):
+    # stands in for a page stuck in C code, where SIGALRM cannot reach it
+    time.sleep(60)
+
+
+class ExtractionTests(SimpleTestCase):
+    @skipIf(extraction_engines.fitz is None, "PyMuPDF writes the test document")
+    def test_pdfminer_pages_match_whole_document_extraction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "doc.pdf")
+            doc = extraction_engines.fitz.open()
+            for i in range(5):
+                doc.new_page().insert_text((72, 72), f"Rûpel {i}: ez çûm bajêr.")
+            doc.save(path)
+
+            engine = extraction_engines.get_engine("pdfminer")
+            handle = engine.open(path)
+            try:
+                pages = [engine.page_text(handle, i) for i in range(engine.page_count(handle))]
+            finally:
+                engine.close(handle)
+            expected = []
+            for i in range(5):
+                out = io.StringIO()
+                with open(path, "rb") as f:
+                    pdf_processor.extract_text_to_fp(f, out, page_numbers=[i], laparams=None)
+                expected.append(out.getvalue().strip())
+        self.assertEqual(pages, expected)
+
+    def test_deadline(self):
+        self.assertIsNone(pdf_processor._deadline(100, 5, 4, None, "pymupdf"))
+        # 20 chunks over 4 workers: 5 waves of 5 pages, each page on 2 engines
+        self.assertEqual(pdf_processor._deadline(100, 5, 4, 1.0, "pymupdf"), 51.0)
+        self.assertEqual(pdf_processor._deadline(100, 5, 4, 1.0, "pdfminer"), 26.0)
+
+    def test_stuck_pool_is_aborted_at_the_deadline(self):
+        choice = extraction_engines.Probe("pdfminer", 32, True, "test")
+        processes = []
+        real_abort = pdf_processor._abort
+
+        def abort(pool):
+            processes.extend(pool._processes.values())
+            real_abort(pool)
+
+        started = time.monotonic()
+        with mock.patch.object(pdf_processor, "_extract_page_range", _stuck_page_range), \
+                mock.patch.object(pdf_processor, "_abort", abort):
+            with self.assertRaises(pdf_processor.PageTimeout):
+                pdf_processor._extract_parallel("doc.pdf", choice, 32, 2, 0.02, None)
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertTrue(processes)
+        for process in processes:
+            process.join(5)
+            self.assertFalse(process.is_alive())
+
+
+class FakeEngine(extraction_engines.Engine):
+    def __init__(self, name, pages):
+        self.name = name
+        self.pages = pages
+        self.opened = 0
+
+    def open(self, pdf_path):
+        self.opened += 1
+        return self.pages
+
+    def page_count(self, doc):
+        return len(doc)
+
+    def page_text(self, doc, index):
+        if isinstance(doc[index], Exception):
+            raise doc[index]
+        return doc[index]
+
+
+class EngineTests(SimpleTestCase):
+    def _pdf(self, pages):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "doc.pdf")
+        doc = extraction_engines.fitz.open()
+        for text in pages:
+            page = doc.new_page()
+            if text:
+                page.insert_text((72, 72), text)
+        doc.save(path)
+        return path
+
+    def test_unknown_engine_names_the_available_ones(self):
+        with self.assertRaisesRegex(ValueError, "available: .*pdfminer"):
+            extraction_engines.choose("doc.pdf", "tesseract")
+
+    def test_configured_engine_skips_the_probe(self):
+        with mock.patch.object(extraction_engines, "probe") as probe:
+            choice = extraction_engines.choose("doc.pdf", "pdfminer")
+        probe.assert_not_called()
+        self.assertEqual((choice.engine, choice.page_count), ("pdfminer", None))
+        self.assertEqual(extraction_engines.fallbacks("pdfminer"), ["pdfminer"])
+        self.assertEqual(extraction_engines.fallbacks("pymupdf"), ["pymupdf", "pdfminer"])
+
+    @skipIf(extraction_engines.fitz is None, "PyMuPDF writes the test document")
+    def test_probe_picks_pymupdf_for_text_and_scans(self):
+        text = extraction_engines.probe(self._pdf(["Ez diçim malê.", "Rûpela duyem."]))
+        self.assertEqual((text.engine, text.page_count, text.has_text), ("pymupdf", 2, True))
+        scan = extraction_engines.probe(self._pdf(["", ""]))
+        self.assertEqual((scan.engine, scan.has_text, scan.reason), ("pymupdf", False, "no text layer"))
+
+    @skipIf(extraction_engines.fitz is None, "PyMuPDF writes the test document")
+    def test_probe_without_pymupdf_uses_pypdf2(self):
+        path = self._pdf(["Ez diçim malê."])
+        engines = {n: e for n, e in extraction_engines.ENGINES.items() if n != "pymupdf"}
+        with mock.patch.dict(extraction_engines.ENGINES, engines, clear=True):
+            choice = extraction_engines.probe(path)
+        self.assertEqual((choice.engine, choice.page_count), ("pypdf2", 1))
+
+    def test_empty_and_failing_pages_fall_back_to_pdfminer(self):
+        primary = FakeEngine("fake", ["Yek", "", ValueError("bad font")])
+        pdfminer = FakeEngine("pdfminer", ["yek", "du", "sê"])
+        with mock.patch.dict(extraction_engines.ENGINES, {"fake": primary, "pdfminer": pdfminer}), \
+                mock.patch.object(pdf_processor.logger, "warning"), \
+                mock.patch.object(metrics, "inc") as inc:
+            pages = pdf_processor._extract_page_range("doc.pdf", 0, 3, None, "fake")
+        self.assertEqual(pages, ["Yek", "du", "sê"])
+        self.assertEqual((primary.opened, pdfminer.opened), (1, 1))
+        self.assertEqual(inc.call_args_list, [mock.call("fallback_pages_total", engine="pdfminer")] * 2)
+
+
+class BenchmarkTests(SimpleTestCase):
+    TRUTH = "Şev hat û ez çûm bajêr. Berf dibare li çiyayê spî."
+
+    def _summary(self, pages_per_sec=100.0, rss=80.0, words=1.0, errors=0):
+        return {"summary": {"sequential/pymupdf": {
+            "documents": 8, "errors": errors, "pages_per_sec": pages_per_sec, "peak_rss_mb": rss,
+            "fidelity": {"words": words, "order": 1.0, "diacritics": 1.0},
+        }}}
+
+    def test_fidelity(self):
+        self.assertEqual(extraction_benchmark.fidelity(self.TRUTH, self.TRUTH),
+                         {"words": 1.0, "order": 1.0, "diacritics": 1.0})
+        shuffled = " ".join(reversed(self.TRUTH.split()))
+        scores = extraction_benchmark.fidelity(shuffled, self.TRUTH)
+        self.assertEqual(scores["words"], 1.0)
+        self.assertLess(scores["order"], 0.5)
+        folded = self.TRUTH.replace("ş", "s").replace("Ş", "S").replace("ê", "e")
+        self.assertEqual(extraction_benchmark.fidelity(folded, self.TRUTH)["diacritics"], 0.625)  # 5 of 8
+        self.assertEqual(extraction_benchmark.fidelity("", self.TRUTH)["words"], 0.0)
+
+    def test_summary_reports_the_worst_document(self):
+        rows = [
+            {"pages": 10, "seconds": 1.0, "peak_rss_mb": 50.0,
+             "fidelity": {"words": 1.0, "order": 0.9, "diacritics": 1.0}},
+            {"pages": 30, "seconds": 1.0, "peak_rss_mb": 70.0,
+             "fidelity": {"words": 0.8, "order": 1.0, "diacritics": 1.0}},
+            {"pages": 5, "error": "exit code -9"},
+        ]
+        summary = extraction_benchmark.summarize(rows)
+        self.assertEqual((summary["documents"], summary["errors"], summary["pages_per_sec"]), (3, 1, 20.0))
+        self.assertEqual(summary["peak_rss_mb"], 70.0)
+        self.assertEqual(summary["fidelity"], {"words": 0.8, "order": 0.9, "diacritics": 1.0})
+
+    def test_compare_flags_regressions_past_the_thresholds(self):
+        baseline = self._summary()
+        self.assertEqual(extraction_benchmark.compare(self._summary(pages_per_sec=95.0), baseline, 0.1, 0.2, 0.01), [])
+        regressions = extraction_benchmark.compare(
+            self._summary(pages_per_sec=80.0, rss=120.0, words=0.9, errors=1), baseline, 0.1, 0.2, 0.01
+        )
+        self.assertEqual(len(regressions), 4)
+        self.assertEqual(extraction_benchmark.compare(self._summary(), {"summary": {}}, 0.1, 0.2, 0.01), [])
+
+    @skipIf(extraction_engines.fitz is None, "PyMuPDF writes the benchmark corpus")
+    def test_corpus_is_reused_for_the_same_seed(self):
+        specs = [{"name": "tiny", "pages": 2, "font": "helvetica", "columns": 2, "diacritics": True}]
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(extraction_benchmark, "SPECS", specs):
+            manifest = extraction_benchmark.generate_corpus(tmp, seed=1)
+            with mock.patch.object(extraction_benchmark, "_write_pdf") as write:
+                self.assertEqual(extraction_benchmark.generate_corpus(tmp, seed=1), manifest)
+            write.assert_not_called()
+            with open(manifest["documents"][0]["truth"], encoding="utf-8") as f:
+                truth = f.read()
+            with mock.patch.object(pdf_processor.logger, "debug"):
+                text = pdf_processor.extract_text_from_pdf(manifest["documents"][0]["pdf"], engine="pymupdf")
+        self.assertGreater(extraction_benchmark.fidelity(text, truth)["words"], 0.9)
+
+
+class IngestTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.command = ingest_pdfs.Command()
+        self.command.options = {
+            "name": "Library", "email": "l@example.org", "author_source": "", "text_type": "other",
+            "publication_date": "01-01-1000",
+        }
+        self.command.totals = {"files": 0, "bytes": 0, "pages": 0, "duplicates": 0}
+        self.command.failures = []
+        self.checkpoint = ingest_pdfs.Checkpoint(os.path.join(self.dir, ingest_pdfs.CHECKPOINT_NAME))
+        self.addCleanup(self.checkpoint.close)
+
+    def _result(self, name):
+        path = os.path.join(self.dir, f"{name}.pdf")
+        with open(path, "wb") as f:
+            f.write(name.encode())
+        return {"path": path, "key": f"{name}.pdf", "sha256": name * 8, "pdf_file_url": f"{name * 8}.pdf",
+                "text": "Nivîs.", "bytes": 3, "pages": 1}
+
+    def _insert(self, batch, create_many):
+        supabase = mock.Mock()
+        supabase.create_many.side_effect = create_many
+        supabase.create.side_effect = lambda row: {"id": "single-" + row["pdf_file_url"], **row}
+        with mock.patch.object(ingest_pdfs, "SupabaseSubmission", return_value=supabase):
+            self.command._insert(batch, self.checkpoint)
+        return supabase
+
+    def test_short_batch_insert_only_retries_missing_rows(self):
+        batch = [self._result(n) for n in ("aaa", "bbb", "ccc")]
+        # the response lists fewer rows, and not in batch order
+        supabase = self._insert(batch, lambda rows: [{"id": "2", **rows[2]}, {"id": "0", **rows[0]}])
+        missing = batch[1]["pdf_file_url"]
+        self.assertEqual([c.args[0]["pdf_file_url"] for c in supabase.create.call_args_list], [missing])
+        with open(self.checkpoint.path) as f:
+            ids = {entry["path"]: entry["id"] for entry in map(json.loads, f)}
+        self.assertEqual(ids, {"aaa.pdf": "0", "bbb.pdf": "single-" + missing, "ccc.pdf": "2"})
+        self.assertEqual(self.command.totals["files"], 3)
+
+    def test_failed_batch_insert_falls_back_to_single_rows(self):
+        batch = [self._result(n) for n in ("aaa", "bbb")]
+        supabase = self._insert(batch, lambda rows: None)
+        self.assertEqual(supabase.create.call_count, 2)
+        self.assertEqual(self.command.failures, [])
+
+    def test_publication_date_argument(self):
+        self.assertEqual(ingest_pdfs.publication_date("15-03-2020"), "15-03-2020")
+        with self.assertRaises(ingest_pdfs.argparse.ArgumentTypeError):
+            ingest_pdfs.publication_date("2020-03-15")
+
+class NormalizationTests(SimpleTestCase):
+    CASES = [
+        ("bajê-\nrên", "bajêrên"),
+        ("12-\n13", "12-\n13"),
+        ("a  b\t\u00a0c", "a b c"),
+        ("a\n\n\n b", "a\n\nb"),
+        ("\ufb01n", "fin"),
+        ("\u0219ev", "şev"),
+        ("x(cid:12)y", "xy"),
+        ("so\u00adft", "soft"),
+        ("e\u02c6", "ê"),
+        ("  x  ", "x"),
+    ]
+
+    def test_rules(self):
+        for raw, expected in self.CASES:
+            self.assertEqual(normalize(raw), expected, raw)
+
+    def test_stream_matches_whole_text(self):
+        text = "Pirtûka bajê-\nrên  kevn\u00a0(cid:3) \u0219ev.\n\n\nDi\ufb01n so\u00adft. " * 40
+        rng = random.Random(3)
+        for _ in range(20):
+            self.assertEqual("".join(normalize_stream(_chunks(text, rng))).strip(), normalize(text))
+
+
+class DedupTests(SimpleTestCase):
+    TEXT = " ".join(f"peyv{i} û gotin{i % 7}" for i in range(200))
+
+    def test_similarity(self):
+        sig = dedup.signature(self.TEXT)
+        self.assertEqual(dedup.similarity(sig, dedup.signature(self.TEXT)), 1.0)
+        edited = self.TEXT.replace("peyv50 ", "peyva nû ")
+        self.assertGreater(dedup.similarity(sig, dedup.signature(edited)), 0.8)
+        other = " ".join(f"nivîs{i} ji bo{i % 5}" for i in range(200))
+        self.assertLess(dedup.similarity(sig, dedup.signature(other)), 0.1)
+
+    def test_signature_round_trip(self):
+        sig = dedup.signature(self.TEXT)
+        self.assertEqual(len(sig), dedup.NUM_HASHES)
+        self.assertEqual(dedup._unpack(dedup._pack(sig)), sig)
+
+    def test_indexable(self):
+        self.assertTrue(dedup.indexable(self.TEXT))
+        for text in ("", "   ", None, NO_TEXT_PLACEHOLDER, " ... "):
+            self.assertFalse(dedup.indexable(text), text)
+
+
+
+class DedupIndexTests(TestCase):
+    A = DedupTests.TEXT
+    B = " ".join(f"nivîs{i} ji bo{i % 5}" for i in range(200))
+    C = " ".join(f"helbest{i} li ser{i % 3}" for i in range(200))
+
+    def _found(self, text):
+        return [doc_id for doc_id, _ in dedup.near_duplicates(text)]
+
+    def test_rebuild_keeps_the_old_index_until_the_scan_is_done(self):
+        dedup.bulk_add([("a", self.A), ("b", self.B)])
+        seen_during_scan = []
+
+        def documents():
+            yield "a", self.A
+            seen_during_scan.append(self._found(self.B))
+            yield "c", self.C
+
+        self.assertEqual(dedup.rebuild(documents(), batch_size=1), 2)
+        self.assertEqual(seen_during_scan, [["b"]])
+        self.assertEqual(self._found(self.B), [])
+        self.assertEqual(self._found(self.A), ["a"])
+        self.assertEqual(self._found(self.C), ["c"])
+        self.assertFalse(DedupBucket.objects.filter(doc_id="b").exists())
+
+    def test_failed_rebuild_leaves_the_index_in_place(self):
+        dedup.bulk_add([("a", self.A), ("b", self.B)])
+
+        def documents():
+            yield "a", self.A
+            raise RuntimeError("Supabase went away")
+
+        with self.assertRaises(RuntimeError):
+            dedup.rebuild(documents(), batch_size=1)
+        self.assertEqual(self._found(self.B), ["b"])
+        self.assertEqual(dedup.rebuild(iter([])), 0)
+        self.assertEqual(self._found(self.B), ["b"])
+
+    def test_remove(self):
+        dedup.bulk_add([("a", self.A), ("b", self.B)])
+        dedup.bulk_remove(["a"])
+        self.assertEqual(self._found(self.A), [])
+        self.assertEqual(self._found(self.B), ["b"])
+
+
+
+class SearchTests(TestCase):
+    def _submission(self, subject, text):
+        return Submission.objects.create(
+            name="N", email="n@example.org", subject=subject, edited_text=text, remote_id=uuid.uuid4(),
+        )
+
+    def test_query_quotes_words_and_prefixes_the_last(self):
+        self.assertEqual(search.fts_query('şev "OR" bajê'), '"şev" "OR" "bajê"*')
+        self.assertEqual(search.fts_query("  ...  "), "")
+
+    def test_diacritics_fold_and_edits_are_indexed(self):
+        obj = self._submission("Şev", "Ez çûm bajêr.")
+        self.assertEqual(search.matching_ids("sev"), [obj.pk])
+        self.assertEqual(search.matching_ids("bajer"), [obj.pk])
+        obj.edited_text = "Ew hat gund."
+        obj.save()
+        self.assertEqual(search.matching_ids("bajer"), [])
+        self.assertEqual(search.matching_ids("gund"), [obj.pk])
+        obj.delete()
+        self.assertEqual(search.matching_ids("gund"), [])
+
+    def test_dropped_triggers_are_recreated(self):
+        self.assertEqual(search.ensure_triggers(), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TRIGGER {search.FTS_TABLE}_ai")
+        obj = self._submission("Helbest", "Stran û helbest.")
+        self.assertEqual(search.matching_ids("helbest"), [])
+        self.assertEqual(search.ensure_triggers(), [f"{search.FTS_TABLE}_ai"])
+        self.assertEqual(search.matching_ids("helbest"), [obj.pk])
+        other = self._submission("Çîrok", "Çîrokek kurt.")
+        self.assertEqual(search.matching_ids("cirok"), [other.pk])
+
+
+
+class SupabaseClientTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(supabase_client, _client=None, _client_pid=None,
+                                      create_client=mock.DEFAULT, _http_client=mock.DEFAULT)
+        self.create_client = patcher.start()["create_client"]
+        self.addCleanup(patcher.stop)
+        self.create_client.side_effect = self._slow_client
+
+    @staticmethod
+    def _slow_client(*args):
+        time.sleep(0.01)  # widens the window two threads could both create one in
+        return mock.Mock()
+
+    def test_one_client_per_process(self):
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(supabase_client.get_client())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(clients), 8)
+        self.assertEqual(len({id(c) for c in clients}), 1)
+        self.assertEqual(self.create_client.call_count, 1)
+
+    def test_forked_worker_gets_its_own_client(self):
+        parent = supabase_client.get_client()
+        with mock.patch.object(supabase_client.os, "getpid", return_value=os.getpid() + 1):
+            child = supabase_client.get_client()
+            self.assertIs(supabase_client.get_client(), child)
+        self.assertIsNot(child, parent)
+        self.assertEqual(self.create_client.call_count, 2)
+
+
+class FakeTable:
+    # Just enough of a postgrest table for iter_rows: eq/gte filters, the keyset
+    # or_() it builds, ordering by (key, id) and limit. Queries are recorded.
+    KEYSET = re.compile(r'(\w+)\.gt\."(.*)",and\(\1\.eq\."(.*)",id\.gt\.(.*)\)$')
+
+    def __init__(self, rows=()):
+        self.rows = [dict(row) for row in rows]
+        self.queries = []
+
+    def select(self, columns):
+        query = mock.Mock()
+        filters = []
+        order = []
+        state = {"limit": None}
+
+        def chain(method, effect):
+            def call(*args, **kwargs):
+                effect(*args, **kwargs)
+                return query
+            setattr(query, method, call)
+
+        chain("eq", lambda col, val: filters.append(lambda r: r.get(col) == val))
+        chain("gte", lambda col, val: filters.append(lambda r: r[col] >= val))
+        chain("or_", lambda expr: filters.append(self._keyset(expr)))
+        chain("order", lambda col, desc=False: order.append(col))
+        chain("limit", lambda n: state.update(limit=n))
+
+        def execute():
+            self.queries.append(columns)
+            rows = sorted((r for r in self.rows if all(f(r) for f in filters)),
+                          key=lambda r: tuple(r[c] for c in order))[:state["limit"]]
+            if columns != "*":
+                rows = [{c: r.get(c) for c in columns.split(",")} for r in rows]
+            return mock.Mock(data=rows)
+
+        query.execute = execute
+        return query
+
+    def _keyset(self, expr):
+        key, value, same, row_id = self.KEYSET.match(expr).groups()
+        assert value == same
+        return lambda r: r[key] > value or (r[key] == value and r["id"] > row_id)
+
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+    "submissions": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "submissions"},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SupabaseTestCase(SimpleTestCase):
+    # SupabaseSubmission over a mocked postgrest table, without the local mirror.
+    def setUp(self):
+        models.cache.clear()
+        self.table = mock.MagicMock()
+        client = mock.Mock()
+        client.table.return_value = self.table
+        for patcher in (
+            mock.patch.object(models, "get_client", return_value=client),
+            mock.patch.object(SupabaseSubmission, "_mirror_row"),
+            mock.patch.object(SupabaseSubmission, "_mirror_rows"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.supabase = SupabaseSubmission()
+
+
+class SubmissionCacheTests(SupabaseTestCase):
+    ROW = {"id": "1", "subject": "Şev", "updated_at": "2025-01-01T00:00:00+00:00"}
+
+    def _select(self):
+        return self.table.select.return_value.eq.return_value.single.return_value.execute
+
+    def test_rows_are_read_through_the_named_cache(self):
+        self._select().return_value.data = dict(self.ROW)
+        self.assertEqual(self.supabase.get("1"), self.ROW)
+        self.assertEqual(self.supabase.get("1"), self.ROW)
+        self._select().assert_called_once()
+        self.assertIsNotNone(models.cache.get(SupabaseSubmission._row_key("1")))
+        self.assertIsNone(django_caches["default"].get(SupabaseSubmission._row_key("1")))
+
+    def test_writes_replace_the_row_and_older_reads_do_not(self):
+        newer = {**self.ROW, "subject": "Roj", "updated_at": "2025-01-02T00:00:00+00:00"}
+        self.table.update.return_value.eq.return_value.execute.return_value.data = [newer]
+        self.supabase.update("1", {"subject": "Roj"})
+        SupabaseSubmission._remember(dict(self.ROW))  # a slow read that started before the write
+        self.assertEqual(self.supabase.get("1")["subject"], "Roj")
+        self._select().assert_not_called()
+
+    def test_deletes_leave_a_tombstone(self):
+        SupabaseSubmission._remember(dict(self.ROW))
+        with mock.patch.object(Submission.objects, "filter") as mirror_rows:
+            self.assertTrue(self.supabase.delete("1"))
+        mirror_rows.assert_called_once_with(remote_id="1")
+        SupabaseSubmission._remember(dict(self.ROW))
+        self.assertIsNone(self.supabase.get("1"))
+        self._select().assert_not_called()
+
+    def test_updates_are_timed(self):
+        self.table.update.return_value.eq.return_value.execute.return_value.data = [dict(self.ROW)]
+        self.table.update.return_value.in_.return_value.neq.return_value.execute.return_value.data = [dict(self.ROW)]
+        with mock.patch.object(metrics, "observe") as observe:
+            self.supabase.update("1", {"subject": "Şev"})
+            self.supabase.update_many(["1"], {"status": "accepted"})
+        stages = [(c.kwargs["stage"], c.kwargs.get("batch")) for c in observe.call_args_list]
+        self.assertEqual(stages, [("supabase_update", None), ("supabase_update", "many")])
+
+
+class ExportTests(SupabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def _rows(self, n, fail_after=None):
+        # random words so gzip cannot squeeze several rows into one 64 KB shard
+        for i in range(n):
+            if i == fail_after:
+                raise ConnectionError("connection reset")
+            yield {
+                "id": f"00000000-0000-0000-0000-{i:012d}", "subject": f"Nivîs {i}", "text_type": "Çîrok",
+                "author_source": "", "publication_date": "01-01-2000", "created_at": "2025-01-01T00:00:00+00:00",
+                "updated_at": f"2025-01-01T00:00:{i:02d}+00:00",
+                "edited_text": " ".join(uuid.UUID(int=random.Random(i * 1000 + j).getrandbits(128)).hex
+                                        for j in range(4000)),
+            }
+
+    def test_manifest_cursor_starts_the_next_delta(self):
+        with mock.patch.object(SupabaseSubmission, "iter_rows", return_value=self._rows(5)) as iter_rows:
+            manifest = export.export_accepted(self.directory, compression="gzip", max_shard_bytes=64 * 1024)
+        self.assertEqual(manifest["records"], 5)
+        self.assertGreater(len(manifest["shards"]), 2)
+        self.assertEqual(manifest["cursor"], "2025-01-01T00:00:04+00:00|00000000-0000-0000-0000-000000000004")
+        self.assertEqual(export.verify(self.directory), [])
+        self.assertFalse([name for name in os.listdir(self.directory) if name.endswith(".tmp")])
+        self.assertIsNone(iter_rows.call_args.kwargs["cursor"])
+
+        delta = os.path.join(self.directory, "delta")
+        with mock.patch.object(SupabaseSubmission, "iter_rows", return_value=iter(())) as iter_rows:
+            manifest = export.export_accepted(delta, compression="gzip", after=manifest["cursor"])
+        self.assertEqual(iter_rows.call_args.kwargs["cursor"], manifest["cursor"])
+        self.assertEqual(manifest["records"], 0)
+
+    def test_cursor_excludes_the_boundary_row(self):
+        q = self.table.select.return_value.eq.return_value
+        q.or_.return_value.order.return_value.order.return_value.limit.return_value.execute.return_value.data = []
+        list(self.supabase.iter_rows(status="accepted", key="updated_at", cursor="2025-01-01T00:00:04+00:00|7"))
+        q.gte.assert_not_called()
+        q.or_.assert_called_once_with(
+            'updated_at.gt."2025-01-01T00:00:04+00:00",and(updated_at.eq."2025-01-01T00:00:04+00:00",id.gt.7)'
+        )
+
+    def test_failed_export_leaves_nothing_behind(self):
+        with mock.patch.object(SupabaseSubmission, "iter_rows", return_value=self._rows(8, fail_after=6)):
+            with self.assertRaises(ConnectionError):
+                export.export_accepted(self.directory, compression="gzip", max_shard_bytes=64 * 1024)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_failed_rename_leaves_nothing_behind(self):
+        real_replace = os.replace
+        calls = []
+
+        def flaky_replace(src, dst):
+            calls.append(dst)
+            if len(calls) == 2:
+                raise OSError("disk full")
+            real_replace(src, dst)
+
+        with mock.patch.object(SupabaseSubmission, "iter_rows", return_value=self._rows(5)), \
+                mock.patch.object(export.os, "replace", side_effect=flaky_replace):
+            with self.assertRaises(OSError):
+                export.export_accepted(self.directory, compression="gzip", max_shard_bytes=64 * 1024)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class ListingTests(SupabaseTestCase):
+    def test_pages_are_fetched_by_range_with_listed_columns(self):
+        q = self.table.select.return_value.eq.return_value.order.return_value
+        q.range.return_value.execute.return_value.data = [{"id": "1"}]
+        self.assertEqual(self.supabase.list(status="pending", columns=views.LIST_COLUMNS, limit=50, offset=100),
+                         [{"id": "1"}])
+        self.table.select.assert_called_once_with(views.LIST_COLUMNS)
+        q.range.assert_called_once_with(100, 149)
+
+    def test_counts_are_head_only_and_cached(self):
+        q = self.table.select.return_value.eq.return_value
+        q.execute.return_value.count = 120
+        self.assertEqual(self.supabase.count("pending"), 120)
+        self.assertEqual(self.supabase.count("pending"), 120)
+        self.table.select.assert_called_once_with("id", count="exact", head=True)
+        q.execute.assert_called_once()
+
+    def test_page_number_maps_to_offset(self):
+        supabase = mock.Mock()
+        supabase.count.side_effect = lambda status: {"pending": 120, "accepted": 3, "rejected": 0}[status]
+        _, counts, page = views._list_from_supabase(supabase, "pending", "3")
+        self.assertEqual(counts, {"pending": 120, "accepted": 3, "rejected": 0})
+        self.assertEqual(page.number, 3)
+        supabase.list.assert_called_once_with(
+            status="pending", columns=views.LIST_COLUMNS, limit=views.LIST_PAGE_SIZE, offset=100
+        )
+        # out-of-range pages clamp to the last one instead of an empty range
+        views._list_from_supabase(supabase, "pending", "99")
+        self.assertEqual(supabase.list.call_args.kwargs["offset"], 100)
+
+
+class IterRowsTests(SupabaseTestCase):
+    def _row(self, i, updated_at="2025-01-01T00:00:00+00:00", status="accepted"):
+        return {"id": f"{i:04d}", "status": status, "subject": f"S{i}", "updated_at": updated_at,
+                "created_at": f"2025-01-01T00:00:{i % 60:02d}+00:00"}
+
+    def test_batches_follow_the_keyset_through_equal_timestamps(self):
+        # every row shares updated_at, so only the id half of the cursor moves the scan on
+        self.supabase.table = FakeTable(self._row(i) for i in range(23))
+        rows = list(self.supabase.iter_rows(columns="subject", batch_size=5, key="updated_at"))
+        self.assertEqual([r["id"] for r in rows], [f"{i:04d}" for i in range(23)])
+        self.assertEqual(set(rows[0]), {"subject", "updated_at", "id"})
+        self.assertEqual(len(self.supabase.table.queries), 5)
+
+    def test_resume_from_cursor_sees_new_rows_only(self):
+        self.supabase.table = FakeTable(self._row(i, status="accepted" if i % 2 else "pending") for i in range(10))
+        rows = list(self.supabase.iter_rows(status="accepted", batch_size=3))
+        self.assertEqual([r["id"] for r in rows], ["0001", "0003", "0005", "0007", "0009"])
+        cursor = SupabaseSubmission.cursor_for(rows[-1])
+        self.supabase.table.rows.append(self._row(70))
+        self.assertEqual([r["id"] for r in self.supabase.iter_rows(status="accepted", cursor=cursor)], ["0070"])
+
+    def test_errors_propagate(self):
+        self.table.select.return_value.order.return_value.order.return_value.limit.return_value \
+            .execute.side_effect = ConnectionError("reset")
+        with mock.patch.object(models.logger, "exception"), self.assertRaises(ConnectionError):
+            list(self.supabase.iter_rows())
+
+
+class SignedUrlTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(signed_urls, "cache", signed_urls.SignedUrlCache(max_entries=2))
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = mock.Mock()
+        self.bucket = self.client.storage.from_.return_value
+        self.bucket.create_signed_url.side_effect = lambda key, expires: {"signedURL": f"https://s/{key}?t={expires}"}
+
+    def test_urls_are_reused_until_most_of_their_lifetime_has_passed(self):
+        with mock.patch.object(signed_urls.time, "monotonic", return_value=1000.0) as now:
+            url = signed_urls.signed_url(self.client, "pdfs", "a.pdf", expires=100)
+            now.return_value = 1079.0
+            self.assertEqual(signed_urls.signed_url(self.client, "pdfs", "a.pdf", expires=100), url)
+            self.assertEqual(self.bucket.create_signed_url.call_count, 1)
+            now.return_value = 1081.0
+            signed_urls.signed_url(self.client, "pdfs", "a.pdf", expires=100)
+        self.assertEqual(self.bucket.create_signed_url.call_count, 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for key in ("a.pdf", "b.pdf", "a.pdf", "c.pdf"):
+            signed_urls.signed_url(self.client, "pdfs", key)
+        self.assertEqual(self.cache.stats(), {"entries": 2, "hits": 1, "misses": 3, "evictions": 1})
+        self.assertIsNotNone(self.cache.get("pdfs", "a.pdf", 3600))
+        self.assertIsNone(self.cache.get("pdfs", "b.pdf", 3600))
+
+    def test_batch_signs_only_missing_keys_and_skips_errors(self):
+        signed_urls.signed_url(self.client, "pdfs", "a.pdf")
+        self.bucket.create_signed_urls.return_value = [
+            {"path": "b.pdf", "signedURL": "https://s/b.pdf"},
+            {"path": "c.pdf", "signedURL": None, "error": "Object not found"},
+        ]
+        urls = signed_urls.signed_urls(self.client, "pdfs", ["a.pdf", "b.pdf", "c.pdf", "b.pdf", ""])
+        self.bucket.create_signed_urls.assert_called_once_with(["b.pdf", "c.pdf"], 3600)
+        self.assertEqual(set(urls), {"a.pdf", "b.pdf"})
+
+    def test_signing_failures_are_not_cached(self):
+        self.bucket.create_signed_url.side_effect = ConnectionError("reset")
+        with mock.patch.object(signed_urls.logger, "warning"):
+            self.assertIsNone(signed_urls.signed_url(self.client, "pdfs", "a.pdf"))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MirrorTests(TestCase):
+    def setUp(self):
+        self.upstream = FakeTable(self._row(i) for i in range(7))
+        client = mock.Mock()
+        client.table.return_value = self.upstream
+        patcher = mock.patch.object(models, "get_client", return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _row(i, updated_at="2025-01-01T00:00:00+00:00", subject=None):
+        return {"id": str(uuid.UUID(int=i)), "subject": subject or f"S{i}", "status": "pending",
+                "created_at": "2025-01-01T00:00:00+00:00", "updated_at": updated_at}
+
+    def _mirrored(self):
+        return dict(Submission.objects.filter(remote_id__isnull=False).values_list("remote_id", "subject"))
+
+    def test_incremental_sync_picks_up_changed_and_new_rows_only(self):
+        self.assertEqual(mirror.sync(batch_size=3), 7)
+        self.assertEqual(SyncState.objects.get().cursor,
+                         SupabaseSubmission.cursor_for(self.upstream.rows[-1], "updated_at"))
+        self.upstream.rows[2] = self._row(2, "2025-01-02T00:00:00+00:00", subject="Guherî")
+        self.upstream.rows.append(self._row(9, "2025-01-02T00:00:00+00:00"))
+        self.assertEqual(mirror.sync(batch_size=3), 2)
+        self.assertEqual(mirror.sync(batch_size=3), 0)
+        mirrored = self._mirrored()
+        self.assertEqual(len(mirrored), 8)
+        self.assertEqual(mirrored[uuid.UUID(int=2)], "Guherî")
+
+    def test_cursor_is_saved_per_batch_and_a_failed_sync_resumes(self):
+        real_iter_rows = SupabaseSubmission.iter_rows
+
+        def failing(self, *args, **kwargs):
+            for n, row in enumerate(real_iter_rows(self, *args, **kwargs)):
+                if n == 4:
+                    raise ConnectionError("reset")
+                yield row
+
+        with mock.patch.object(SupabaseSubmission, "iter_rows", failing), \
+                mock.patch.object(models.logger, "exception"), self.assertRaises(ConnectionError):
+            mirror.sync(batch_size=3)
+        self.assertEqual(len(self._mirrored()), 3)
+        self.assertIsNone(SyncState.objects.get().last_synced_at)
+        self.assertEqual(mirror.sync(batch_size=3), 4)
+        self.assertEqual(len(self._mirrored()), 7)
+
+    def test_full_sync_drops_rows_deleted_upstream(self):
+        mirror.sync()
+        del self.upstream.rows[3]
+        self.assertEqual(mirror.sync(), 0)
+        self.assertEqual(len(self._mirrored()), 7)
+        with mock.patch.object(mirror.logger, "info"):
+            self.assertEqual(mirror.sync(full=True), 6)
+        self.assertNotIn(uuid.UUID(int=3), self._mirrored())
+
+    def test_panel_reads_the_mirror_only_once_synced(self):
+        with mock.patch.object(mirror, "ENABLED", True):
+            self.assertIsNone(mirror.last_synced_at())
+            mirror.sync()
+            synced_at = mirror.last_synced_at()
+        self.assertFalse(mirror.is_stale(synced_at))
+        self.assertTrue(mirror.is_stale(synced_at - mirror.MAX_STALENESS - timedelta(seconds=1)))
+        with mock.patch.object(mirror, "ENABLED", False):
+            self.assertIsNone(mirror.last_synced_at())
+
+
+class BulkUpdateTests(SupabaseTestCase):
+    def test_updates_go_out_in_batches_that_skip_no_op_transitions(self):
+        ids = [str(uuid.UUID(int=i)) for i in range(5)]
+        batches = []
+
+        def update(payload):
+            query = mock.Mock()
+
+            def in_(column, batch):
+                batches.append(batch)
+                if len(batches) == 2:
+                    query.neq.return_value.execute.side_effect = ConnectionError("reset")
+                else:
+                    query.neq.return_value.execute.return_value.data = [{"id": i} for i in batch]
+                return query
+            query.in_ = in_
+            return query
+
+        self.table.update.side_effect = update
+        with mock.patch.object(SupabaseSubmission, "UPDATE_MANY_BATCH", 2), \
+                mock.patch.object(models.logger, "exception"):
+            rows, failed = self.supabase.update_many(ids, {"status": "accepted"})
+        self.assertEqual(batches, [ids[:2], ids[2:4], ids[4:]])
+        self.assertEqual([r["id"] for r in rows], ids[:2] + ids[4:])
+        self.assertEqual(failed, ids[2:4])
+        self.table.update.assert_called_with({"action": "update", "status": "accepted"})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkActionViewTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("reviewer"))
+        self.ids = [str(uuid.UUID(int=i)) for i in range(1, 5)]
+        patchers = [
+            mock.patch.object(models, "get_client"),
+            mock.patch.object(views.dedup, "bulk_add"),
+            mock.patch.object(views.dedup, "bulk_remove"),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _post(self, action, rows, failed=(), published=True):
+        rows = [{"id": pk, "subject": f"s{pk[-1]}", "edited_text": "Nivîs."} for pk in rows]
+        with mock.patch.object(SupabaseSubmission, "update_many", return_value=(rows, list(failed))) as update, \
+                mock.patch.object(views, "publish_jobs", return_value=published) as publish:
+            response = self.client.post(reverse("submissions:admin_bulk_action"),
+                                        {"action": action, "ids": self.ids + ["not-a-uuid", self.ids[0]]})
+        self.assertEqual(response.status_code, 200)
+        return {r["id"]: (r["level"], r["outcome"]) for r in response.context["results"]}, update, publish
+
+    def test_accept_publishes_changed_rows_in_one_commit(self):
+        outcomes, update, publish = self._post("accept", self.ids[:2], failed=self.ids[3:])
+        update.assert_called_once_with(self.ids, {"status": "accepted", "action": "update"})
+        self.assertEqual(len(publish.call_args.args[0]), 2)
+        self.assertEqual(outcomes, {
+            self.ids[0]: ("ok", "Accepted and published"),
+            self.ids[1]: ("ok", "Accepted and published"),
+            self.ids[2]: ("skipped", "Already accepted or not found"),
+            self.ids[3]: ("error", "Update failed"),
+        })
+        views.dedup.bulk_add.assert_called_once()
+
+    def test_failed_publish_is_left_to_the_queue(self):
+        outcomes, _, _ = self._post("accept", self.ids[:1], published=False)
+        self.assertEqual(outcomes[self.ids[0]], ("warning", "Accepted, publishing will be retried"))
+        self.assertEqual(PublishJob.objects.get().status, PublishJob.STATUS_QUEUED)
+
+    def test_reject_does_not_publish(self):
+        outcomes, _, publish = self._post("reject", self.ids)
+        publish.assert_not_called()
+        views.dedup.bulk_remove.assert_called_once()
+        self.assertEqual(set(outcomes.values()), {("ok", "Rejected")})
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        for patcher in (mock.patch.object(metrics, "_directory", return_value=tmp.name),
+                        mock.patch.object(metrics, "registry", metrics.Registry())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _exited_process_file(self, count, seconds):
+        process = subprocess.Popen(["true"])
+        process.wait()
+        labels = [["outcome", "ok"], ["stage", "extract"]]
+        histogram = [0.0] * (len(metrics.BUCKETS) + 2)
+        histogram[7] = count  # the 1.0s bucket
+        histogram[-1] = seconds
+        with open(os.path.join(self.dir, f"{socket.gethostname()}-{process.pid}-0badc0de.json"), "w") as f:
+            json.dump({"histograms": [["stage_seconds", labels, histogram]],
+                       "counters": [["pages_total", [["engine", "pymupdf"]], count * 10]]}, f)
+
+    def _value(self, text, line):
+        return float(next(l for l in text.splitlines() if l.startswith(line)).rsplit(" ", 1)[1])
+
+    def test_render_adds_up_processes(self):
+        with metrics.timed("extract"):
+            pass
+        metrics.inc("pages_total", 5, engine="pymupdf")
+        self._exited_process_file(3, 2.5)
+        text = metrics.render()
+        self.assertIn("# TYPE kurmanji_stage_seconds histogram", text)
+        self.assertEqual(self._value(text, 'kurmanji_stage_seconds_count{outcome="ok",stage="extract"}'), 4)
+        self.assertEqual(self._value(text, 'kurmanji_stage_seconds_bucket{outcome="ok",stage="extract",le="0.5"}'), 1)
+        self.assertEqual(self._value(text, 'kurmanji_stage_seconds_bucket{outcome="ok",stage="extract",le="1.0"}'), 4)
+        self.assertEqual(self._value(text, 'kurmanji_pages_total{engine="pymupdf"}'), 35)
+
+    def test_exited_processes_are_folded_once(self):
+        for _ in range(3):
+            self._exited_process_file(2, 1.0)
+        first = metrics.render()
+        self.assertEqual(sorted(os.listdir(self.dir)), sorted([metrics.AGGREGATE_NAME]))
+        self._exited_process_file(1, 1.0)
+        second = metrics.render()
+        self.assertEqual(self._value(first, "kurmanji_pages_total"), 60)
+        self.assertEqual(self._value(second, "kurmanji_pages_total"), 70)
+
+    def test_a_fold_interrupted_before_cleanup_counts_nothing_twice(self):
+        self._exited_process_file(2, 1.0)
+        real_remove = os.remove
+
+        def crash_on_shard_removal(path):
+            if path.endswith("0badc0de.json"):
+                raise OSError("killed")
+            real_remove(path)
+
+        with mock.patch.object(metrics.os, "remove", side_effect=crash_on_shard_removal):
+            interrupted = metrics.render()
+        self.assertEqual(len(os.listdir(self.dir)), 2)
+        self.assertEqual(self._value(interrupted, "kurmanji_pages_total"), 20)
+        self.assertEqual(self._value(metrics.render(), "kurmanji_pages_total"), 20)
+        self.assertEqual(os.listdir(self.dir), [metrics.AGGREGATE_NAME])
+
+    def test_concurrent_scrapes_see_consistent_totals(self):
+        for _ in range(20):
+            self._exited_process_file(1, 1.0)
+        totals = []
+
+        def scrape():
+            totals.append(self._value(metrics.render(), "kurmanji_pages_total"))
+
+        threads = [threading.Thread(target=scrape) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(totals, [200.0] * 8)
+
+    def test_forked_child_starts_its_own_file(self):
+        metrics.inc("pages_total", 1)
+        parent = metrics.registry.name
+        with mock.patch.object(metrics.os, "getpid", return_value=os.getpid() + 1):
+            metrics.inc("pages_total", 1)
+            self.assertNotEqual(metrics.registry.name, parent)
+        self.assertEqual(metrics.registry.snapshot()["counters"], [["pages_total", [], 1]])
+
+
+class ProfilingTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.multiple(profiling, PROFILE_DIR=tmp.name, MAX_FILES=3, SAMPLE_RATE=0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def test_forced_profile_is_saved_and_listed(self):
+        with profiling.profiled("GET /panel/", force=True) as info:
+            sorted(random.random() for _ in range(1000))
+            info["label"] = "GET submissions:admin_request_list"
+        [profile] = profiling.list_profiles()
+        self.assertEqual(profile["label"], "get-submissions-admin_request_list")
+        path = profiling.profile_path(profile["name"])
+        self.assertIn("sorted", profiling.report(path, sort="tottime"))
+
+    def test_unsampled_requests_are_not_profiled(self):
+        with profiling.profiled("GET /"):
+            pass
+        with mock.patch.object(profiling, "SAMPLE_RATE", 1.0):
+            with profiling.profiled("GET /"):
+                pass
+        self.assertEqual(len(profiling.list_profiles()), 1)
+
+    def test_overlapping_profiles_run_unprofiled(self):
+        with profiling.profiled("outer", force=True):
+            with profiling.profiled("inner", force=True):
+                pass
+        self.assertEqual([p["label"] for p in profiling.list_profiles()], ["outer"])
+
+    def test_only_the_newest_files_are_kept(self):
+        for i in range(5):
+            with profiling.profiled(f"job-{i}", force=True):
+                pass
+            name = profiling.list_profiles()[0]["name"]
+            os.utime(os.path.join(profiling.PROFILE_DIR, name), (1000 + i, 1000 + i))
+        profiling._rotate()
+        self.assertEqual([p["label"] for p in profiling.list_profiles()], ["job-4", "job-3", "job-2"])
+
+    def test_profile_names_cannot_leave_the_directory(self):
+        with open(os.path.join(profiling.PROFILE_DIR, "notes.txt"), "w") as f:
+            f.write("x")
+        self.assertIsNone(profiling.profile_path("notes.txt"))
+        self.assertIsNone(profiling.profile_path("../20250101-000000-x-1ms-0badc0de.prof"))
+        self.assertIsNone(profiling.profile_path("20250101-000000-x-1ms-0badc0de.prof"))
+
+    def test_header_only_counts_for_staff(self):
+        request = RequestFactory().get("/", headers={profiling.HEADER: "1"})
+        request.user = mock.Mock(is_staff=False)
+        self.assertFalse(profiling.is_flagged(request))
+        request.user.is_staff = True
+        self.assertTrue(profiling.is_flagged(request))
+        self.assertFalse(profiling.is_flagged(RequestFactory().get("/")))
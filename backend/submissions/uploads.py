@@ -0,0 +1,260 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows dev servers: chunks are not locked against each other
+    fcntl = None
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+
+from . import metrics
+from .extraction_jobs import SPOOL_DIR
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_BYTES = getattr(settings, "MAX_UPLOAD_BYTES", 200 * 1024 * 1024)
+UPLOAD_DIR = os.path.join(SPOOL_DIR, "uploads")
+# Unfinished resumable uploads are dropped after this long without a chunk.
+UPLOAD_TTL_SECONDS = getattr(settings, "UPLOAD_TTL_SECONDS", 24 * 3600)
+MAX_OPEN_UPLOADS_PER_CLIENT = getattr(settings, "MAX_OPEN_UPLOADS_PER_CLIENT", 3)
+
+
+class UploadError(Exception):
+    pass
+
+
+class TooManyUploads(UploadError):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+def new_spool_path() -> str:
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    return os.path.join(SPOOL_DIR, f"{uuid.uuid4().hex}.pdf")
+
+
+class ContentHashUploadHandler(FileUploadHandler):
+    # Runs ahead of Django's own handlers and hashes each file as it streams in;
+    # digests end up in request.upload_sha256 keyed by field name.
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, "upload_sha256"):
+            self.request.upload_sha256 = {}
+        self.request.upload_sha256[self.field_name] = self.hasher.hexdigest()
+        return None
+
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def spool_uploaded_file(uploaded_file, sha256: Optional[str] = None) -> Tuple[str, str]:
+    # Django already keeps large uploads on disk; move that file instead of copying it.
+    path = new_spool_path()
+    if hasattr(uploaded_file, "temporary_file_path"):
+        shutil.move(uploaded_file.temporary_file_path(), path)
+        return path, sha256 or file_sha256(path)
+
+    hasher = hashlib.sha256()
+    with open(path, "wb") as out:
+        for chunk in uploaded_file.chunks(CHUNK_SIZE):
+            hasher.update(chunk)
+            out.write(chunk)
+    return path, hasher.hexdigest()
+
+
+def original_filename(name: str) -> str:
+    # the submitter's file name, kept for reviewers; never used as a storage key
+    return os.path.basename((name or "").replace("\\", "/"))[:255]
+
+
+def store_pdf(storage, path: str, sha256: str) -> str:
+    # Objects are named by content hash, so an existing object is already the same PDF.
+    key = f"{sha256}.pdf"
+    try:
+        if storage.exists(key):
+            return key
+    except Exception as e:
+        logger.warning("Could not check storage for %s: %s", key, e)
+
+    with metrics.timed("storage_upload"), open(path, "rb") as f:
+        storage.upload(key, f, {"contentType": "application/pdf", "upsert": "true"})
+    metrics.inc("bytes_total", os.path.getsize(path), stage="storage_upload")
+    return key
+
+
+def _part_path(upload_id: str) -> str:
+    return os.path.join(UPLOAD_DIR, f"{uuid.UUID(str(upload_id)).hex}.part")
+
+
+def _info_path(upload_id: str) -> str:
+    # declared size and client of an upload, next to its .part file
+    return os.path.join(UPLOAD_DIR, f"{uuid.UUID(str(upload_id)).hex}.json")
+
+
+def _read_info(upload_id: str) -> Optional[dict]:
+    try:
+        with open(_info_path(upload_id), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def client_key(request) -> str:
+    return hashlib.sha256(request.META.get("REMOTE_ADDR", "").encode()).hexdigest()[:16]
+
+
+def drop_expired_uploads() -> None:
+    # An upload expires UPLOAD_TTL_SECONDS after its last chunk; its .json goes with it.
+    cutoff = time.time() - UPLOAD_TTL_SECONDS
+    try:
+        names = os.listdir(UPLOAD_DIR)
+    except OSError:
+        return
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        part, info = os.path.join(UPLOAD_DIR, f"{stem}.part"), os.path.join(UPLOAD_DIR, f"{stem}.json")
+        try:
+            if ext == ".part" and os.path.getmtime(part) < cutoff:
+                os.remove(part)
+                if os.path.exists(info):
+                    os.remove(info)
+            elif ext == ".json" and not os.path.exists(part):
+                os.remove(info)
+        except OSError:
+            pass
+
+
+def _open_uploads(client: str) -> int:
+    count = 0
+    for name in os.listdir(UPLOAD_DIR):
+        if name.endswith(".json"):
+            upload_id = os.path.splitext(name)[0]
+            info = _read_info(upload_id)
+            if info and info.get("client") == client and os.path.exists(_part_path(upload_id)):
+                count += 1
+    return count
+
+
+def create_upload(total_size: int, client: str = "", filename: str = "") -> str:
+    if total_size <= 0:
+        raise UploadError("File is empty")
+    if total_size > MAX_UPLOAD_BYTES:
+        raise UploadError(f"File is larger than {MAX_UPLOAD_BYTES} bytes")
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    drop_expired_uploads()
+    if _open_uploads(client) >= MAX_OPEN_UPLOADS_PER_CLIENT:
+        raise TooManyUploads("Too many unfinished uploads; finish one or try again later")
+    upload_id = str(uuid.uuid4())
+    open(_part_path(upload_id), "wb").close()  # first, so the sweep never sees a .json without it
+    with open(_info_path(upload_id), "w") as f:
+        json.dump({"size": total_size, "client": client, "filename": filename}, f)
+    return upload_id
+
+
+def upload_offset(upload_id: str) -> Optional[int]:
+    try:
+        return os.path.getsize(_part_path(upload_id))
+    except (OSError, ValueError):
+        return None
+
+
+def upload_size(upload_id: str) -> Optional[int]:
+    info = _read_info(upload_id)
+    return info["size"] if info else None
+
+
+def upload_filename(upload_id: str) -> str:
+    info = _read_info(upload_id)
+    return (info or {}).get("filename") or ""
+
+
+@contextmanager
+def _locked(f):
+    # A client retry can race the request it retries; whoever holds the lock
+    # owns the offset until it is done, the other one is told where it stands.
+    if fcntl is None:
+        yield True
+        return
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def append_chunk(upload_id: str, offset: int, stream) -> int:
+    size = upload_size(upload_id)
+    try:
+        # no O_CREAT: a finished or expired upload must not come back
+        out = os.fdopen(os.open(_part_path(upload_id), os.O_WRONLY | os.O_APPEND), "ab")
+    except (OSError, ValueError):
+        out = None
+    if out is None or size is None:
+        if out is not None:
+            out.close()
+        raise UploadError("Unknown upload")
+
+    with out, _locked(out) as locked:
+        # the offset is only trusted once it is read under the lock
+        current = os.fstat(out.fileno()).st_size
+        if not locked or offset != current:
+            raise OffsetMismatch(current)
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            current += len(chunk)
+            if current > size:
+                out.truncate(offset)
+                raise UploadError(f"Upload is longer than the declared {size} bytes")
+            out.write(chunk)
+    return current
+
+
+def complete_upload(upload_id: str) -> Tuple[str, str]:
+    offset, size = upload_offset(upload_id), upload_size(upload_id)
+    if offset is None or size is None:
+        raise UploadError("Upload is missing")
+    if offset != size:
+        raise UploadError(f"Upload is incomplete: {offset} of {size} bytes received")
+    path = new_spool_path()
+    with open(_part_path(upload_id), "rb") as part, _locked(part) as locked:
+        if not locked:
+            raise UploadError("Upload is still receiving data")
+        os.replace(_part_path(upload_id), path)
+    try:
+        os.remove(_info_path(upload_id))
+    except OSError:
+        pass
+    return path, file_sha256(path)
@@ -5,8 +5,17 @@ app_name = 'submissions'
 
 urlpatterns = [
     path('', views.submit_pdf, name='submit_pdf'),
+    path('upload/', views.upload_create, name='upload_create'),
+    path('upload/<uuid:upload_id>/', views.upload_chunk, name='upload_chunk'),
     path('preview/<uuid:pk>/', views.preview_text, name='preview_text'),
+    path('preview/<uuid:pk>/status/', views.extraction_status, name='extraction_status'),
     path('thanks/', views.thanks, name='thanks'),
     path('panel/', views.admin_request_list, name='admin_request_list'),
+    path('panel/bulk/', views.admin_bulk_action, name='admin_bulk_action'),
     path('panel/<uuid:pk>/', views.admin_request_detail, name='admin_request_detail'),
+    path('panel/stats/', views.corpus_stats_page, name='corpus_stats'),
+    path('panel/stats/signed-urls/', views.signed_url_cache_stats, name='signed_url_cache_stats'),
+    path('panel/profiles/', views.profile_list, name='profile_list'),
+    path('panel/profiles/<str:name>/', views.profile_detail, name='profile_detail'),
+    path('metrics', views.metrics_endpoint, name='metrics'),
 ]
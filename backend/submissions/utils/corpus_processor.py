@@ -1,17 +1,13 @@
-import PyPDF2
+from ..pdf_processor import extract_text_from_pdf
 
 class CorpusProcessor:
-    def __init__(self, file_path):
+    def __init__(self, file_path, engine="auto"):
         self.file_path = file_path
+        self.engine = engine
 
     def extract_text_only(self):
         try:
-            with open(self.file_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text()
-                return text
+            return extract_text_from_pdf(self.file_path, engine=self.engine)
         except Exception as e:
             print(f"Error: {str(e)}")
-            return "" 
\ No newline at end of file
+            return ""
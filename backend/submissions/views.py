@@ -1,74 +1,58 @@
-import os
 import logging
-import tempfile
-from io import BytesIO
+import os
+import uuid
 
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.views.decorators.http import require_http_methods
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.db.models import Count
 
 from .forms import SubmissionForm
-from .models import SupabaseSubmission
-from .pdf_processor import extract_text_from_pdf
-
-from huggingface_hub import HfApi, hf_hub_download
-import json
+from . import corpus_stats, dedup, extraction_jobs, metrics, mirror, profiling, publisher, search, signed_urls, uploads
+from .models import ExtractionJob, PublishJob, Submission, SupabaseSubmission
+from .publish_queue import enqueue, publish_jobs
 
 logger = logging.getLogger(__name__)
 BUCKET = getattr(settings, "SUPABASE_BUCKET", "pdfs")
 
+LIST_STATUSES = ('pending', 'accepted', 'rejected')
+LIST_COLUMNS = "id,name,email,subject,text_type,created_at,status,pdf_file_url"
+LIST_PAGE_SIZE = 50
+
 
 def _signed_url_for_key(supabase_client, key: str, expires: int = 3600) -> str | None:
-    try:
-        if not key:
-            return None
-        resp = supabase_client.storage.from_(BUCKET).create_signed_url(key, expires)
-        return resp.get("signedURL") or resp.get("signed_url")
-    except Exception as e:
-        logger.warning("Could not generate signed URL: %s", e)
-        return None
+    return signed_urls.signed_url(supabase_client, BUCKET, key, expires)
 
 
 def submit_pdf(request):
     if request.method == 'POST':
         form = SubmissionForm(request.POST, request.FILES)
         if form.is_valid():
+            spool_path = None
             try:
                 data = form.cleaned_data
 
+                upload_id = data.get('upload_id')
                 pdf_file = request.FILES.get('pdf_file')
-                if not pdf_file:
-                    raise ValueError("No PDF file provided")
-
-                pdf_bytes = pdf_file.read()
-
-                sb = SupabaseSubmission().supabase
-                object_name = f"{pdf_file.name}"
-                storage = sb.storage.from_(BUCKET)
-                storage.upload(
-                    object_name,
-                    pdf_bytes,
-                    {"contentType": "application/pdf", "upsert": "true"},
-                )
-
-                pdf_key = object_name
-
-                fd, tmp_path = tempfile.mkstemp(suffix=".pdf")
-                try:
-                    with os.fdopen(fd, "wb") as tmpf:
-                        tmpf.write(pdf_bytes)
-                        tmpf.flush()
-                    extracted_text = extract_text_from_pdf(tmp_path)
-                finally:
-                    try:
-                        os.remove(tmp_path)
-                    except OSError:
-                        pass
-
-                if not extracted_text:
-                    logger.warning("No text extracted from PDF: %s", pdf_file.name)
-                    extracted_text = "No text could be extracted from the PDF."
+                with metrics.timed("spool"):
+                    if upload_id:
+                        filename = uploads.upload_filename(upload_id)
+                        spool_path, sha256 = uploads.complete_upload(upload_id)
+                    elif pdf_file:
+                        filename = pdf_file.name
+                        known_sha256 = getattr(request, 'upload_sha256', {}).get('pdf_file')
+                        spool_path, sha256 = uploads.spool_uploaded_file(pdf_file, known_sha256)
+                    else:
+                        raise ValueError("No PDF file provided")
+
+                storage = SupabaseSubmission().supabase.storage.from_(BUCKET)
+                pdf_key = uploads.store_pdf(storage, spool_path, sha256)
+
+                cached_text = extraction_jobs.cached_text(sha256)
 
                 supabase_data = {
                     "name": data['name'],
@@ -78,19 +62,30 @@ def submit_pdf(request):
                     "author_source": data['author_source'],
                     "text_type": data['text_type'],
                     "pdf_file_url": pdf_key,
-                    "extracted_text": extracted_text,
-                    "edited_text": extracted_text,
-                    "status": "pending",
+                    "pdf_file_name": uploads.original_filename(filename),
+                    "extracted_text": cached_text or "",
+                    "edited_text": cached_text or "",
+                    "status": "pending" if cached_text else "extracting",
                 }
 
                 created = SupabaseSubmission().create({"action": "create", **supabase_data})
                 if not created:
                     raise Exception("Failed to create submission in Supabase")
 
+                if cached_text:
+                    os.remove(spool_path)
+                else:
+                    extraction_jobs.submit(created['id'], spool_path, sha256, profile=profiling.is_flagged(request))
+
                 messages.success(request, 'Submission uploaded successfully!')
                 return redirect('submissions:preview_text', pk=created['id'])
 
             except Exception as e:
+                if spool_path:
+                    try:
+                        os.remove(spool_path)
+                    except OSError:
+                        pass
                 logger.error("Error processing submission: %s", e)
                 messages.error(request, f'Error processing submission: {e}')
                 return render(request, 'submissions/submit_pdf.html', {'form': form})
@@ -100,6 +95,40 @@ def submit_pdf(request):
     return render(request, 'submissions/submit_pdf.html', {'form': form})
 
 
+@require_http_methods(["POST"])
+def upload_create(request):
+    try:
+        total_size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({"error": "The file size is required."}, status=400)
+    try:
+        upload_id = uploads.create_upload(
+            total_size, uploads.client_key(request), uploads.original_filename(request.POST.get('name', ''))
+        )
+    except uploads.TooManyUploads as e:
+        return JsonResponse({"error": str(e)}, status=429)
+    except uploads.UploadError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"upload_id": upload_id, "offset": 0, "size": total_size}, status=201)
+
+
+@require_http_methods(["GET", "PUT"])
+def upload_chunk(request, upload_id):
+    if request.method == 'GET':
+        offset, size = uploads.upload_offset(upload_id), uploads.upload_size(upload_id)
+        if offset is None or size is None:
+            raise Http404("Unknown upload.")
+        return JsonResponse({"upload_id": str(upload_id), "offset": offset, "size": size})
+
+    try:
+        offset = uploads.append_chunk(upload_id, int(request.headers.get('Upload-Offset', -1)), request)
+    except uploads.OffsetMismatch as e:
+        return JsonResponse({"error": str(e), "offset": e.offset}, status=409)
+    except (ValueError, uploads.UploadError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"upload_id": str(upload_id), "offset": offset})
+
+
 def preview_text(request, pk):
     supabase = SupabaseSubmission()
     submission = supabase.get(pk)
@@ -108,6 +137,16 @@ def preview_text(request, pk):
         messages.error(request, 'Submission not found.')
         return redirect('submissions:submit_pdf')
 
+    if submission.get('status') == 'extracting':
+        job = ExtractionJob.objects.filter(submission_id=str(pk)).first()
+        failed = job is not None and job.state == ExtractionJob.STATE_FAILED
+        if failed and request.method == 'POST':
+            extraction_jobs.retry(job)
+            return redirect('submissions:preview_text', pk=pk)
+        return render(request, 'submissions/preview_text.html', {
+            'submission': submission, 'job': job, 'extracting': not failed, 'failed': failed,
+        })
+
     if request.method == 'POST':
         edited_text = request.POST.get('edited_text', '').strip()
 
@@ -122,27 +161,259 @@ def preview_text(request, pk):
     return render(request, 'submissions/preview_text.html', {'submission': submission, 'preview_url': preview_url})
 
 
+def extraction_status(request, pk):
+    job = ExtractionJob.objects.filter(submission_id=str(pk)).first()
+    if not job:
+        raise Http404("No extraction job for this submission.")
+    return JsonResponse({
+        "state": job.state,
+        "pages_done": job.pages_done,
+        "pages_total": job.pages_total,
+        "error": job.error,
+        # the text never reached Supabase, so the submission is still "extracting"
+        "stuck": job.state == ExtractionJob.STATE_FAILED and job.error == extraction_jobs.STORE_FAILED,
+    })
+
+
 def thanks(request):
     return render(request, 'submissions/thanks.html')
 
 
+def _list_from_mirror(status, text_type, page_number):
+    base = Submission.objects.filter(remote_id__isnull=False)
+    if text_type:
+        base = base.filter(text_type=text_type)
+
+    counts = {
+        row['status']: row['total']
+        for row in base.filter(status__in=LIST_STATUSES).values('status').annotate(total=Count('id'))
+    }
+    counts = {s: counts.get(s, 0) for s in LIST_STATUSES}
+
+    qs = base.filter(status=status).order_by('-remote_created_at', '-remote_id').only(
+        'remote_id', 'name', 'email', 'subject', 'text_type', 'status', 'remote_created_at', 'pdf_file'
+    )
+    page = Paginator(qs, LIST_PAGE_SIZE).get_page(page_number)
+    submissions = [{
+        'id': obj.remote_id,
+        'name': obj.name,
+        'email': obj.email,
+        'subject': obj.subject,
+        'text_type': obj.text_type,
+        'status': obj.status,
+        'created_at': obj.remote_created_at,
+        'pdf_file_url': obj.pdf_file.name,
+    } for obj in page.object_list]
+    return submissions, counts, page
+
+
+def _list_from_supabase(supabase, status, page_number):
+    counts = {s: supabase.count(status=s) for s in LIST_STATUSES}
+    page = Paginator(range(counts[status]), LIST_PAGE_SIZE).get_page(page_number)
+    submissions = supabase.list(
+        status=status, columns=LIST_COLUMNS,
+        limit=LIST_PAGE_SIZE, offset=(page.number - 1) * LIST_PAGE_SIZE,
+    )
+    return submissions, counts, page
+
+
 @login_required
 def admin_request_list(request):
     supabase = SupabaseSubmission()
     status = request.GET.get('status', 'pending')
-
-    submissions = {
-        'pending': supabase.list(status='pending'),
-        'accepted': supabase.list(status='accepted'),
-        'rejected': supabase.list(status='rejected'),
+    if status not in LIST_STATUSES:
+        status = 'pending'
+    text_type = request.GET.get('text_type', '')
+    query = request.GET.get('q', '').strip()
+    synced_at = mirror.last_synced_at()
+    use_mirror = synced_at is not None
+    mirror_state = {
+        'enabled': mirror.ENABLED,
+        'synced_at': synced_at,
+        'stale': use_mirror and mirror.is_stale(synced_at),
     }
 
+    if query and use_mirror and search.available():
+        return render(request, 'submissions/admin_request_list.html', {
+            'submissions': search.search(query, status=status),
+            'search_results': True,
+            'query': query,
+            'counts': {},
+            'status': status,
+            'filtering': True,
+            'text_types': Submission.TEXT_TYPE_CHOICES,
+            'mirror': mirror_state,
+        })
+
+    if use_mirror:
+        submissions, counts, page = _list_from_mirror(status, text_type, request.GET.get('page'))
+    else:
+        submissions, counts, page = _list_from_supabase(supabase, status, request.GET.get('page'))
+
+    urls = signed_urls.signed_urls(supabase.supabase, BUCKET, (s.get('pdf_file_url') for s in submissions))
+    for submission in submissions:
+        submission['preview_url'] = urls.get(submission.get('pdf_file_url'), '')
+
     return render(request, 'submissions/admin_request_list.html', {
         'submissions': submissions,
-        'status': status
+        'counts': counts,
+        'page': page,
+        'status': status,
+        'text_type': text_type,
+        'text_types': Submission.TEXT_TYPE_CHOICES,
+        'filtering': use_mirror,
+        'searchable': use_mirror and search.available(),
+        'mirror': mirror_state,
     })
 
 
+@login_required
+def signed_url_cache_stats(request):
+    if not request.user.is_staff:
+        raise Http404()
+    return JsonResponse(signed_urls.cache.stats())
+
+
+def metrics_endpoint(request):
+    # Prometheus scrapes with METRICS_TOKEN as a bearer token; staff can also open it.
+    token = getattr(settings, "METRICS_TOKEN", "")
+    authorized = bool(token) and request.headers.get("Authorization") == f"Bearer {token}"
+    if not authorized and not request.user.is_staff:
+        raise Http404()
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@login_required
+def profile_list(request):
+    if not request.user.is_staff:
+        raise Http404()
+    return render(request, 'submissions/profiles.html', {
+        'profiles': profiling.list_profiles(),
+        'sample_rate': profiling.SAMPLE_RATE,
+        'header': profiling.HEADER,
+    })
+
+
+@login_required
+def profile_detail(request, name):
+    if not request.user.is_staff:
+        raise Http404()
+    path = profiling.profile_path(name)
+    if not path:
+        raise Http404()
+    if request.GET.get('download'):
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
+    sort = request.GET.get('sort', 'cumulative')
+    return render(request, 'submissions/profile_detail.html', {
+        'name': name,
+        'report': profiling.report(path, sort),
+        'sort': sort,
+        'sort_keys': profiling.SORT_KEYS,
+    })
+
+
+def _load_corpus_stats():
+    stats = corpus_stats.load_local()
+    if stats is None:
+        try:
+            stats = publisher.refresh_local_stats()
+        except Exception as e:
+            logger.warning("Could not load corpus stats from Hugging Face: %s", e)
+    return stats
+
+
+@login_required
+def corpus_stats_page(request):
+    stats = _load_corpus_stats()
+    if stats is not None:
+        stats.pop('sketches', None)
+    if request.GET.get('format') == 'json':
+        if stats is None:
+            raise Http404()
+        return JsonResponse(stats, json_dumps_params={'ensure_ascii': False})
+    return render(request, 'submissions/corpus_stats.html', {
+        'stats': stats,
+        'top_tokens': (stats or {}).get('top_tokens', [])[:100],
+    })
+
+
+BULK_ACTIONS = {'accept': 'accepted', 'reject': 'rejected'}
+
+
+def _valid_ids(values):
+    ids = []
+    for value in values:
+        try:
+            ids.append(str(uuid.UUID(value)))
+        except ValueError:
+            continue
+    return list(dict.fromkeys(ids))
+
+
+@login_required
+@require_http_methods(["POST"])
+def admin_bulk_action(request):
+    action = request.POST.get('action', '').strip().lower()
+    new_status = BULK_ACTIONS.get(action)
+    ids = _valid_ids(request.POST.getlist('ids'))
+    if not new_status or not ids:
+        messages.error(request, 'Select at least one submission and an action.')
+        return redirect('submissions:admin_request_list')
+
+    rows, failed = SupabaseSubmission().update_many(ids, {"status": new_status, "action": "update"})
+    by_id = {str(row['id']): row for row in rows}
+    outcomes = {pk: ('error', 'Update failed') for pk in failed}
+    outcomes.update({
+        pk: ('skipped', f'Already {new_status} or not found')
+        for pk in ids if pk not in by_id and pk not in outcomes
+    })
+    outcomes.update({pk: ('ok', new_status.capitalize()) for pk in by_id})
+
+    if new_status == 'rejected' and rows:
+        try:
+            dedup.bulk_remove(row['id'] for row in rows)
+        except Exception as e:
+            logger.warning("Could not remove %s submissions from the duplicate index: %s", len(rows), e)
+
+    if new_status == 'accepted' and rows:
+        try:
+            dedup.bulk_add((row['id'], row.get('edited_text') or "") for row in rows)
+        except Exception as e:
+            logger.warning("Could not add %s submissions to the duplicate index: %s", len(rows), e)
+
+        jobs = []
+        for row in rows:
+            pk = str(row['id'])
+            try:
+                job = enqueue(row)
+            except Exception as e:
+                logger.error("Could not queue submission %s for publishing: %s", pk, e)
+                outcomes[pk] = ('warning', 'Accepted, not queued for Hugging Face')
+                continue
+            if job.status == PublishJob.STATUS_PUBLISHED:
+                outcomes[pk] = ('ok', 'Accepted, already published')
+            else:
+                jobs.append(job)
+
+        # every newly accepted document goes out in a single dataset commit
+        published = publish_jobs(jobs)
+        for job in jobs:
+            outcomes[job.idempotency_key] = (
+                ('ok', 'Accepted and published') if published
+                else ('warning', 'Accepted, publishing will be retried')
+            )
+
+    results = [{
+        'id': pk,
+        'subject': by_id.get(pk, {}).get('subject', ''),
+        'level': outcomes[pk][0],
+        'outcome': outcomes[pk][1],
+    } for pk in ids]
+    done = sum(1 for r in results if r['level'] in ('ok', 'warning'))
+    messages.info(request, f'{done} of {len(ids)} submission(s) {new_status}.')
+    return render(request, 'submissions/bulk_results.html', {'results': results, 'action': action})
+
+
 @login_required
 def admin_request_detail(request, pk):
     supabase = SupabaseSubmission()
@@ -165,81 +436,37 @@ def admin_request_detail(request, pk):
 
         if new_status == 'accepted':
             payload = {**submission, "edited_text": edited_text}
-            if push_to_huggingface(payload):
-                messages.success(request, 'Request accepted and pushed to Hugging Face.')
-            else:
-                messages.warning(request, 'Request accepted but failed to push to Hugging Face.')
+            try:
+                dedup.add(pk, edited_text)
+            except Exception as e:
+                logger.warning("Could not add submission %s to the duplicate index: %s", pk, e)
+            try:
+                enqueue(payload)
+                messages.success(request, 'Request accepted and queued for Hugging Face.')
+            except Exception as e:
+                logger.error("Could not queue submission %s for publishing: %s", pk, e)
+                messages.warning(request, 'Request accepted but could not be queued for Hugging Face.')
         elif new_status == 'rejected':
+            try:
+                dedup.remove(pk)
+            except Exception as e:
+                logger.warning("Could not remove submission %s from the duplicate index: %s", pk, e)
             messages.info(request, 'Request rejected.')
 
         return redirect('submissions:admin_request_list')
 
-    preview_url = _signed_url_for_key(supabase.supabase, submission.get("pdf_file_url", "")) or ""
-    return render(request, 'submissions/admin_request_detail.html', {'submission': submission, 'preview_url': preview_url})
-
-
-def push_to_huggingface(submission) -> bool:
     try:
-        api = HfApi(token=settings.HUGGINGFACE_TOKEN)
-        repo_id = "happyhackingspace/kurdish-kurmanji-corpus"
-
-        text = (submission.get('edited_text') or "").strip()
-        char_count = len(text)
-        word_count = len(text.split())
-
-        new_text = ' '.join(text.split())
-        formatted_new_text = new_text.replace('. ', '.\n').replace('! ', '!\n').replace('? ', '?\n').rstrip('\n')
-
-        json_data = {
-            "document_subject": submission.get('subject'),
-            "text_type": submission.get('text_type'),
-            "author_source": submission.get('author_source'),
-            "publication_date": submission.get('publication_date'),
-            "created_at": submission.get('created_at'),
-            "char_count": char_count,
-            "word_count": word_count,
-            "text": text,
-        }
-
-        try:
-            existing_json_path = hf_hub_download(
-                repo_id=repo_id, filename="kurmanji.json", repo_type="dataset",
-                token=settings.HUGGINGFACE_TOKEN
-            )
-            with open(existing_json_path, "r", encoding="utf-8") as f:
-                existing_lines = [line.strip() for line in f if line.strip()]
-        except Exception as e:
-            logger.warning("Could not read existing JSON file: %s", e)
-            existing_lines = []
-
-        existing_lines.append(json.dumps(json_data, ensure_ascii=False))
-        api.upload_file(
-            path_or_fileobj=BytesIO(("\n".join(existing_lines)).encode("utf-8")),
-            path_in_repo="kurmanji.json", repo_id=repo_id, repo_type="dataset"
-        )
-
-        try:
-            existing_txt_path = hf_hub_download(
-                repo_id=repo_id, filename="kurmanji.txt", repo_type="dataset",
-                token=settings.HUGGINGFACE_TOKEN
-            )
-            with open(existing_txt_path, "r", encoding="utf-8") as f:
-                existing_text = f.read().strip()
-        except Exception as e:
-            logger.warning("Could not read existing TXT file: %s", e)
-            existing_text = ""
-
-        merged = (existing_text + "\n" + formatted_new_text).strip() if existing_text else formatted_new_text
-        api.upload_file(
-            path_or_fileobj=BytesIO(merged.encode("utf-8")),
-            path_in_repo="kurmanji.txt", repo_id=repo_id, repo_type="dataset"
-        )
-
-        logger.info("Pushed submission %s to Hugging Face", submission.get('id'))
-        return True
+        duplicates = dedup.near_duplicates(submission.get('edited_text') or "", exclude=pk)
     except Exception as e:
-        logger.error("Hugging Face push failed: %s", e)
-        return False
+        logger.warning("Duplicate lookup failed for %s: %s", pk, e)
+        duplicates = []
+
+    preview_url = _signed_url_for_key(supabase.supabase, submission.get("pdf_file_url", "")) or ""
+    return render(request, 'submissions/admin_request_detail.html', {
+        'submission': submission,
+        'preview_url': preview_url,
+        'duplicates': [{'id': doc_id, 'similarity': round(score * 100)} for doc_id, score in duplicates],
+    })
 
 
 @login_required
@@ -280,6 +507,8 @@ def delete_submission(request, pk):
         return redirect('submissions:admin_submissions')
 
     key = submission.get('pdf_file_url')
+    if key and supabase.file_is_shared(key, pk):
+        key = None
     if key:
         try:
             supabase.supabase.storage.from_(BUCKET).remove([key])
@@ -287,5 +516,9 @@ def delete_submission(request, pk):
             logger.error("Error deleting file from Supabase Storage: %s", e)
 
     supabase.delete(pk)
+    try:
+        dedup.remove(pk)
+    except Exception as e:
+        logger.warning("Could not remove submission %s from the duplicate index: %s", pk, e)
     messages.success(request, 'Submission deleted successfully.')
     return redirect('submissions:admin_submissions')